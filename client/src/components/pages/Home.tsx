@@ -35,40 +35,26 @@ export default function Home() {
     const [file, setFile] = useState<File | null>(null);
     const [operationHistory, setOperationHistory] = useState<OperationData[]>([]);
 
-    // API Mutations (No changes to the basic mutation functions)
-    const knowYourKolamMutation = useMutation({
+    // One upload for dots/paths, region prediction and similar kolams; the server runs them concurrently
+    const analyzeKolamMutation = useMutation({
         mutationFn: async (file: File) => {
             const formData = new FormData();
             formData.append("file", file);
-            const res = await api.post(API_ROUTES.KOLAM.KNOW_YOUR_KOLAM, formData, {
+            const res = await api.post<{
+                kolam?: any;
+                prediction?: string;
+                matches?: string[];
+                errors: Record<string, string>;
+            }>(API_ROUTES.KOLAM.ANALYZE, formData, {
                 headers: { "Content-Type": "multipart/form-data" },
             });
+            if (!res.data.kolam) {
+                throw new Error(res.data.errors?.kolam ?? "Kolam analysis failed");
+            }
             return res.data;
         }
     });
 
-    const searchKolamMutation = useMutation({
-        mutationFn: async (file: File) => {
-            const formData = new FormData();
-            formData.append("file", file);
-            const res = await api.post(API_ROUTES.KOLAM.SEARCH, formData, {
-                headers: { "Content-Type": "multipart/form-data" },
-            });
-            return res.data.matches;
-        }
-    });
-
-    const predictKolamMutation = useMutation({
-        mutationFn: async (file: File) => {
-            const formData = new FormData();
-            formData.append("file", file);
-            const res = await api.post(API_ROUTES.KOLAM.PREDICT, formData, {
-                headers: { "Content-Type": "multipart/form-data" },
-            });
-            return res.data.prediction;
-        }
-    });
-
     const renderKolamMutation = useMutation({
         mutationFn: async (data: any) => {
             const res = await api.post(API_ROUTES.KOLAM.RENDER, data, {
@@ -141,11 +127,10 @@ export default function Home() {
 
         try {
             // 1. Run Initial Analysis
-            const [knowResult, searchResult, predictResult] = await Promise.all([
-                knowYourKolamMutation.mutateAsync(originalFile),
-                searchKolamMutation.mutateAsync(originalFile),
-                predictKolamMutation.mutateAsync(originalFile)
-            ]);
+            const analysis = await analyzeKolamMutation.mutateAsync(originalFile);
+            const knowResult = analysis.kolam;
+            const searchResult = analysis.matches;
+            const predictResult = analysis.prediction;
 
             const analysisEntry: OperationData = {
                 id: Date.now().toString(),
@@ -300,9 +285,9 @@ export default function Home() {
                             className="px-4 py-2 text-primary border-1 font-semibold border-primary rounded-lg bg-white hover:bg-blue-50 transition-colors"
                             onClick={handleAnalyze}
                             // Disabled if ANY of the chained mutations are pending
-                            disabled={knowYourKolamMutation.isPending || searchKolamMutation.isPending || predictKolamMutation.isPending || renderKolamMutation.isPending || recreateKolamMutation.isPending}
+                            disabled={analyzeKolamMutation.isPending || renderKolamMutation.isPending || recreateKolamMutation.isPending}
                         >
-                            {(knowYourKolamMutation.isPending || searchKolamMutation.isPending || predictKolamMutation.isPending || renderKolamMutation.isPending || recreateKolamMutation.isPending) ? "Processing All Steps..." : "Analyze & Recreate"}
+                            {(analyzeKolamMutation.isPending || renderKolamMutation.isPending || recreateKolamMutation.isPending) ? "Processing All Steps..." : "Analyze & Recreate"}
                         </button>
                     </div>
                 )}
@@ -8,6 +8,7 @@ export const API_ROUTES = {
   },
   KOLAM: {
     KNOW_YOUR_KOLAM: `${BASE_URL}/know-your-kolam`,
+    ANALYZE: `${BASE_URL}/analyze`,
     RENDER: `${BASE_URL}/create_kolam`,
     PREDICT: `${BASE_URL}/predict`,
     SEARCH: `${BASE_URL}/search`,
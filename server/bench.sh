@@ -0,0 +1,2 @@
+python3 -m benchmarks.stages "$@"
+# e.g. ./bench.sh --save-baseline benchmarks/baselines/cpu.json, later ./bench.sh --baseline benchmarks/baselines/cpu.json
\ No newline at end of file
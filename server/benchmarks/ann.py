@@ -0,0 +1,161 @@
+# FILE: server/benchmarks/ann.py
+"""
+Recall versus latency of the similarity index types (src/api/ann.py).
+
+Run from server/:
+
+    python -m benchmarks.ann                          # 100k vectors, every type
+    python -m benchmarks.ann --vectors 1000000 --types ivf-pq,hnsw --nprobe 8,32 --ef 32,128
+
+The CLIP vectors of the shipped index are padded out to --vectors with
+synthetic ones drawn around them (clusters with CLIP-like norms), so the
+numbers hold at corpus sizes we do not have yet. Queries are held-out
+perturbed points; recall@k is measured against exact cosine search.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from benchmarks.corpus import SERVER_DIR
+from src.api import ann, snapshots
+
+
+def load_vectors(n: int, d: int = 512, seed: int = 0) -> np.ndarray:
+    """Raw (unnormalized) vectors: the shipped index's, plus synthetic clusters around them."""
+    rng = np.random.default_rng(seed)
+    real = np.empty((0, d), dtype="float32")
+    snapshot = snapshots.current(os.path.join(SERVER_DIR, "image_index.faiss"),
+                                 os.path.join(SERVER_DIR, "image_index.meta"))
+    if snapshot is not None:
+        index = faiss.read_index(snapshot.index_file)
+        if isinstance(index, faiss.IndexIDMap) or isinstance(index, faiss.IndexIVF):
+            real = ann.stored_vectors(index)[1]
+        else:
+            real = index.reconstruct_n(0, index.ntotal)
+        d = real.shape[1]
+    real = real[:n]
+
+    # Cluster centres near the real vectors (or random), members spread around them
+    centres = max(1, (n - len(real)) // 200)
+    base = real[rng.integers(0, len(real), centres)] if len(real) else rng.normal(0, 1, (centres, d))
+    base = base / np.linalg.norm(base, axis=1, keepdims=True)
+    directions = rng.normal(0, 1, (centres, d))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    centres_unit = base + 0.6 * directions
+    centres_unit /= np.linalg.norm(centres_unit, axis=1, keepdims=True)
+
+    synthetic = centres_unit[rng.integers(0, centres, n - len(real))]
+    synthetic = synthetic + rng.normal(0, 0.25 / np.sqrt(d), synthetic.shape)
+    synthetic /= np.linalg.norm(synthetic, axis=1, keepdims=True)
+    synthetic *= rng.uniform(8, 12, (len(synthetic), 1))  # CLIP ViT-B/32 image features have norm ~10
+    return np.vstack([real, synthetic.astype("float32")]).astype("float32")
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(0, len(vectors), count)]
+    norms = np.linalg.norm(picked, axis=1, keepdims=True)
+    return (picked + rng.normal(0, 1, picked.shape) * norms * 0.3 / np.sqrt(vectors.shape[1])).astype("float32")
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def evaluate(kind: str, vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int,
+             knobs: list) -> list:
+    ids = np.arange(len(vectors), dtype="int64")
+    started = time.perf_counter()
+    prepared = ann.prepare(vectors, kind)
+    index, built = ann.make_index(kind, vectors.shape[1], prepared)
+    index.add_with_ids(prepared, ids)
+    build_seconds = time.perf_counter() - started
+    size_mb = len(faiss.serialize_index(index)) / 1e6
+    query_vectors = ann.prepare(queries, built)
+
+    rows = []
+    for knob in knobs:
+        if built.startswith("ivf"):
+            ann.tune(index, nprobe=knob)
+        elif built == "hnsw":
+            ann.tune(index, ef_search=knob)
+        latencies, found = [], []
+        for query in query_vectors:
+            t = time.perf_counter()
+            _, result = index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - t) * 1000)
+            found.append(result[0])
+        rows.append({
+            "type": built,
+            "knob": None if knob is None else (f"nprobe={knob}" if built.startswith("ivf") else f"efSearch={knob}"),
+            f"recall@{k}": round(recall(np.array(found), truth), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            "build_s": round(build_seconds, 2),
+            "size_mb": round(size_mb, 1),
+        })
+    return rows
+
+
+def _print_table(rows: list, k: int) -> None:
+    header = f"{'type':10} {'knob':14} {'recall@' + str(k):>10} {'p50 ms':>9} {'p99 ms':>9} {'build s':>9} {'MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['type']:10} {row['knob'] or '-':14} {row[f'recall@{k}']:>10.4f} {row['p50_ms']:>9.3f} "
+              f"{row['p99_ms']:>9.3f} {row['build_s']:>9.2f} {row['size_mb']:>8.1f}")
+
+
+def _ints(value: str) -> list:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Recall vs latency of the similarity index types.")
+    parser.add_argument("--vectors", type=int, default=100_000, help="index size")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", default=",".join(ann.INDEX_TYPES))
+    parser.add_argument("--nprobe", type=_ints, default=[1, 4, 16, 64], help="IVF lists scanned per query")
+    parser.add_argument("--ef", type=_ints, default=[16, 64, 256], help="HNSW efSearch values")
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads (1 = per-request latency)")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    types = [t.strip() for t in args.types.split(",") if t.strip()]
+    unknown = [t for t in types if t not in ann.INDEX_TYPES]
+    if unknown:
+        parser.error(f"unknown index types: {', '.join(unknown)}")
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+
+    vectors = load_vectors(args.vectors)
+    queries = make_queries(vectors, args.queries)
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(ann.prepare(vectors, "flat-ip"))
+    _, truth = exact.search(ann.prepare(queries, "flat-ip"), args.k)
+    print(f"{len(vectors)} vectors, {len(queries)} queries, d={vectors.shape[1]}", file=sys.stderr)
+
+    rows = []
+    for kind in types:
+        print(f"▶ {kind} ...", file=sys.stderr)
+        knobs = args.nprobe if kind.startswith("ivf") else args.ef if kind == "hnsw" else [None]
+        rows.extend(evaluate(kind, vectors, queries, truth, args.k, knobs))
+    _print_table(rows, args.k)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"vectors": len(vectors), "queries": len(queries), "k": args.k, "results": rows}, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+# FILE: server/benchmarks/corpus.py
+import os
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIRS = (
+    os.path.join(SERVER_DIR, "imgdata"),
+    os.path.join(SERVER_DIR, "..", "client", "public", "kolam"),
+)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+# Long side of the synthetic "large" variant; close to what phones upload.
+LARGE_SIDE = 4000
+
+
+def corpus_files(dirs=CORPUS_DIRS) -> List[str]:
+    files = []
+    for directory in dirs:
+        if os.path.isdir(directory):
+            files.extend(
+                os.path.join(directory, f) for f in sorted(os.listdir(directory))
+                if f.lower().endswith(IMAGE_EXTENSIONS)
+            )
+    return files
+
+
+def large_variant(img: np.ndarray) -> np.ndarray:
+    h, w = img.shape[:2]
+    scale = LARGE_SIDE / max(h, w)
+    return cv2.resize(img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_CUBIC)
+
+
+def noisy_variant(img: np.ndarray, seed: int) -> np.ndarray:
+    """Sensor noise, salt-and-pepper specks and a low-quality JPEG round trip."""
+    rng = np.random.default_rng(seed)
+    noisy = img.astype(np.int16) + rng.normal(0, 12, img.shape).astype(np.int16)
+    noisy = np.clip(noisy, 0, 255).astype(np.uint8)
+    specks = rng.random(img.shape[:2])
+    noisy[specks < 0.005] = 0
+    noisy[specks > 0.995] = 255
+    ok, encoded = cv2.imencode(".jpg", noisy, [cv2.IMWRITE_JPEG_QUALITY, 60])
+    return cv2.imdecode(encoded, cv2.IMREAD_COLOR) if ok else noisy
+
+
+def load_corpus(limit: int = 0, synthetic: int = 4) -> List[Tuple[str, np.ndarray]]:
+    """
+    Decoded BGR images of the bundled corpus (optionally the first `limit`),
+    plus large and noisy variants of the first `synthetic` of them. The
+    variants are seeded, so every run benchmarks the same pixels.
+    """
+    images = []
+    for path in corpus_files():
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is not None:
+            name = os.path.relpath(path, SERVER_DIR)
+            images.append((name, img))
+        if limit and len(images) >= limit:
+            break
+
+    variants = []
+    for i, (name, img) in enumerate(images[:synthetic]):
+        variants.append((f"{name}#large", large_variant(img)))
+        variants.append((f"{name}#noisy", noisy_variant(img, seed=i)))
+    return images + variants
@@ -0,0 +1,317 @@
+# FILE: server/benchmarks/loadtest.py
+"""
+End-to-end load test of the API against local provider stubs.
+
+Run from server/:
+
+    python -m benchmarks.loadtest --concurrency 16 --duration 60
+    python -m benchmarks.loadtest --mix know-your-kolam:3,recreate:1 --requests 500 --workers 4
+    python -m benchmarks.loadtest --target http://127.0.0.1:8000   # an already running server
+
+Unless --target is given, this starts the Gemini and Stability stubs and
+the API (uvicorn, --workers processes) with caches, jobs and metrics in a
+temporary directory, so no API quota is used and every run starts cold.
+Rendered and generated images still land in server/img.
+
+Uploads are drawn from the benchmark corpus; --unique-fraction of them get
+random trailing bytes, which defeats the exact-match cache but not the
+perceptual one, like a re-upload of the same photo.
+"""
+import argparse
+import asyncio
+import json
+import mimetypes
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks.corpus import SERVER_DIR, corpus_files
+from benchmarks.stubs import TEXT_MODES, add_behaviour_arguments
+
+DEFAULT_MIX = "know-your-kolam:4,know-and-create-kolam:2,recreate:2,predict:1,search:1,llm:1,stability:1"
+ENDPOINTS = ("know-your-kolam", "know-and-create-kolam", "recreate", "predict", "search", "llm", "stability")
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    mix = []
+    for item in spec.split(","):
+        name, _, weight = item.strip().partition(":")
+        if name not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float, process: Optional[subprocess.Popen] = None) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} before becoming ready")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+class Stack:
+    """The stub providers and the API as child processes, torn down together."""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="kolam-load-")
+        self.processes: List[subprocess.Popen] = []
+        self.target = None
+
+    def _spawn(self, cmd: List[str], env: Optional[dict] = None) -> subprocess.Popen:
+        log = open(os.path.join(self.workdir, f"{len(self.processes)}-{cmd[2].split('.')[-1]}.log"), "w")
+        process = subprocess.Popen(cmd, cwd=SERVER_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+                                   start_new_session=True)
+        self.processes.append(process)
+        return process
+
+    def _stub(self, provider: str, prefix: str) -> str:
+        a = self.args
+        port = _free_port()
+        cmd = [sys.executable, "-m", "benchmarks.stubs", provider, "--port", str(port)]
+        for option in ("latency-ms", "jitter-ms", "error-rate", "error-status", "image-size"):
+            cmd += [f"--{option}", str(getattr(a, f"{prefix}_{option.replace('-', '_')}"))]
+        if provider == "gemini":
+            cmd += ["--text-mode", a.text_mode]
+        process = self._spawn(cmd)
+        url = f"http://127.0.0.1:{port}"
+        _wait_ready(f"{url}/healthz", 30, process)
+        return url
+
+    def start(self) -> str:
+        gemini_url = self._stub("gemini", "gemini")
+        stability_url = self._stub("stability", "stability")
+
+        env = dict(os.environ)
+        env.update({
+            "GEMINI_BASE_URL": gemini_url,
+            "GOOGLE_API_KEY": "stub",
+            "STABILITY_BASE_URL": stability_url,
+            "STABILITY_API_KEY": "stub",
+            "KOLAM_CACHE_DB": os.path.join(self.workdir, "cache.sqlite"),
+            "KOLAM_JOBS_DB": os.path.join(self.workdir, "jobs.sqlite"),
+            "KOLAM_METRICS_DIR": os.path.join(self.workdir, "metrics"),
+            "KOLAM_PROFILE_DIR": os.path.join(self.workdir, "profiles"),
+        })
+        # The auth settings have no defaults; give the API a throwaway database unless configured.
+        env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(self.workdir, 'auth.db')}")
+        env.setdefault("SECRET_KEY", "loadtest")
+        env.setdefault("ALGORITHM", "HS256")
+        env.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+        port = _free_port()
+        process = self._spawn([sys.executable, "-m", "uvicorn", "src.api.main:app", "--host", "127.0.0.1",
+                               "--port", str(port), "--workers", str(self.args.workers),
+                               "--log-level", "warning"], env=env)
+        self.target = f"http://127.0.0.1:{port}"
+        _wait_ready(f"{self.target}/healthz", self.args.startup_timeout, process)
+        self._wait_warm(process)
+        return self.target
+
+    def _wait_warm(self, process: subprocess.Popen) -> None:
+        """Give the warmup a chance to finish, but drive load anyway if it does not."""
+        try:
+            _wait_ready(f"{self.target}/readyz", self.args.startup_timeout, process)
+        except RuntimeError as e:
+            if process.poll() is not None:
+                raise
+            print(f"⚠️ {e}; starting anyway, first requests will load models", file=sys.stderr)
+
+    def stop(self) -> None:
+        for process in reversed(self.processes):
+            if process.poll() is None:
+                os.killpg(process.pid, signal.SIGTERM)
+        for process in self.processes:
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+
+
+# -----------------------------------------------------------
+# Driving load
+# -----------------------------------------------------------
+class Uploads:
+    def __init__(self, unique_fraction: float, seed: int = 0):
+        self.files = []
+        for path in corpus_files():
+            with open(path, "rb") as f:
+                content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+                self.files.append((os.path.basename(path), f.read(), content_type))
+        if not self.files:
+            raise RuntimeError("No corpus images found")
+        self.unique_fraction = unique_fraction
+        self._rng = random.Random(seed)
+
+    def next(self) -> Tuple[str, bytes, str]:
+        name, data, content_type = self._rng.choice(self.files)
+        if self._rng.random() < self.unique_fraction:
+            # Decoders ignore bytes after the image, but the content hash changes.
+            data = data + self._rng.randbytes(16)
+        return name, data, content_type
+
+
+async def drive(target: str, mix: List[Tuple[str, float]], uploads: Uploads, concurrency: int,
+                requests: int, duration: float, timeout: float) -> Dict[str, list]:
+    """Closed loop: `concurrency` clients each send the next request as soon as the last one returns."""
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    rng = random.Random(1)
+    samples: Dict[str, list] = {name: [] for name in names}
+    issued = 0
+    deadline = time.monotonic() + duration if duration else None
+
+    def more() -> bool:
+        nonlocal issued
+        if requests and issued >= requests:
+            return False
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        issued += 1
+        return True
+
+    async def client(http: httpx.AsyncClient):
+        while more():
+            endpoint = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await http.post(f"/api/{endpoint}", files={"file": uploads.next()})
+                status = response.status_code
+                ok = status < 400 and "error" not in _json(response)
+            except httpx.HTTPError as e:
+                status, ok = type(e).__name__, False
+            samples[endpoint].append((time.perf_counter() - started, status, ok))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=target, timeout=timeout, limits=limits) as http:
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+    return samples
+
+
+def _json(response: httpx.Response) -> dict:
+    # Several endpoints report failures as {"error": ...} with a 200 status.
+    try:
+        body = response.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+def summarize(samples: Dict[str, list], wall: float) -> dict:
+    endpoints = {}
+    everything = []
+    for endpoint, rows in samples.items():
+        if not rows:
+            continue
+        everything.extend(rows)
+        endpoints[endpoint] = _stats(rows, wall)
+    return {"wall_s": round(wall, 3), "total": _stats(everything, wall) if everything else {}, "endpoints": endpoints}
+
+
+def _stats(rows: list, wall: float) -> dict:
+    ms = np.array([r[0] for r in rows]) * 1000
+    errors = [r for r in rows if not r[2]]
+    statuses: Dict[str, int] = {}
+    for _, status, _ in rows:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(rows),
+        "throughput_per_s": round(len(rows) / wall, 3) if wall > 0 else None,
+        "error_rate": round(len(errors) / len(rows), 4),
+        "statuses": statuses,
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p90_ms": round(float(np.percentile(ms, 90)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+        "p99_ms": round(float(np.percentile(ms, 99)), 1),
+        "max_ms": round(float(ms.max()), 1),
+    }
+
+
+def _print_report(report: dict) -> None:
+    header = f"{'endpoint':<24}{'reqs':>7}{'req/s':>9}{'err %':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["endpoints"].items()) + ([("TOTAL", report["total"])] if report["total"] else [])
+    for name, s in rows:
+        print(f"{name:<24}{s['requests']:>7}{s['throughput_per_s']:>9}{s['error_rate'] * 100:>8.1f}"
+              f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the kolam API against stub providers.")
+    parser.add_argument("--target", help="URL of a running server (skip starting stubs and API)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes for the API")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint:weight list (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=0, help="stop after N requests")
+    parser.add_argument("--duration", type=float, default=0, help="stop after N seconds")
+    parser.add_argument("--unique-fraction", type=float, default=0.5,
+                        help="share of uploads made byte-distinct from the corpus files")
+    parser.add_argument("--timeout", type=float, default=300, help="per-request timeout in seconds")
+    parser.add_argument("--startup-timeout", type=float, default=300, help="seconds to wait for the API to load")
+    parser.add_argument("--text-mode", choices=TEXT_MODES, default="echo", help="gemini stub text replies")
+    parser.add_argument("--output", help="write the report as JSON here")
+    add_behaviour_arguments(parser, prefix="gemini-")
+    add_behaviour_arguments(parser, prefix="stability-")
+    args = parser.parse_args(argv)
+
+    if not args.requests and not args.duration:
+        args.requests = 200
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    uploads = Uploads(args.unique_fraction)
+
+    # Turn SIGTERM into an exception so the finally below still stops the stack
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    stack = None
+    try:
+        if args.target:
+            target = args.target.rstrip("/")
+        else:
+            stack = Stack(args)
+            print(f"Starting stubs and API (logs in {stack.workdir}) ...", file=sys.stderr)
+            target = stack.start()
+        print(f"Driving {target} with concurrency {args.concurrency} ...", file=sys.stderr)
+        started = time.perf_counter()
+        samples = asyncio.run(drive(target, mix, uploads, args.concurrency, args.requests, args.duration,
+                                    args.timeout))
+        report = summarize(samples, time.perf_counter() - started)
+    finally:
+        if stack is not None:
+            stack.stop()
+
+    report["config"] = {k: v for k, v in vars(args).items()}
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
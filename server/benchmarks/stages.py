@@ -0,0 +1,386 @@
+# FILE: server/benchmarks/stages.py
+"""
+Stage-level benchmarks over the bundled kolam corpus.
+
+Run from server/:
+
+    python -m benchmarks.stages                               # run and print
+    python -m benchmarks.stages --save-baseline benchmarks/baselines/cpu.json
+    python -m benchmarks.stages --baseline benchmarks/baselines/cpu.json
+
+Every stage runs in its own spawned process, so peak RSS is per stage and
+one stage's allocations do not leak into the next. CUDA is hidden; model
+stages whose weights or packages are missing are reported as unavailable
+instead of failing the run. With --baseline the exit status is 1 when a
+stage's median latency or peak RSS regresses past the threshold.
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.corpus import SERVER_DIR, load_corpus
+
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_RSS_THRESHOLD = 0.20
+
+
+class Unavailable(Exception):
+    """The stage cannot run in this environment (missing package, weights or index)."""
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _require(module: str):
+    try:
+        return __import__(module, fromlist=["_"])
+    except Exception as e:
+        raise Unavailable(f"cannot import {module}: {e}") from None
+
+
+# -----------------------------------------------------------
+# Stages: each setup returns one zero-argument call per corpus item.
+# Work needed to build the inputs happens here and is not timed.
+# -----------------------------------------------------------
+def _dots(image):
+    from src.api.img_processing import detect_dots_in_image
+    return [(int(x), int(y)) for x, y in detect_dots_in_image(image)]
+
+
+def setup_gate(corpus):
+    evaluate = _require("src.api.gate").evaluate
+    return [lambda img=img: evaluate(img) for _, img in corpus]
+
+
+def setup_detect_dots(corpus):
+    detect_dots_in_image = _require("src.api.img_processing").detect_dots_in_image
+    return [lambda img=img: detect_dots_in_image(img) for _, img in corpus]
+
+
+def setup_detect_lines_and_curves(corpus):
+    detect_lines_and_curves = _require("src.api.img_processing").detect_lines_and_curves
+    return [lambda img=img, dots=_dots(img): detect_lines_and_curves(img, dots) for _, img in corpus]
+
+
+def setup_recreate(corpus):
+    KolamRecreator = _require("src.api.recreate_logic").KolamRecreator
+    return [lambda img=img, dots=_dots(img): KolamRecreator().recreate(dots, img) for _, img in corpus]
+
+
+def _detected_kolams(corpus):
+    from src.api.img_processing import detect_lines_and_curves
+    kolams = []
+    for _, img in corpus:
+        dots = _dots(img)
+        lines, curves = detect_lines_and_curves(img, dots)
+        kolams.append((dots, [*lines, *curves]))
+    return kolams
+
+
+def setup_render_kolam(corpus):
+    render_kolam = _require("src.api.render").render_kolam
+    return [lambda dots=dots, paths=paths: render_kolam(dots, paths) for dots, paths in _detected_kolams(corpus)]
+
+
+def setup_calculate_kolam_metrics(corpus):
+    calculate_kolam_metrics = _require("src.api.kolam_pipeline").calculate_kolam_metrics
+    from src.api.schemas import Dot
+    return [
+        lambda dots=[Dot(x=x, y=y) for x, y in dots], paths=paths: calculate_kolam_metrics(dots, paths)
+        for dots, paths in _detected_kolams(corpus)
+    ]
+
+
+def _load_model(name: str):
+    """
+    Load a lazily registered model during setup, while the cwd is still the
+    server tree its weights are resolved against, so the load is not timed.
+    """
+    model_registry = _require("src.api.model_registry").model_registry
+    try:
+        return model_registry.get(name)
+    except Exception as e:
+        raise Unavailable(f"cannot load {name}: {type(e).__name__}: {e}") from None
+
+
+def _pil(img):
+    from PIL import Image
+    return Image.fromarray(img[:, :, ::-1])
+
+
+def setup_clip_embed(corpus):
+    vector = _require("src.api.vector")
+    _load_model("clip")
+    return [lambda image=_pil(img): vector._get_embedding(image) for _, img in corpus]
+
+
+def setup_faiss_search(corpus, top_k: int = 5):
+    """
+    Searches the shipped index. Queries are the stored vectors plus a little
+    noise, so this stage does not need CLIP to run.
+    """
+    faiss = _require("faiss")
+    snapshot = _require("src.api.snapshots").current(os.path.join(SERVER_DIR, "image_index.faiss"),
+                                                     os.path.join(SERVER_DIR, "image_index.meta"))
+    if snapshot is None:
+        raise Unavailable("no saved index in server/ (run build_index first)")
+    index = faiss.read_index(snapshot.index_file)
+    if index.ntotal == 0:
+        raise Unavailable("index is empty")
+    # ID-mapped indexes reconstruct by id; the wrapped index stores the rows in order
+    stored = faiss.downcast_index(index.index if isinstance(index, faiss.IndexIDMap) else index) \
+        .reconstruct_n(0, index.ntotal)
+    rng = np.random.default_rng(0)
+    queries = []
+    for i in range(len(corpus)):
+        vector = stored[i % index.ntotal]
+        queries.append((vector + rng.normal(0, 0.01 * np.abs(vector).mean(), vector.shape))
+                       .astype("float32")[None, :])
+    return [lambda q=q: index.search(q, top_k) for q in queries]
+
+
+def setup_cnn_predict(corpus):
+    predict = _require("src.api.inference").predict
+    _load_model("cnn")
+    return [lambda image=_pil(img): predict(image) for _, img in corpus]
+
+
+STAGES: Dict[str, Callable] = {
+    "gate": setup_gate,
+    "detect_dots": setup_detect_dots,
+    "detect_lines_and_curves": setup_detect_lines_and_curves,
+    "recreate": setup_recreate,
+    "render_kolam": setup_render_kolam,
+    "calculate_kolam_metrics": setup_calculate_kolam_metrics,
+    "clip_embed": setup_clip_embed,
+    "faiss_search": setup_faiss_search,
+    "cnn_predict": setup_cnn_predict,
+}
+
+
+# -----------------------------------------------------------
+# Running
+# -----------------------------------------------------------
+def _summarize(latencies: List[float], wall: float) -> dict:
+    ms = np.array(latencies) * 1000
+    return {
+        "calls": len(latencies),
+        "throughput_per_s": round(len(latencies) / wall, 3) if wall > 0 else None,
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def _run_stage(stage: str, options: dict) -> dict:
+    """Runs in a fresh process: build the corpus, set the stage up, time every call."""
+    os.chdir(SERVER_DIR)
+    if SERVER_DIR not in sys.path:
+        sys.path.insert(0, SERVER_DIR)
+    workdir = tempfile.mkdtemp(prefix="kolam-bench-")
+    # Keep caches, metrics snapshots and rendered SVGs out of the server tree.
+    os.environ["KOLAM_CACHE_DB"] = os.path.join(workdir, "cache.sqlite")
+    os.environ["KOLAM_JOBS_DB"] = os.path.join(workdir, "jobs.sqlite")
+    os.environ["KOLAM_METRICS_DIR"] = os.path.join(workdir, "metrics")
+    os.environ["KOLAM_PROFILE_DIR"] = os.path.join(workdir, "profiles")
+    os.makedirs(os.path.join(workdir, "img"), exist_ok=True)
+
+    if options["threads"]:
+        import cv2
+        cv2.setNumThreads(options["threads"])
+        try:
+            import torch
+            torch.set_num_threads(options["threads"])
+        except ImportError:
+            pass
+
+    result = {"stage": stage}
+    quiet = io.StringIO()
+    try:
+        corpus = load_corpus(options["limit"], options["synthetic"])
+        with contextlib.redirect_stdout(quiet):
+            calls = STAGES[stage](corpus)
+        result["items"] = len(calls)
+        result["setup_rss_mb"] = _peak_rss_mb()
+
+        # Model stages must be loaded from the server tree; outputs go to the workdir.
+        os.chdir(workdir)
+        with contextlib.redirect_stdout(quiet):
+            for call in calls[:options["warmup"]]:
+                call()
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(options["repeat"]):
+                for call in calls:
+                    t0 = time.perf_counter()
+                    call()
+                    latencies.append(time.perf_counter() - t0)
+            wall = time.perf_counter() - started
+        result.update(_summarize(latencies, wall))
+        result["peak_rss_mb"] = _peak_rss_mb()
+        result["status"] = "ok"
+    except Unavailable as e:
+        result.update(status="unavailable", reason=str(e))
+    except Exception as e:
+        result.update(status="error", reason=f"{type(e).__name__}: {e}",
+                      traceback=traceback.format_exc(limit=5))
+    finally:
+        os.chdir(SERVER_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def _stage_worker(stage: str, options: dict, queue) -> None:
+    queue.put(_run_stage(stage, options))
+
+
+def run_stage(stage: str, options: dict) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_stage_worker, args=(stage, options, queue))
+    process.start()
+    try:
+        return queue.get(timeout=options["timeout"])
+    except Exception:
+        return {"stage": stage, "status": "error",
+                "reason": f"no result within {options['timeout']}s (exit code {process.exitcode})"}
+    finally:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+
+
+def environment() -> dict:
+    env = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+    for module in ("cv2", "torch", "faiss"):
+        try:
+            env[module] = __import__(module).__version__
+        except Exception:
+            env[module] = None
+    return env
+
+
+def compare(results: dict, baseline: dict, threshold: float, rss_threshold: float) -> List[str]:
+    """
+    Regressions against the baseline, as messages: any change of a stage's
+    status (e.g. ok -> error or unavailable), and for stages that ran in both
+    a median latency or peak RSS increase past its threshold.
+    """
+    regressions = []
+    previous = {s["stage"]: s for s in baseline.get("stages", [])}
+    for current in results["stages"]:
+        before = previous.get(current["stage"])
+        if before is None:
+            continue
+        if current.get("status") != before.get("status"):
+            reason = f" ({current['reason']})" if current.get("reason") else ""
+            regressions.append(f"{current['stage']}: status {before.get('status')} -> {current.get('status')}{reason}")
+            continue
+        if current.get("status") != "ok":
+            continue
+        for metric, limit in (("p50_ms", threshold), ("peak_rss_mb", rss_threshold)):
+            if before[metric] and current[metric] > before[metric] * (1 + limit):
+                regressions.append(
+                    f"{current['stage']}: {metric} {before[metric]} -> {current[metric]} "
+                    f"(+{(current[metric] / before[metric] - 1) * 100:.0f}%, limit +{limit * 100:.0f}%)"
+                )
+    return regressions
+
+
+def _print_table(results: dict) -> None:
+    header = f"{'stage':<26}{'items':>7}{'thru/s':>12}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'peak MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for s in results["stages"]:
+        if s["status"] == "ok":
+            print(f"{s['stage']:<26}{s['items']:>7}{s['throughput_per_s']:>12}{s['p50_ms']:>11}"
+                  f"{s['p95_ms']:>11}{s['p99_ms']:>11}{s['peak_rss_mb']:>9}")
+        else:
+            print(f"{s['stage']:<26}  {s['status']}: {s['reason']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the kolam processing stages on CPU.")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of: " + ", ".join(STAGES))
+    parser.add_argument("--limit", type=int, default=0, help="only the first N corpus images (0 = all)")
+    parser.add_argument("--synthetic", type=int, default=4, help="add large and noisy variants of the first N images")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the corpus per stage")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed calls before measuring")
+    parser.add_argument("--threads", type=int, default=0, help="pin OpenCV / torch threads (0 = library default)")
+    parser.add_argument("--timeout", type=float, default=1800, help="seconds allowed per stage")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--save-baseline", help="write results JSON here as the new baseline")
+    parser.add_argument("--baseline", help="compare against this baseline and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative increase of median latency")
+    parser.add_argument("--rss-threshold", type=float, default=DEFAULT_RSS_THRESHOLD,
+                        help="allowed relative increase of peak RSS")
+    args = parser.parse_args(argv)
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    # CPU only, whatever the host has.
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    options = {k: getattr(args, k) for k in ("limit", "synthetic", "repeat", "warmup", "threads", "timeout")}
+    results = {"created_at": time.time(), "environment": environment(), "options": options, "stages": []}
+    for stage in stages:
+        print(f"▶ {stage} ...", file=sys.stderr)
+        results["stages"].append(run_stage(stage, options))
+    _print_table(results)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("environment", {}).get("machine") != results["environment"]["machine"] \
+                or baseline.get("environment", {}).get("cpu_count") != results["environment"]["cpu_count"]:
+            print("⚠️ Baseline was recorded on a different machine; timings may not be comparable.")
+        if baseline.get("options") != options:
+            print("⚠️ Baseline was recorded with different options.")
+        regressions = compare(results, baseline, args.threshold, args.rss_threshold)
+        if regressions:
+            print("❌ Regressions:")
+            for message in regressions:
+                print(f"  {message}")
+            return 1
+        print("✅ No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
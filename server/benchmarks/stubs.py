@@ -0,0 +1,160 @@
+# FILE: server/benchmarks/stubs.py
+"""
+Local stand-ins for the Gemini and Stability APIs, for load tests.
+
+    python -m benchmarks.stubs gemini --port 8101 --latency-ms 1500 --error-rate 0.02
+    python -m benchmarks.stubs stability --port 8102 --latency-ms 4000
+
+Point the API at them with GEMINI_BASE_URL / STABILITY_BASE_URL. Latency is
+simulated with asyncio.sleep, so one stub process serves any concurrency.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import random
+import re
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from PIL import Image
+
+TEXT_MODES = ("echo", "fenced", "invalid")
+
+
+class StubBehaviour:
+    """How a stub responds: latency (mean +/- uniform jitter), failure rate and payload size."""
+
+    def __init__(self, latency_ms: float = 1000, jitter_ms: float = 250, error_rate: float = 0.0,
+                 error_status: int = 503, image_size: int = 1024, text_mode: str = "echo", seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.image_size = image_size
+        self.text_mode = text_mode
+        self._rng = random.Random(seed)
+        self._image_b64 = None
+
+    async def delay(self) -> None:
+        seconds = (self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        await asyncio.sleep(max(0.0, seconds))
+
+    def fails(self) -> bool:
+        return self._rng.random() < self.error_rate
+
+    def image_b64(self) -> str:
+        """A PNG of noise, so the payload does not compress away (generated once)."""
+        if self._image_b64 is None:
+            pixels = np.random.default_rng(0).integers(0, 256, (self.image_size, self.image_size, 3), dtype=np.uint8)
+            buffer = io.BytesIO()
+            Image.fromarray(pixels).save(buffer, format="PNG")
+            self._image_b64 = base64.b64encode(buffer.getvalue()).decode()
+        return self._image_b64
+
+
+def _gemini_text(prompt: str, mode: str) -> str:
+    if mode == "invalid":
+        return "I'm sorry, I can't help with that kolam."
+    # Echo the kolam embedded in llm_prompt_for_kolam's prompt, so callers get valid JSON back.
+    match = re.search(r"### Input Kolam\s*(\{.*\})\s*Now return", prompt, re.S)
+    text = match.group(1) if match else json.dumps({"dots": [], "paths": []})
+    return f"```json\n{text}\n```" if mode == "fenced" else text
+
+
+def gemini_app(behaviour: StubBehaviour) -> FastAPI:
+    app = FastAPI(title="Gemini stub")
+    app.state.requests = 0
+
+    @app.get("/healthz")
+    def healthz():
+        return {"ok": True, "requests": app.state.requests}
+
+    @app.post("/{version}/models/{target}")
+    async def generate_content(version: str, target: str, request: Request):
+        app.state.requests += 1
+        body = await request.json()
+        await behaviour.delay()
+        if behaviour.fails():
+            return JSONResponse(status_code=behaviour.error_status, content={"error": {
+                "code": behaviour.error_status, "message": "Stubbed failure", "status": "UNAVAILABLE"}})
+
+        parts = [part for content in body.get("contents", []) for part in content.get("parts", [])]
+        if any("inlineData" in part or "inline_data" in part for part in parts):
+            reply = {"inlineData": {"mimeType": "image/png", "data": behaviour.image_b64()}}
+        else:
+            prompt = "\n".join(part.get("text", "") for part in parts)
+            reply = {"text": _gemini_text(prompt, behaviour.text_mode)}
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [reply]}, "finishReason": "STOP", "index": 0}],
+            "modelVersion": target.split(":")[0],
+        }
+
+    return app
+
+
+def stability_app(behaviour: StubBehaviour) -> FastAPI:
+    app = FastAPI(title="Stability stub")
+    app.state.requests = 0
+
+    @app.get("/healthz")
+    def healthz():
+        return {"ok": True, "requests": app.state.requests}
+
+    @app.post("/v2beta/stable-image/generate/core")
+    async def generate_core(request: Request):
+        app.state.requests += 1
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return JSONResponse(status_code=401, content={"errors": ["authorization: missing"], "name": "unauthorized"})
+        form = await request.form()
+        if "prompt" not in form:
+            return JSONResponse(status_code=400, content={"errors": ["prompt: required"], "name": "bad_request"})
+        await behaviour.delay()
+        if behaviour.fails():
+            return JSONResponse(status_code=behaviour.error_status,
+                                content={"errors": ["Stubbed failure"], "name": "service_unavailable"})
+        return {"image": behaviour.image_b64(), "finish_reason": "SUCCESS", "seed": 0}
+
+    return app
+
+
+APPS = {"gemini": gemini_app, "stability": stability_app}
+
+
+def add_behaviour_arguments(parser: argparse.ArgumentParser, prefix: str = "") -> None:
+    parser.add_argument(f"--{prefix}latency-ms", type=float, default=1000)
+    parser.add_argument(f"--{prefix}jitter-ms", type=float, default=250)
+    parser.add_argument(f"--{prefix}error-rate", type=float, default=0.0)
+    parser.add_argument(f"--{prefix}error-status", type=int, default=503)
+    parser.add_argument(f"--{prefix}image-size", type=int, default=1024, help="side of generated images in px")
+
+
+def behaviour_from_args(args, prefix: str = "") -> StubBehaviour:
+    prefix = prefix.replace("-", "_")
+    return StubBehaviour(
+        latency_ms=getattr(args, f"{prefix}latency_ms"),
+        jitter_ms=getattr(args, f"{prefix}jitter_ms"),
+        error_rate=getattr(args, f"{prefix}error_rate"),
+        error_status=getattr(args, f"{prefix}error_status"),
+        image_size=getattr(args, f"{prefix}image_size"),
+        text_mode=getattr(args, "text_mode", "echo"),
+    )
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serve a stub Gemini or Stability API.")
+    parser.add_argument("provider", choices=sorted(APPS))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--text-mode", choices=TEXT_MODES, default="echo",
+                        help="gemini text replies: echo the input kolam, echo it in a code fence, or non-JSON")
+    add_behaviour_arguments(parser)
+    args = parser.parse_args(argv)
+    uvicorn.run(APPS[args.provider](behaviour_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
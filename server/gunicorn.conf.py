@@ -0,0 +1,36 @@
+# FILE: server/gunicorn.conf.py
+#
+# Pre-fork serving with shared models:
+#
+#     gunicorn -c gunicorn.conf.py src.api.main:app
+#
+# The master imports the app and loads the models before forking, so workers
+# share the weights and the FAISS index copy-on-write instead of loading N
+# copies. Compare kolam_worker_memory_bytes{kind="pss"} (or /api/admin/memory)
+# against `uvicorn --workers N` to see the difference.
+import gc
+import os
+
+bind = os.environ.get("KOLAM_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("KOLAM_WORKERS", 2))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.environ.get("KOLAM_WORKER_TIMEOUT", 300))
+preload_app = True
+
+# Collections in the master would touch every object header and un-share the
+# pages; nothing is collected until the heap is frozen just before forking.
+gc.disable()
+
+
+def when_ready(server):
+    from src.api.model_registry import model_registry, warmup_names
+
+    model_registry.preload(warmup_names())
+    # Move everything allocated so far out of the collector's reach, so
+    # workers' collections do not write to (and copy) the shared pages.
+    gc.freeze()
+    server.log.info("Models preloaded and heap frozen (%d objects)", gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    gc.enable()
@@ -0,0 +1,2 @@
+python3 -m src.api.vector "$@"
+# e.g. ./index.sh build --batch-size 64 --workers 4 (see --help)
\ No newline at end of file
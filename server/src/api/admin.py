@@ -0,0 +1,118 @@
+# FILE: server/src/api/admin.py
+import hashlib
+import os
+import secrets
+import time
+
+from fastapi import APIRouter, Depends, File, Header, HTTPException, UploadFile
+from fastapi.responses import FileResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from src.api import profiling, vector
+from src.api.ingest import decode_image, read_upload
+from src.api.metrics import registry
+from src.api.model_registry import model_registry
+
+ADMIN_TOKEN = os.environ.get("KOLAM_ADMIN_TOKEN")
+
+
+def require_admin(x_admin_token: str = Header(default="")):
+    """Admin endpoints are disabled unless KOLAM_ADMIN_TOKEN is set, and then need it in X-Admin-Token."""
+    if not ADMIN_TOKEN or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+admin_router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@admin_router.get("/profiles")
+def list_profiles():
+    return {"profiles": profiling.list_profiles()}
+
+
+@admin_router.get("/profiles/{profile_id}")
+def download_profile(profile_id: str, format: str = "pstats"):
+    path = profiling.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "pstats":
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.pstats")
+    if format == "speedscope":
+        return JSONResponse(
+            profiling.to_speedscope(path, profile_id),
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.speedscope.json"'},
+        )
+    raise HTTPException(status_code=400, detail="format must be 'pstats' or 'speedscope'")
+
+
+@admin_router.get("/memory")
+def worker_memory():
+    """Per-worker memory from the metrics snapshots; total PSS is what the workers really use."""
+    workers = []
+    for snapshot in registry.worker_snapshots():
+        samples = snapshot["metrics"].get("kolam_worker_memory_bytes", {}).get("samples", {})
+        memory = {key.split("|")[1]: value for key, value in samples.items()}
+        workers.append({"pid": snapshot["pid"], **memory})
+    workers.sort(key=lambda w: w["pid"])
+    return {"workers": workers, "total_pss": sum(w.get("pss", 0) for w in workers)}
+
+
+# -----------------------------------------------------------
+# Similarity index: incremental updates without a rebuild
+# -----------------------------------------------------------
+@admin_router.get("/index")
+def index_status():
+    return vector.index_status()
+
+
+@admin_router.post("/index/sync")
+def sync_index():
+    """Diff the data folder against the index: embed and add new files, drop deleted ones."""
+    model_registry.get("faiss_index")
+    return vector.sync_index(workers=0, progress=False)
+
+
+@admin_router.post("/index/reload")
+def reload_index():
+    """Swap in the newest saved snapshot now rather than at the next check (only reaches the worker serving it)."""
+    model_registry.get("faiss_index")
+    return {"swapped": vector.reload_index(), **vector.index_status()}
+
+
+@admin_router.post("/index/images")
+async def add_index_image(file: UploadFile = File(...)):
+    """Store an image in the data folder under its content hash and make it searchable at once."""
+    data = await read_upload(file)
+    decode_image(data)  # reject anything that is not an image before it lands in the data folder
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    path = os.path.join(vector.DATA_DIR, f"{hashlib.sha256(data).hexdigest()[:16]}"
+                                         f"{suffix if suffix in vector.IMAGE_SUFFIXES else '.png'}")
+    # The same content may already be stored (and indexed) under this name: leave that file alone
+    created = not os.path.exists(path)
+    if created:
+        with open(path, "wb") as f:
+            f.write(data)
+
+    started = time.perf_counter()
+    await run_in_threadpool(model_registry.get, "faiss_index")
+    ids = await run_in_threadpool(vector.add_images, [path])
+    if path not in ids:
+        if created:
+            os.remove(path)
+        raise HTTPException(status_code=400, detail="Could not embed image")
+    return {"id": ids[path], "path": path, "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+@admin_router.delete("/index/images")
+def remove_index_image(path: str, delete_file: bool = False):
+    """Drop an image from the index; delete_file also deletes it, if it is inside the data folder."""
+    data_dir = os.path.realpath(vector.DATA_DIR)
+    if delete_file and os.path.commonpath([os.path.realpath(path), data_dir]) != data_dir:
+        raise HTTPException(status_code=400, detail=f"Only files in {vector.DATA_DIR}/ can be deleted")
+    removed = vector.remove_images([path])
+    if not removed:
+        raise HTTPException(status_code=404, detail="Image not in index")
+    deleted = delete_file and os.path.isfile(path)
+    if deleted:
+        os.remove(path)
+    return {"removed": removed, "deleted": deleted}
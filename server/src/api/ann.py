@@ -0,0 +1,134 @@
+# FILE: server/src/api/ann.py
+import math
+import os
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+
+# Index used for similarity search (KOLAM_INDEX_TYPE):
+#   flat-ip   exact inner product on L2-normalized vectors (cosine), the default
+#   flat-l2   exact L2 on raw vectors, what indexes built before this option use
+#   ivf-flat  inverted lists over k-means cells; scans KOLAM_NPROBE of them
+#   ivf-pq    as ivf-flat with product-quantized codes (KOLAM_PQ_M bytes per vector)
+#   hnsw      graph search, no training; KOLAM_EF_SEARCH candidates per query
+INDEX_TYPES = ("flat-ip", "flat-l2", "ivf-flat", "ivf-pq", "hnsw")
+INDEX_TYPE = os.environ.get("KOLAM_INDEX_TYPE", "flat-ip")
+IVF_NLIST = int(os.environ.get("KOLAM_IVF_NLIST", 0))  # 0 = 4 * sqrt(n)
+PQ_M = int(os.environ.get("KOLAM_PQ_M", 64))
+HNSW_M = int(os.environ.get("KOLAM_HNSW_M", 32))
+NPROBE = int(os.environ.get("KOLAM_NPROBE", 16))
+EF_SEARCH = int(os.environ.get("KOLAM_EF_SEARCH", 64))
+TRAIN_SAMPLE = int(os.environ.get("KOLAM_INDEX_TRAIN_SAMPLE", 100_000))
+
+# k-means wants ~39 points per cell; below this many vectors a flat scan is faster anyway
+_MIN_POINTS_PER_LIST = 39
+_MIN_IVF_TRAIN = 1000
+
+
+def normalizes(kind: str) -> bool:
+    """Whether vectors are L2-normalized before they are added or searched."""
+    return kind != "flat-l2"
+
+
+def prepare(vectors: np.ndarray, kind: str) -> np.ndarray:
+    """float32, C-contiguous copy of vectors in the form the index stores them."""
+    vectors = np.array(vectors, dtype="float32", order="C", copy=True)
+    if normalizes(kind):
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def nlist_for(n: int) -> int:
+    return IVF_NLIST or max(1, min(65536, int(4 * math.sqrt(n)), n // _MIN_POINTS_PER_LIST))
+
+
+def trainable(kind: str, n: int) -> bool:
+    """Whether n vectors are enough to train an index of this kind."""
+    return not kind.startswith("ivf") or n >= _MIN_IVF_TRAIN
+
+
+def make_index(kind: str, d: int, train: Optional[np.ndarray] = None) -> Tuple[faiss.Index, str]:
+    """
+    An empty index of `kind` taking add_with_ids, trained on a sample of
+    `train` (already prepared). Kinds that need more training data than there
+    is fall back to flat-ip; returns the index and the kind actually built.
+
+    IVF indexes keep ids natively (an IndexIDMap over IVF breaks on removal,
+    since IVF does not shift ids); flat and HNSW are wrapped in IndexIDMap2.
+    """
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}', expected one of {', '.join(INDEX_TYPES)}")
+    n = 0 if train is None else len(train)
+    if not trainable(kind, n):
+        print(f"⚠️ {n} vectors are too few to train {kind}, using flat-ip until the next build")
+        kind = "flat-ip"
+
+    if kind == "flat-l2":
+        base = faiss.IndexFlatL2(d)
+    elif kind == "flat-ip":
+        base = faiss.IndexFlatIP(d)
+    elif kind == "hnsw":
+        base = faiss.IndexHNSWFlat(d, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    else:
+        quantizer = faiss.IndexFlatIP(d)
+        if kind == "ivf-flat":
+            base = faiss.IndexIVFFlat(quantizer, d, nlist_for(n), faiss.METRIC_INNER_PRODUCT)
+        else:
+            base = faiss.IndexIVFPQ(quantizer, d, nlist_for(n), PQ_M, 8, faiss.METRIC_INNER_PRODUCT)
+        sample = train
+        if len(train) > TRAIN_SAMPLE:
+            sample = train[np.random.default_rng(0).choice(len(train), TRAIN_SAMPLE, replace=False)]
+        base.train(sample)
+        # Lets reconstruct() and remove_ids() work with arbitrary ids
+        base.set_direct_map_type(faiss.DirectMap.Hashtable)
+        tune(base)
+        return base, kind
+
+    index = faiss.IndexIDMap2(base)
+    tune(index)
+    return index, kind
+
+
+def _base(index: faiss.Index) -> faiss.Index:
+    return faiss.downcast_index(index.index if isinstance(index, faiss.IndexIDMap) else index)
+
+
+def tune(index: faiss.Index, nprobe: int = NPROBE, ef_search: int = EF_SEARCH) -> None:
+    """Set the search-time knobs of an index from make_index (or read back from disk)."""
+    base = _base(index)
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = min(nprobe, base.nlist)
+    elif isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = ef_search
+
+
+def is_exact(index: faiss.Index) -> bool:
+    """Whether searching `index` compares the query with every stored vector (flat kinds)."""
+    return isinstance(_base(index), faiss.IndexFlat)
+
+
+def search_params(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Search parameters limiting `index` to the ids `selector` accepts, with its current tuning."""
+    base = _base(index)
+    if isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=base.nprobe)
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def supports_remove(index: faiss.Index) -> bool:
+    return not isinstance(_base(index), faiss.IndexHNSW)
+
+
+def stored_vectors(index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+    """(ids, vectors) held by an index from make_index; approximate for ivf-pq."""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.vector_to_array(index.id_map).astype("int64"), _base(index).reconstruct_n(0, index.ntotal)
+    ivf = faiss.extract_index_ivf(index)
+    lists = ivf.invlists
+    ids = np.concatenate([
+        faiss.rev_swig_ptr(lists.get_ids(i), lists.list_size(i)).copy() for i in range(lists.nlist)
+    ] or [np.empty(0, dtype="int64")]).astype("int64")
+    return ids, index.reconstruct_batch(ids) if len(ids) else np.empty((0, index.d), dtype="float32")
@@ -0,0 +1,115 @@
+# FILE: server/src/api/attributes.py
+"""
+What the similarity index records about each image besides its vector, so
+searches can be narrowed to part of the corpus ("similar kolams from Tamil
+Nadu only"): region, the CNN's predicted class and dot-grid size.
+"""
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from src.api.img_processing import detect_dots_in_image, estimate_grid_size
+from src.api.inference import predict_many
+
+ATTRIBUTES = ("region", "class", "grid")
+
+# The region folders of the training set (src/model/data) and the states of the
+# client's samples, with the names and abbreviations used for them in paths
+REGIONS = {
+    "TamilNadu": ("tamil nadu", "tn"),
+    "Maharastra": ("maharashtra", "mh"),
+    "AndhraPradesh": ("andhra pradesh", "ap"),
+    "Karnataka": ("kar",),
+}
+_ALIASES = {re.sub(r"[\s_-]", "", alias.lower()): name
+            for name, aliases in REGIONS.items() for alias in (name,) + aliases}
+# Sample files are named by region abbreviation and number: tn1.jpg, ap2.jpg, kar1.jpg
+_PREFIX = re.compile(r"^(tn|mh|ap|kar)\d", re.IGNORECASE)
+_DESCRIBE_BATCH = 32
+
+
+def region_name(value: str) -> Optional[str]:
+    """Canonical region for a name or abbreviation ("tn", "Tamil Nadu", "TamilNadu"); None if unknown."""
+    return _ALIASES.get(re.sub(r"[\s_-]", "", str(value).lower()))
+
+
+def region_of(path: str) -> Optional[str]:
+    """Region from a folder on the path (imgdata/TamilNadu/1.jpg) or the file name (tn1.jpg)."""
+    *folders, filename = os.path.normpath(path).split(os.sep)
+    for folder in reversed(folders):
+        region = region_name(folder)
+        if region:
+            return region
+    match = _PREFIX.match(filename)
+    return region_name(match.group(1)) if match else None
+
+
+def _grid(image: Image.Image) -> int:
+    return estimate_grid_size(detect_dots_in_image(np.asarray(image)[:, :, ::-1].copy()))
+
+
+def describe(paths: List[str], names: Iterable[str] = ATTRIBUTES) -> List[Dict[str, object]]:
+    """
+    Attributes of image files, path for path. Every name asked for is
+    present, None where it could not be determined (unreadable file, no CNN
+    weights, no region folder or prefix in the path). Region is only ever
+    read from the path; the CNN's prediction is recorded as the class, even
+    when its class names are regions, so a guess never passes a region filter.
+    """
+    names = tuple(names)
+    found = [dict.fromkeys(names) for _ in paths]
+    if "region" in names:
+        for row, path in enumerate(paths):
+            found[row]["region"] = region_of(path)
+    if not {"class", "grid"} & set(names):
+        return found
+
+    classify = "class" in names
+    for start in range(0, len(paths), _DESCRIBE_BATCH):
+        rows, images = [], []
+        for row in range(start, min(start + _DESCRIBE_BATCH, len(paths))):
+            try:
+                with Image.open(paths[row]) as image:
+                    images.append(image.convert("RGB"))
+                rows.append(row)
+            except (OSError, ValueError):
+                continue
+        if classify and images:
+            try:
+                for row, label in zip(rows, predict_many(images)):
+                    found[row]["class"] = label
+            except Exception as e:
+                print(f"⚠️ Not recording predicted classes: {type(e).__name__}: {e}")
+                classify = False
+        if "grid" in names:
+            for row, image in zip(rows, images):
+                found[row]["grid"] = _grid(image)
+    return found
+
+
+def parse_filters(region: Optional[str] = None, kolam_class: Optional[str] = None,
+                  grid: Optional[str] = None) -> Dict[str, set]:
+    """
+    Search filters from request parameters, each a comma-separated list of
+    accepted values. Raises ValueError for a region or grid size that
+    cannot match anything.
+    """
+    filters = {}
+    split = lambda value: [v.strip() for v in value.split(",") if v.strip()]
+    if region:
+        regions = {v: region_name(v) for v in split(region)}
+        unknown = [v for v, name in regions.items() if name is None]
+        if unknown:
+            raise ValueError(f"Unknown region {', '.join(unknown)}; expected one of {', '.join(REGIONS)}")
+        filters["region"] = set(regions.values())
+    if kolam_class:
+        filters["class"] = set(split(kolam_class))
+    if grid:
+        try:
+            filters["grid"] = {int(v) for v in split(grid)}
+        except ValueError:
+            raise ValueError(f"grid must be whole numbers of dots per side, got '{grid}'") from None
+    return filters
@@ -0,0 +1,96 @@
+# FILE: server/src/api/batching.py
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+from src.api.metrics import registry
+
+# How long the first request of a batch waits for others, and the most
+# requests per forward pass. A window of 0 turns batching off: every call
+# runs on its own in the caller's thread, as before.
+BATCH_WINDOW_MS = float(os.environ.get("KOLAM_BATCH_WINDOW_MS", 5))
+BATCH_MAX_SIZE = int(os.environ.get("KOLAM_BATCH_MAX_SIZE", 16))
+
+BATCH_SIZE = registry.histogram(
+    "kolam_batch_size", "Requests served by one batched model call", ("batcher",), buckets=(1, 2, 4, 8, 16, 32, 64))
+BATCH_WAIT = registry.histogram(
+    "kolam_batch_wait_seconds", "Time a request waited for its batch to start", ("batcher",))
+
+
+class MicroBatcher:
+    """
+    Runs `fn` over lists of items submitted concurrently from many threads.
+    The first item of a batch waits up to `window_ms` for company (less if
+    `max_size` items arrive first); `fn` receives them in one call and must
+    return one result per item, in order. Each caller blocks in submit()
+    until its own result is ready, and gets the exception if `fn` raised.
+
+    Batches run one at a time on a background thread, so the model is never
+    called concurrently; requests that arrive while a batch runs form the
+    next one.
+    """
+
+    def __init__(self, name: str, fn: Callable[[List[Any]], List[Any]], window_ms: float = BATCH_WINDOW_MS,
+                 max_size: int = BATCH_MAX_SIZE):
+        self.name = name
+        self.fn = fn
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, item: Any) -> Any:
+        if self.window <= 0 or self.max_size <= 1:
+            BATCH_SIZE.observe(1, batcher=self.name)
+            return self.fn([item])[0]
+        self._start()
+        future: Future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future.result()
+
+    def _start(self) -> None:
+        # Started on first use rather than at import, so it lives in the worker process
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name=f"kolam-batch-{self.name}", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Past the window, still take whatever is already queued
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for _, _, queued in batch:
+                BATCH_WAIT.observe(started - queued, batcher=self.name)
+            BATCH_SIZE.observe(len(batch), batcher=self.name)
+            try:
+                results = self.fn([item for item, _, _ in batch])
+            except BaseException as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            if len(results) != len(batch):
+                # zip() would silently leave the surplus callers blocked forever
+                error = RuntimeError(f"{self.name} returned {len(results)} results for {len(batch)} items")
+                for _, future, _ in batch:
+                    future.set_exception(error)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
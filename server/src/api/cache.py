@@ -0,0 +1,219 @@
+# FILE: server/src/api/cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+CACHE_DB = os.environ.get("KOLAM_CACHE_DB", "cache.sqlite")
+DEFAULT_MAX_ENTRIES = int(os.environ.get("KOLAM_CACHE_MAX_ENTRIES", 256))
+DEFAULT_MAX_DISK_ENTRIES = int(os.environ.get("KOLAM_CACHE_MAX_DISK_ENTRIES", 10_000))
+DEFAULT_TTL = float(os.environ.get("KOLAM_CACHE_TTL", 7 * 24 * 3600))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace   TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    value       TEXT NOT NULL,
+    expires_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+)
+"""
+
+
+class _SqliteStore:
+    """SQLite file shared by every worker process (WAL mode, one connection per process)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so reopen when the pid changes.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    def modify(self, sql: str, params: tuple = ()) -> int:
+        """Run a write statement and return the number of rows it touched."""
+        with self._lock:
+            return self._connection().execute(sql, params).rowcount
+
+
+_stores: Dict[str, _SqliteStore] = {}
+_caches: Dict[str, "ResultCache"] = {}
+_registry_lock = threading.RLock()
+
+
+def shared_store(path: str = CACHE_DB) -> _SqliteStore:
+    """Return the per-process handle on a shared SQLite cache file."""
+    with _registry_lock:
+        if path not in _stores:
+            _stores[path] = _SqliteStore(path)
+        return _stores[path]
+
+
+class ResultCache:
+    """
+    JSON result cache: a size- and TTL-bounded LRU in memory in front of a
+    SQLite store that all uvicorn workers share and that survives restarts.
+    """
+
+    def __init__(self, namespace: str, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl: float = DEFAULT_TTL, db_path: Optional[str] = CACHE_DB,
+                 max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._store = shared_store(db_path) if db_path else None
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._prune_hooks: List[Callable[[], None]] = []
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+                self.evictions += 1
+
+        if self._store is not None:
+            rows = self._store.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, key, now),
+            )
+            if rows:
+                value, expires_at = json.loads(rows[0][0]), rows[0][1]
+                self._store.execute(
+                    "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (now, self.namespace, key),
+                )
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, value, expires_at)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def peek(self, key: str, default: Any = None) -> Any:
+        """Like get(), but leaves hit/miss counters and recency untouched."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        if self._store is not None:
+            rows = self._store.execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, key, now),
+            )
+            if rows:
+                return json.loads(rows[0][0])
+        return default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self._writes += 1
+            prune = self._writes % 64 == 0
+
+        if self._store is not None:
+            self._store.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), expires_at, now),
+            )
+            if prune:
+                self._prune_disk(now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+        if self._store is not None:
+            self._store.execute("DELETE FROM cache WHERE namespace = ? AND key = ?",
+                                (self.namespace, key))
+
+    def _remember(self, key: str, value: Any, expires_at: float) -> None:
+        # Caller holds self._lock.
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _prune_disk(self, now: float) -> None:
+        """Drop expired rows and the least recently used rows beyond max_disk_entries."""
+        changed = self._store.modify("DELETE FROM cache WHERE namespace = ? AND expires_at <= ?",
+                                     (self.namespace, now))
+        changed += self._store.modify(
+            "DELETE FROM cache WHERE namespace = ? AND key IN ("
+            "  SELECT key FROM cache WHERE namespace = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_disk_entries),
+        )
+        with self._lock:
+            self.evictions += changed
+        for hook in self._prune_hooks:
+            hook()
+
+    def on_prune(self, hook: Callable[[], None]) -> None:
+        """Run `hook` after each disk prune, to drop rows that point at evicted keys."""
+        self._prune_hooks.append(hook)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
+        if self._store is not None:
+            stats["disk_entries"] = self._store.execute(
+                "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,))[0][0]
+        return stats
+
+
+def get_cache(namespace: str, **kwargs) -> ResultCache:
+    """Return the process-wide cache for a namespace, creating it on first use."""
+    with _registry_lock:
+        if namespace not in _caches:
+            _caches[namespace] = ResultCache(namespace, **kwargs)
+        return _caches[namespace]
+
+
+def cache_stats() -> dict:
+    """Hit/miss/eviction counters for every cache in this worker."""
+    return {name: c.stats() for name, c in list(_caches.items())}
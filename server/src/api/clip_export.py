@@ -0,0 +1,182 @@
+# FILE: server/src/api/clip_export.py
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import torch
+from clip.model import VisionTransformer
+
+from src.api.weights import load_module, save_state_dict
+
+# int8: Linear layers (most of the transformer's weights) dynamically quantized,
+#       saved as TorchScript since quantized weights cannot be memory-mapped
+# bf16: conv, linear and attention weights in bfloat16; only fast on CPUs with
+#       native support (AVX512-BF16 / AMX)
+# fp32: the image tower alone, without the text tower
+# auto: bf16 where the CPU supports it, int8 otherwise
+# bf16 and fp32 are plain state dicts, memory-mapped like the full model (weights.py).
+MODES = ("auto", "int8", "bf16", "fp32")
+
+# Below these an exported encoder is not written (export --force overrides)
+MIN_COSINE = 0.99
+MIN_TOPK_OVERLAP = 0.9
+
+
+def bf16_supported() -> bool:
+    check = getattr(torch.cpu, "_is_avx512_bf16_supported", None)
+    return bool(check and check()) or bool(getattr(torch.cpu, "_is_amx_tile_supported", lambda: False)())
+
+
+def resolve_mode(mode: str) -> str:
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}', expected one of {', '.join(MODES)}")
+    if mode == "auto":
+        return "bf16" if bf16_supported() else "int8"
+    return mode
+
+
+def _dtype(mode: str) -> torch.dtype:
+    return torch.bfloat16 if mode == "bf16" else torch.float32
+
+
+class ExportedVisual:
+    """
+    CLIP's image tower loaded on its own from an exported file. Has the
+    encode_image() the rest of vector.py uses; the text tower is never
+    loaded.
+    """
+
+    def __init__(self, module: torch.nn.Module, meta: dict):
+        self.module = module
+        self.meta = meta
+        self.dtype = _dtype(meta["mode"])
+        self.output_dim = meta["arch"]["output_dim"]
+        self.input_resolution = meta["arch"]["input_resolution"]
+
+    def encode_image(self, images: torch.Tensor) -> torch.Tensor:
+        return self.module(images.to(self.dtype)).float()
+
+
+def architecture(visual: VisionTransformer) -> dict:
+    """VisionTransformer arguments, the way clip.model.build_model derives them."""
+    return {
+        "input_resolution": visual.input_resolution,
+        "patch_size": visual.conv1.kernel_size[0],
+        "width": visual.conv1.out_channels,
+        "layers": len(visual.transformer.resblocks),
+        "heads": visual.conv1.out_channels // 64,
+        "output_dim": visual.output_dim,
+    }
+
+
+def _to_bf16(visual: torch.nn.Module) -> None:
+    """
+    Weights of the conv, linear and attention layers (and the output
+    projection) to bfloat16, as clip.model.convert_weights does for fp16;
+    CLIP's LayerNorm runs in fp32 and needs fp32 parameters.
+    """
+    for module in visual.modules():
+        if isinstance(module, (torch.nn.Conv2d, torch.nn.Linear, torch.nn.MultiheadAttention)):
+            for param in module.parameters(recurse=False):
+                param.data = param.data.to(torch.bfloat16)
+    visual.proj.data = visual.proj.data.to(torch.bfloat16)
+
+
+def export_visual(model, mode: str, example: torch.Tensor) -> Tuple[torch.nn.Module, dict]:
+    """
+    model.visual (of a CPU fp32 CLIP model, which is modified) converted for
+    `mode`, and the metadata to save with it.
+    """
+    visual = model.visual.float().eval()
+    meta = {"mode": mode, "arch": architecture(visual), "format": "state_dict"}
+    if mode == "bf16":
+        _to_bf16(visual)
+    elif mode == "int8":
+        visual = torch.ao.quantization.quantize_dynamic(visual, {torch.nn.Linear}, dtype=torch.qint8)
+        with torch.no_grad():
+            # Batch of two, so the batch dimension is traced as dynamic rather than folded to 1
+            visual = torch.jit.freeze(torch.jit.trace(visual, example[:2], check_trace=False).eval())
+        meta["format"] = "torchscript"
+    return visual, meta
+
+
+def save(module: torch.nn.Module, path: str, meta: dict) -> None:
+    """Write the encoder and its metadata; the metadata goes last, since load() needs both."""
+    if meta["format"] == "torchscript":
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        torch.jit.save(module, tmp)
+        os.replace(tmp, path)
+    else:
+        save_state_dict(module.state_dict(), path)
+    tmp = f"{meta_path(path)}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, meta_path(path))
+
+
+def meta_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".json"
+
+
+def encoder_key(model_name: str, meta: dict) -> str:
+    """Identifies an exported encoder's vector space: base model, mode and a digest of its metadata."""
+    digest = hashlib.sha256(json.dumps(meta, sort_keys=True).encode()).hexdigest()[:12]
+    return f"{model_name}:{meta['mode']}:{digest}"
+
+
+def load(path: str, device: str = "cpu") -> Optional[ExportedVisual]:
+    """The exported encoder at path, or None if there is none (or no metadata next to it)."""
+    if not (os.path.exists(path) and os.path.exists(meta_path(path))):
+        return None
+    with open(meta_path(path)) as f:
+        meta = json.load(f)
+    if meta["format"] == "torchscript":
+        module = torch.jit.load(path, map_location=device).eval()
+    else:
+        module = load_module(lambda state: VisionTransformer(**meta["arch"]), path, device)
+    return ExportedVisual(module, meta)
+
+
+def compare(reference: np.ndarray, candidate: np.ndarray, index=None, k: int = 10) -> Dict[str, float]:
+    """
+    How closely candidate embeddings track the fp32 ones, row for row:
+    cosine similarity, and the overlap of their top-k neighbours in `index`
+    (an index over normalized vectors; the rows themselves if None).
+    """
+    ref = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    cand = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosine = (ref * cand).sum(axis=1)
+    if index is None:
+        import faiss
+        index = faiss.IndexFlatIP(ref.shape[1])
+        index.add(np.ascontiguousarray(ref, dtype="float32"))
+    k = min(k, index.ntotal)
+    _, ref_top = index.search(np.ascontiguousarray(ref, dtype="float32"), k)
+    _, cand_top = index.search(np.ascontiguousarray(cand, dtype="float32"), k)
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]
+    return {
+        "cosine_min": round(float(cosine.min()), 5),
+        "cosine_mean": round(float(cosine.mean()), 5),
+        "k": k,
+        "top_k_overlap": round(float(np.mean(overlap)), 4),
+    }
+
+
+def passed(check: Dict[str, float]) -> bool:
+    return check["cosine_min"] >= MIN_COSINE and check["top_k_overlap"] >= MIN_TOPK_OVERLAP
+
+
+def time_batches(encode, batch: torch.Tensor, repeat: int = 5) -> float:
+    """Median seconds per call of encode(batch)."""
+    with torch.inference_mode():
+        encode(batch)
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            encode(batch)
+            times.append(time.perf_counter() - started)
+    return float(np.median(times))
@@ -0,0 +1,161 @@
+# FILE: server/src/api/embedding_cache.py
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Iterable
+
+import numpy as np
+
+from src.api.cache import CACHE_DB, DEFAULT_MAX_DISK_ENTRIES, DEFAULT_TTL, shared_store
+
+# Query images are mostly one-offs, so unlike the indexed images' vectors
+# theirs expire and are capped, like the result caches.
+QUERY_TTL = float(os.environ.get("KOLAM_QUERY_EMBEDDING_TTL", DEFAULT_TTL))
+QUERY_MAX_ENTRIES = int(os.environ.get("KOLAM_QUERY_EMBEDDING_MAX_ENTRIES", DEFAULT_MAX_DISK_ENTRIES))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model  TEXT NOT NULL,
+    hash   TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (model, hash)
+)
+"""
+
+_QUERY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_embeddings (
+    model       TEXT NOT NULL,
+    hash        TEXT NOT NULL,
+    vector      BLOB NOT NULL,
+    expires_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (model, hash)
+)
+"""
+
+
+def content_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes, the same digest UploadedImage uses."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Embeddings by content hash in the shared cache database, so re-indexing
+    only runs the model on images it has never seen (renamed or copied files
+    included) and every worker and restart reuses the result. Rows are keyed
+    by model as well, so switching encoders never mixes vector spaces.
+    """
+
+    def __init__(self, model: str, db_path: str = CACHE_DB):
+        self.model = model
+        self._store = shared_store(db_path)
+        self._store.execute(_SCHEMA)
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            rows = self._store.execute(
+                f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(chunk))})",
+                (self.model, *chunk),
+            )
+            for hash_value, blob in rows:
+                found[hash_value] = np.frombuffer(blob, dtype="float32")
+        return found
+
+    def set_many(self, vectors: Dict[str, np.ndarray]) -> None:
+        rows = [(self.model, hash_value, np.ascontiguousarray(vector, dtype="float32").tobytes())
+                for hash_value, vector in vectors.items()]
+        # One statement (and transaction) per few hundred rows rather than per row
+        for start in range(0, len(rows), 300):
+            chunk = rows[start:start + 300]
+            self._store.execute(
+                f"INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES {','.join(['(?, ?, ?)'] * len(chunk))}",
+                tuple(value for row in chunk for value in row),
+            )
+
+    def __len__(self):
+        return self._store.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model,))[0][0]
+
+
+class QueryEmbeddingCache:
+    """
+    Embeddings of search queries by content hash, kept apart from the
+    indexed images' so they cannot grow the permanent table. Rows expire
+    after `ttl` and the least recently used beyond `max_entries` are pruned
+    every 64 writes, as in ResultCache.
+    """
+
+    def __init__(self, model: str, db_path: str = CACHE_DB, ttl: float = QUERY_TTL,
+                 max_entries: int = QUERY_MAX_ENTRIES):
+        self.model = model
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._store = shared_store(db_path)
+        self._store.execute(_QUERY_SCHEMA)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        hashes = list(dict.fromkeys(hashes))
+        now = time.time()
+        found = {}
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            rows = self._store.execute(
+                f"SELECT hash, vector FROM query_embeddings WHERE model = ? AND expires_at > ? AND hash IN ({marks})",
+                (self.model, now, *chunk),
+            )
+            for hash_value, blob in rows:
+                found[hash_value] = np.frombuffer(blob, dtype="float32")
+            if rows:
+                hit = [hash_value for hash_value, _ in rows]
+                self._store.execute(
+                    f"UPDATE query_embeddings SET accessed_at = ? WHERE model = ? AND hash IN ({','.join('?' * len(hit))})",
+                    (now, self.model, *hit),
+                )
+        return found
+
+    def set_many(self, vectors: Dict[str, np.ndarray]) -> None:
+        now = time.time()
+        rows = [(self.model, hash_value, np.ascontiguousarray(vector, dtype="float32").tobytes(), now + self.ttl, now)
+                for hash_value, vector in vectors.items()]
+        for start in range(0, len(rows), 150):
+            chunk = rows[start:start + 150]
+            self._store.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, hash, vector, expires_at, accessed_at) "
+                f"VALUES {','.join(['(?, ?, ?, ?, ?)'] * len(chunk))}",
+                tuple(value for row in chunk for value in row),
+            )
+        with self._lock:
+            before = self._writes
+            self._writes += len(rows)
+            prune = self._writes // 64 > before // 64
+        if prune:
+            self.prune(now)
+
+    def prune(self, now: float) -> int:
+        """Drop expired rows and the least recently used rows beyond max_entries; returns how many."""
+        removed = self._store.modify("DELETE FROM query_embeddings WHERE model = ? AND expires_at <= ?",
+                                     (self.model, now))
+        removed += self._store.modify(
+            "DELETE FROM query_embeddings WHERE model = ? AND hash IN ("
+            "  SELECT hash FROM query_embeddings WHERE model = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.model, self.model, self.max_entries),
+        )
+        return removed
+
+    def __len__(self):
+        return self._store.execute("SELECT COUNT(*) FROM query_embeddings WHERE model = ?", (self.model,))[0][0]
@@ -0,0 +1,286 @@
+# FILE: server/src/api/gate.py
+"""
+Cheap "is this a kolam at all?" check on a tiny thumbnail, run before the
+detector stack and the LLM. It costs a couple of milliseconds and rejects
+uploads that are clearly not kolams (blank photos, screenshots); an optional
+logistic head fitted on labelled uploads covers the rest:
+
+    python -m src.api.gate fit --kolam imgdata ../client/public/kolam --other selfies/ screenshots/
+    python -m src.api.gate score some.jpg other.png
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+from fastapi import HTTPException
+
+from src.api.metrics import registry, stage_timer
+from src.api.model_registry import model_registry
+
+# "on" rejects, "observe" scores and counts but lets everything through, "off" skips the gate
+GATE_MODE = os.environ.get("KOLAM_GATE", "on").strip().lower()
+HEAD_FILE = os.environ.get("KOLAM_GATE_HEAD", "src/model/saved/gate_head.json")
+THUMB_SIDE = 96
+
+# Rule thresholds, checked against the bundled corpus and a set of photos /
+# screenshots; they only fire on clear cases and leave the rest to the head.
+MIN_CONTRAST = 0.03
+MIN_INK = 0.01
+SCREENSHOT_FLAT = 0.3
+SCREENSHOT_AXIS = 0.4
+# Either is strong evidence of a kolam and overrides the screenshot rule and the head
+KOLAM_SYMMETRY = 0.8
+KOLAM_GRID = 0.3
+
+FEATURES = ("contrast", "ink", "edges", "flat", "axis", "saturation", "symmetry", "grid")
+
+GATE_DECISIONS = registry.counter(
+    "kolam_gate_decisions_total", "Uploads accepted or rejected by the kolam gate", ("decision", "reason"))
+
+MESSAGES = {
+    "blank": "The image looks blank; upload a photo of a kolam.",
+    "screenshot": "The image looks like a screenshot or document, not a kolam.",
+    "classifier": "The image does not look like a kolam.",
+}
+
+
+class GateResult:
+    def __init__(self, accepted: bool, reason: Optional[str], scores: Dict[str, float]):
+        self.accepted = accepted
+        self.reason = reason
+        self.scores = scores
+
+    @property
+    def message(self) -> Optional[str]:
+        return MESSAGES.get(self.reason)
+
+    def to_dict(self) -> dict:
+        return {"error": "not_a_kolam", "reason": self.reason, "message": self.message, "scores": self.scores}
+
+
+def thumbnail(image: np.ndarray, side: int = THUMB_SIDE) -> np.ndarray:
+    """Downscale so the long side is `side`; strided first so large uploads stay cheap."""
+    h, w = image.shape[:2]
+    step = max(1, max(h, w) // (side * 4))
+    if step > 1:
+        image = image[::step, ::step]
+        h, w = image.shape[:2]
+    scale = side / max(h, w)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def _periodicity(profile: np.ndarray) -> float:
+    """Strongest autocorrelation peak after the first zero crossing (1 = perfectly periodic)."""
+    centred = profile - profile.mean()
+    if not centred.any():
+        return 0.0
+    ac = np.correlate(centred, centred, "full")[len(centred) - 1:]
+    ac = ac / ac[0]
+    negative = np.flatnonzero(ac < 0)
+    if not len(negative):
+        return 0.0
+    return float(ac[negative[0]:len(ac) // 2].max(initial=0))
+
+
+def _correlation(a: np.ndarray, b: np.ndarray) -> float:
+    a, b = a - a.mean(), b - b.mean()
+    norm = np.sqrt((a * a).sum() * (b * b).sum())
+    return float((a * b).sum() / norm) if norm else 0.0
+
+
+def features(image: np.ndarray) -> Dict[str, float]:
+    """Thumbnail statistics used by the gate, each roughly in [0, 1]."""
+    thumb = thumbnail(image)
+    gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+
+    # Ink: the minority side of an Otsu split, so chalk on a dark floor counts too
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    if ink.mean() > 127:
+        ink = 255 - ink
+
+    # Screenshots: large areas of one exact value, edges along the axes
+    gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0)
+    gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1)
+    magnitude = np.hypot(gx, gy)
+    strong = magnitude > magnitude.max() * 0.2
+    angle = np.degrees(np.arctan2(gy, gx)) % 90
+    axis = float(((angle < 8) | (angle > 82))[strong].mean()) if strong.any() else 0.0
+
+    # Kolams: mirror / rotational symmetry of the drawn area, periodic dot grid
+    ys, xs = np.nonzero(ink)
+    drawn = (ink[ys.min():ys.max() + 1, xs.min():xs.max() + 1] if len(xs) else ink).astype(np.float32)
+    symmetry = max(_correlation(drawn, drawn[:, ::-1]), _correlation(drawn, drawn[::-1]),
+                   _correlation(drawn, drawn[::-1, ::-1]))
+
+    return {
+        "contrast": float(gray.std()) / 255,
+        "ink": float(ink.mean()) / 255,
+        "edges": float(cv2.Canny(gray, 50, 150).mean()) / 255,
+        "flat": float(np.bincount(gray.ravel(), minlength=256).max()) / gray.size,
+        "axis": axis,
+        "saturation": float(cv2.cvtColor(thumb, cv2.COLOR_BGR2HSV)[..., 1].mean()) / 255,
+        "symmetry": symmetry,
+        "grid": (_periodicity(ink.mean(axis=0)) + _periodicity(ink.mean(axis=1))) / 2,
+    }
+
+
+def _load_head() -> Optional[dict]:
+    """Logistic head written by `fit`; None (rules only) if it has not been fitted."""
+    if not os.path.exists(HEAD_FILE):
+        return None
+    with open(HEAD_FILE) as f:
+        return json.load(f)
+
+
+# The gate falls back to its rules without the head
+model_registry.register("gate_head", _load_head, optional=True)
+
+
+def head_score(head: dict, scores: Dict[str, float]) -> float:
+    x = (np.array([scores[name] for name in head["features"]]) - head["mean"]) / head["std"]
+    return float(1 / (1 + np.exp(-(x @ np.array(head["weights"]) + head["bias"]))))
+
+
+def evaluate(image: np.ndarray, head: Optional[dict] = None) -> GateResult:
+    scores = {name: round(value, 4) for name, value in features(image).items()}
+    kolam_like = scores["symmetry"] >= KOLAM_SYMMETRY or scores["grid"] >= KOLAM_GRID
+
+    if scores["contrast"] < MIN_CONTRAST or scores["ink"] < MIN_INK:
+        return GateResult(False, "blank", scores)
+    if kolam_like:
+        return GateResult(True, None, scores)
+    if scores["flat"] > SCREENSHOT_FLAT and scores["axis"] > SCREENSHOT_AXIS:
+        return GateResult(False, "screenshot", scores)
+    if head is not None:
+        scores["classifier"] = round(head_score(head, scores), 4)
+        if scores["classifier"] < head["threshold"]:
+            return GateResult(False, "classifier", scores)
+    return GateResult(True, None, scores)
+
+
+def check(upload) -> GateResult:
+    """Gate an UploadedImage, counting the decision. Never rejects in "observe" mode."""
+    if GATE_MODE == "off":
+        return GateResult(True, None, {})
+    with stage_timer("gate"):
+        try:
+            head = model_registry.get("gate_head")
+        except Exception as e:
+            print(f"⚠️ Gate head unavailable, using rules only: {e}")
+            head = None
+        result = evaluate(upload.image, head)
+    GATE_DECISIONS.inc(decision="accept" if result.accepted else "reject", reason=result.reason or "")
+    if GATE_MODE == "observe":
+        return GateResult(True, result.reason, result.scores)
+    return result
+
+
+def require_kolam(upload) -> None:
+    """Raise 422 with the reason and scores if the upload does not look like a kolam."""
+    result = check(upload)
+    if not result.accepted:
+        raise HTTPException(status_code=422, detail=result.to_dict())
+
+
+# -----------------------------------------------------------
+# CLI: fit the head, score files
+# -----------------------------------------------------------
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def _image_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(IMAGE_SUFFIXES):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def _feature_rows(paths):
+    rows = []
+    for path in _image_files(paths):
+        image = cv2.imread(path)
+        if image is None:
+            print(f"⚠️ Skipping unreadable {path}", file=sys.stderr)
+            continue
+        scores = features(image)
+        rows.append([scores[name] for name in FEATURES])
+    return np.array(rows, dtype=np.float64).reshape(-1, len(FEATURES))
+
+
+def fit_head(kolam: np.ndarray, other: np.ndarray, l2: float = 0.01, steps: int = 5000,
+             recall: float = 0.98) -> dict:
+    """
+    Logistic regression by gradient descent. The threshold is set so that
+    `recall` of the kolam examples pass: false rejections cost more than a
+    wasted pipeline run.
+    """
+    x = np.vstack([kolam, other])
+    y = np.concatenate([np.ones(len(kolam)), np.zeros(len(other))])
+    mean, std = x.mean(axis=0), x.std(axis=0) + 1e-6
+    z = (x - mean) / std
+    # Balance the classes so a small negative set still counts
+    sample_weight = np.where(y == 1, len(y) / (2 * len(kolam)), len(y) / (2 * len(other)))
+    weights, bias = np.zeros(z.shape[1]), 0.0
+    for _ in range(steps):
+        p = 1 / (1 + np.exp(-(z @ weights + bias)))
+        error = (p - y) * sample_weight
+        weights -= 0.1 * (z.T @ error / len(y) + l2 * weights)
+        bias -= 0.1 * error.mean()
+    kolam_p = 1 / (1 + np.exp(-(z[y == 1] @ weights + bias)))
+    return {
+        "features": list(FEATURES),
+        "mean": mean.tolist(),
+        "std": std.tolist(),
+        "weights": weights.tolist(),
+        "bias": float(bias),
+        "threshold": float(np.quantile(kolam_p, 1 - recall)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    fit = commands.add_parser("fit", help="fit the logistic head on labelled images")
+    fit.add_argument("--kolam", nargs="+", required=True, help="kolam images or directories")
+    fit.add_argument("--other", nargs="+", required=True, help="non-kolam images or directories")
+    fit.add_argument("--recall", type=float, default=0.98, help="share of kolams the threshold must pass")
+    fit.add_argument("--output", default=HEAD_FILE)
+    score = commands.add_parser("score", help="print gate features and decision for images")
+    score.add_argument("paths", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "fit":
+        kolam, other = _feature_rows(args.kolam), _feature_rows(args.other)
+        if not len(kolam) or not len(other):
+            parser.error("need at least one readable image on each side")
+        head = fit_head(kolam, other, recall=args.recall)
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(head, f, indent=2)
+        rejected = sum(head_score(head, dict(zip(FEATURES, row))) < head["threshold"] for row in other)
+        print(f"Fitted on {len(kolam)} kolam / {len(other)} other images; "
+              f"{rejected}/{len(other)} others below threshold {head['threshold']:.3f} -> {args.output}")
+        return
+
+    head = _load_head()
+    for path in _image_files(args.paths):
+        image = cv2.imread(path)
+        if image is None:
+            print(f"{path}: unreadable")
+            continue
+        result = evaluate(image, head)
+        scores = " ".join(f"{name}={value:.2f}" for name, value in result.scores.items())
+        print(f"{path}: {'accept' if result.accepted else 'reject (' + result.reason + ')'}  {scores}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,9 @@ import cv2
 from sklearn.cluster import DBSCAN
 
 from src.api.schemas import Dot, LinePath, CurvePath
+from src.api.metrics import timed_stage
 
+@timed_stage("detect_dots")
 def detect_dots_in_image(img):
     """Detect dots in the kolam image using advanced computer vision techniques"""
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
@@ -102,6 +104,25 @@ def determine_grid_size(gray):
         return 3  # Simple kolam
 
 
+def estimate_grid_size(dots, tolerance=None):
+    """Dots per side of the grid the dots sit on (the larger of its rows and columns); 0 without dots"""
+    if len(dots) == 0:
+        return 0
+    points = np.asarray(dots, dtype=float)
+    if len(points) == 1:
+        return 1
+    if tolerance is None:
+        # Coordinates within half the typical spacing (median nearest-neighbour distance) share a row / column
+        distances = np.sqrt(((points[:, None, :] - points[None, :, :]) ** 2).sum(axis=-1))
+        np.fill_diagonal(distances, np.inf)
+        tolerance = np.median(distances.min(axis=1)) / 2
+
+    def lines(values):
+        return 1 + int((np.diff(np.sort(values)) > tolerance).sum())
+
+    return max(lines(points[:, 0]), lines(points[:, 1]))
+
+
 def create_regular_grid(width, height, grid_size):
     """Create a regular grid of dots"""
     margin = min(width, height) * 0.1
@@ -116,16 +137,25 @@ def create_regular_grid(width, height, grid_size):
     return dots
 
 
+@timed_stage("detect_lines_and_curves")
 def detect_lines_and_curves(img, dots):
     """Detect lines and curves in the kolam image - FIXED VERSION"""
+    binary = binarize(img)
+    return detect_lines(binary, dots), detect_curves(binary, dots)
+
+
+def binarize(img):
+    """Inverted Otsu threshold of the image; kolam strokes become white."""
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    h, w = gray.shape
-    
-    # Preprocess image
     _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-    
+    return thresh
+
+
+@timed_stage("detect_lines")
+def detect_lines(thresh, dots):
+    """Straight lines between dots, from a binarized image (see binarize)."""
+    h, w = thresh.shape
     lines = []
-    curves = []
     
     # Convert dots to Dot objects for easier handling
     dot_objects = [Dot(x=float(x), y=float(y)) for x, y in dots]
@@ -144,6 +174,18 @@ def detect_lines_and_curves(img, dots):
             if start_dot != end_dot:  # Avoid self-loops
                 lines.append(LinePath(p1=start_dot, p2=end_dot))
     
+    # Strategy 3: Pattern-based detection for common kolam structures
+    lines.extend(detect_common_patterns(dot_objects, w, h))
+    
+    # Remove duplicate lines
+    return remove_duplicate_lines(lines)
+
+
+@timed_stage("detect_curves")
+def detect_curves(thresh, dots):
+    """Curves through dots, from a binarized image (see binarize)."""
+    curves = []
+    dot_objects = [Dot(x=float(x), y=float(y)) for x, y in dots]
     
     # Strategy 2: Detect curves using contour analysis (ONLY if red elements exist)
     contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -172,16 +214,9 @@ def detect_lines_and_curves(img, dots):
                             end_dot = find_closest_dot(dot_objects, (p2[0], p2[1]))
                             
                             curves.append(CurvePath(p1=start_dot, ctrl=control_dot, p2=end_dot))
-        
-    
-    # Strategy 3: Pattern-based detection for common kolam structures
-    lines.extend(detect_common_patterns(dot_objects, w, h))
-    
-    # Remove duplicate lines and curves
-    lines = remove_duplicate_lines(lines)
-    curves = remove_duplicate_curves(curves)
     
-    return lines, curves
+    # Remove duplicate curves
+    return remove_duplicate_curves(curves)
 
 
 def find_closest_dot(dots, point):
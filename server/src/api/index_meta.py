@@ -0,0 +1,235 @@
+# FILE: server/src/api/index_meta.py
+import json
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_MAGIC = b"KOLAMIDX"
+# 2 added the cluster column (version 1 files load with every image its own cluster),
+# 3 the attributes column (older files load with none)
+_VERSION = 3
+_PREAMBLE = struct.Struct("<8sII")  # magic, version, header length
+_HASH_BYTES = 32
+_NO_HASH = bytes(_HASH_BYTES)
+
+# (path, content hash or None, size, mtime_ns, cluster, attributes): cluster is the
+# id of the image whose vector stands for this one in the index (its own id for
+# most images); attributes are name -> value (see attributes.py), None where the
+# value could not be determined
+Entry = Tuple[str, Optional[str], int, int, int, Dict[str, object]]
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _layout(start: int, rows: int, version: int = _VERSION, attributes: int = 0) -> Dict[str, Tuple[int, int]]:
+    """Byte (offset, length) of each column; every column starts 8-byte aligned."""
+    columns = [("offsets", (rows + 1) * 8), ("sizes", rows * 8), ("mtimes", rows * 8), ("hashes", rows * _HASH_BYTES)]
+    if version >= 2:
+        columns.append(("clusters", rows * 8))
+    if version >= 3:
+        columns.append(("attributes", rows * attributes * 4))
+    sections = {}
+    for name, length in columns:
+        sections[name] = (start, length)
+        start = _align(start + length)
+    sections["blob"] = (start, None)
+    return sections
+
+
+class IndexMetadata:
+    """
+    What the similarity index knows about each id: path, content hash, size,
+    mtime, cluster and attributes. Saved as one file, a small JSON header
+    followed by columns indexed directly by id (path offsets into a UTF-8
+    blob, sizes, mtimes, raw SHA-256 digests, cluster ids, attribute codes
+    into value lists kept in the header) and the blob. Loading memory-maps
+    the file, so it takes no time, id -> path is two array reads, and every
+    worker shares the same pages instead of unpickling its own copy. Changes
+    made after loading live in a small overlay until the next save.
+    """
+
+    def __init__(self, header: Optional[dict] = None):
+        self.header = dict(header or {})
+        self._rows = 0
+        self._count = 0
+        self._offsets = self._sizes = self._mtimes = self._hashes = self._clusters = self._blob = None
+        # Attribute names, the values each one takes, and per row a code per name (-1: not recorded)
+        self._attribute_names: List[str] = []
+        self._attribute_values: Dict[str, list] = {}
+        self._attributes = None
+        self._overlay: Dict[int, Optional[Entry]] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "IndexMetadata":
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, header_len = _PREAMBLE.unpack(bytes(data[:_PREAMBLE.size]))
+        if magic != _MAGIC or not 1 <= version <= _VERSION:
+            raise ValueError(f"{path} is not an index metadata file (version {_VERSION})")
+        header = json.loads(bytes(data[_PREAMBLE.size:_PREAMBLE.size + header_len]))
+
+        meta = cls(header["header"])
+        meta._rows, meta._count = header["rows"], header["count"]
+        meta._attribute_values = header.get("attributes", {})
+        meta._attribute_names = list(meta._attribute_values)
+        sections = _layout(_align(_PREAMBLE.size + header_len), meta._rows, version, len(meta._attribute_names))
+        column = lambda name: data[sections[name][0]:sections[name][0] + sections[name][1]]
+        meta._offsets = column("offsets").view("<i8")
+        meta._sizes = column("sizes").view("<i8")
+        meta._mtimes = column("mtimes").view("<i8")
+        meta._hashes = column("hashes").reshape(meta._rows, _HASH_BYTES)
+        meta._clusters = column("clusters").view("<i8") if version >= 2 else np.arange(meta._rows, dtype="<i8")
+        if meta._attribute_names:
+            meta._attributes = column("attributes").view("<i4").reshape(meta._rows, len(meta._attribute_names))
+        meta._blob = data[sections["blob"][0]:]
+        return meta
+
+    def save(self, path: str) -> None:
+        """Write every entry to `path` (via a temp file and rename, so readers never see half a file)."""
+        entries = dict(self.items(entries=True))
+        rows = max(entries, default=-1) + 1
+        offsets = np.zeros(rows + 1, dtype="<i8")
+        sizes = np.full(rows, -1, dtype="<i8")
+        mtimes = np.full(rows, -1, dtype="<i8")
+        hashes = np.zeros((rows, _HASH_BYTES), dtype=np.uint8)
+        clusters = np.arange(rows, dtype="<i8")
+        names = list(dict.fromkeys(name for entry in entries.values() for name in entry[5]))
+        values: Dict[str, list] = {name: [] for name in names}
+        codes: Dict[str, dict] = {name: {} for name in names}
+        attributes = np.full((rows, len(names)), -1, dtype="<i4")
+        blob = []
+        for image_id in sorted(entries):
+            path_value, hash_value, size, mtime, cluster, attribute_values = entries[image_id]
+            encoded = path_value.encode("utf-8", "surrogateescape")
+            blob.append(encoded)
+            offsets[image_id + 1] = len(encoded)
+            sizes[image_id], mtimes[image_id], clusters[image_id] = size, mtime, cluster
+            if hash_value:
+                hashes[image_id] = np.frombuffer(bytes.fromhex(hash_value), dtype=np.uint8)
+            for column, name in enumerate(names):
+                if name in attribute_values:
+                    value = attribute_values[name]
+                    if value not in codes[name]:
+                        codes[name][value] = len(values[name])
+                        values[name].append(value)
+                    attributes[image_id, column] = codes[name][value]
+        np.cumsum(offsets, out=offsets)
+
+        header = json.dumps({"rows": rows, "count": len(entries), "header": self.header,
+                             "attributes": values}).encode()
+        sections = _layout(_align(_PREAMBLE.size + len(header)), rows, _VERSION, len(names))
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(_PREAMBLE.pack(_MAGIC, _VERSION, len(header)) + header)
+            for name, array in (("offsets", offsets), ("sizes", sizes), ("mtimes", mtimes), ("hashes", hashes),
+                                ("clusters", clusters), ("attributes", attributes)):
+                f.seek(sections[name][0])
+                f.write(array.tobytes())
+            f.seek(sections["blob"][0])
+            f.write(b"".join(blob))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    # -- lookups --------------------------------------------------------
+    def _base(self, image_id: int) -> Optional[Entry]:
+        if not 0 <= image_id < self._rows:
+            return None
+        start, end = int(self._offsets[image_id]), int(self._offsets[image_id + 1])
+        if start == end:
+            return None
+        digest = bytes(self._hashes[image_id])
+        attributes = {}
+        if self._attributes is not None:
+            for name, code in zip(self._attribute_names, self._attributes[image_id].tolist()):
+                if code >= 0:
+                    attributes[name] = self._attribute_values[name][code]
+        return (bytes(self._blob[start:end]).decode("utf-8", "surrogateescape"),
+                digest.hex() if digest != _NO_HASH else None,
+                int(self._sizes[image_id]), int(self._mtimes[image_id]), int(self._clusters[image_id]), attributes)
+
+    def get(self, image_id: int) -> Optional[Entry]:
+        image_id = int(image_id)
+        if image_id in self._overlay:
+            return self._overlay[image_id]
+        return self._base(image_id)
+
+    def path(self, image_id: int) -> Optional[str]:
+        entry = self.get(image_id)
+        return entry[0] if entry else None
+
+    def file(self, image_id: int) -> Optional[Tuple[Optional[str], int, int]]:
+        """(hash, size, mtime_ns) recorded for an id."""
+        entry = self.get(image_id)
+        return entry[1:4] if entry else None
+
+    def cluster(self, image_id: int) -> Optional[int]:
+        """Id of the image that represents this one in the index (None if the id is unknown)."""
+        entry = self.get(image_id)
+        return entry[4] if entry else None
+
+    def attributes(self, image_id: int) -> Dict[str, object]:
+        """Attributes recorded for an id ({} if none, or the id is unknown)."""
+        entry = self.get(image_id)
+        return dict(entry[5]) if entry else {}
+
+    def clusters(self) -> Dict[int, List[int]]:
+        """Representative id -> ids of the other images in its cluster, for clusters of more than one."""
+        found: Dict[int, List[int]] = {}
+        if self._rows:
+            present = np.diff(self._offsets) > 0
+            grouped = np.flatnonzero(present & (self._clusters != np.arange(self._rows)))
+            for image_id in grouped.tolist():
+                if image_id not in self._overlay:
+                    found.setdefault(int(self._clusters[image_id]), []).append(image_id)
+        for image_id, entry in self._overlay.items():
+            if entry is not None and entry[4] != image_id:
+                found.setdefault(entry[4], []).append(image_id)
+        return found
+
+    def __contains__(self, image_id) -> bool:
+        return self.get(image_id) is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def items(self, entries: bool = False) -> List[Tuple[int, object]]:
+        """(id, path) pairs, or (id, entry) with entries=True."""
+        pick = (lambda entry: entry) if entries else (lambda entry: entry[0])
+        found = []
+        if self._rows:
+            for image_id in np.flatnonzero(np.diff(self._offsets)).tolist():
+                if image_id not in self._overlay:
+                    found.append((image_id, pick(self._base(image_id))))
+        found.extend((image_id, pick(entry)) for image_id, entry in self._overlay.items() if entry is not None)
+        return found
+
+    def ids(self) -> np.ndarray:
+        base = np.flatnonzero(np.diff(self._offsets)) if self._rows else np.empty(0, dtype="int64")
+        base = base[~np.isin(base, list(self._overlay))]
+        added = [image_id for image_id, entry in self._overlay.items() if entry is not None]
+        return np.concatenate([base, np.array(added, dtype="int64")]).astype("int64")
+
+    # -- changes --------------------------------------------------------
+    def set(self, image_id: int, path: str, hash_value: Optional[str], size: int, mtime_ns: int,
+            cluster: Optional[int] = None, attributes: Optional[Dict[str, object]] = None) -> None:
+        image_id = int(image_id)
+        if image_id not in self:
+            self._count += 1
+        self._overlay[image_id] = (path, hash_value, size, mtime_ns, image_id if cluster is None else int(cluster),
+                                   dict(attributes or {}))
+
+    def remove(self, image_id: int) -> None:
+        image_id = int(image_id)
+        if image_id in self:
+            self._count -= 1
+            self._overlay[image_id] = None
+
+    def clear(self) -> None:
+        self._rows = self._count = 0
+        self._offsets = self._sizes = self._mtimes = self._hashes = self._clusters = self._blob = None
+        self._attribute_names, self._attribute_values, self._attributes = [], {}, None
+        self._overlay = {}
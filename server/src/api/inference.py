@@ -1,17 +1,24 @@
+import json
+import os
+from typing import List, Union
+
 import torch
 from torchvision import transforms
+from torchvision.datasets.folder import find_classes
 from PIL import Image
 
 from src.model.model import SimpleCNN
-from src.model.utils import dataset  # so we reuse dataset.classes
+from src.api.batching import MicroBatcher
+from src.api.metrics import timed_stage
+from src.api.model_registry import model_registry
+from src.api.weights import load_module
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
+MODEL_FILE = "src/model/saved/simplecnn.pth"
+# Written by train.py next to the weights, so serving never scans the training set.
+CLASSES_FILE = "src/model/saved/simplecnn.classes.json"
+DATA_DIR = "src/model/data"
 
-# Load model
-model = SimpleCNN(num_classes=len(dataset.classes))
-model.load_state_dict(torch.load("src/model/saved/simplecnn.pth", map_location=device))
-model.to(device)
-model.eval()
+device = "cuda" if torch.cuda.is_available() else "cpu"
 
 # Preprocessing (must match training transforms!)
 transform = transforms.Compose([
@@ -19,10 +26,46 @@ transform = transforms.Compose([
     transforms.ToTensor()
 ])
 
-def predict(image_path: str):
-    image = Image.open(image_path).convert("RGB")
-    tensor = transform(image).unsqueeze(0).to(device)  # add batch dim
+
+def load_classes() -> list:
+    if os.path.exists(CLASSES_FILE):
+        with open(CLASSES_FILE) as f:
+            return json.load(f)["classes"]
+    # Weights trained before the metadata file existed: same order ImageFolder used.
+    print(f"⚠️ {CLASSES_FILE} not found, reading class names from {DATA_DIR}")
+    return find_classes(DATA_DIR)[0]
+
+
+def _load_cnn():
+    classes = load_classes()
+    model = load_module(lambda state: SimpleCNN(num_classes=len(classes)), MODEL_FILE, device)
+    return model, classes
+
+
+# Only /api/predict needs it, and the weights are not shipped with the repo
+model_registry.register("cnn", _load_cnn, optional=True)
+
+
+def _predict_batch(tensors: List[torch.Tensor]) -> List[str]:
+    model, classes = model_registry.get("cnn")
     with torch.no_grad():
-        outputs = model(tensor)
-        _, predicted = torch.max(outputs, 1)
-    return dataset.classes[predicted.item()]
+        outputs = model(torch.stack(tensors).to(device))
+    return [classes[i] for i in outputs.argmax(1).tolist()]
+
+
+# Concurrent predictions share one forward pass (see batching.py)
+_batcher = MicroBatcher("cnn", _predict_batch)
+
+
+@timed_stage("cnn_predict")
+def predict(image: Union[str, Image.Image]):
+    if isinstance(image, str):
+        image = Image.open(image)
+    return _batcher.submit(transform(image.convert("RGB")))
+
+
+def predict_many(images: List[Image.Image], batch_size: int = 32) -> List[str]:
+    """Classes of many images (e.g. while indexing), in batches of their own rather than through the request batcher."""
+    tensors = [transform(image.convert("RGB")) for image in images]
+    return [label for start in range(0, len(tensors), batch_size)
+            for label in _predict_batch(tensors[start:start + batch_size])]
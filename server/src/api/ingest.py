@@ -0,0 +1,116 @@
+# FILE: server/src/api/ingest.py
+import hashlib
+import io
+import os
+from typing import Optional
+
+import cv2
+import numpy as np
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+from starlette.formparsers import MultiPartParser
+
+from src.api.metrics import stage_timer
+
+MAX_UPLOAD_BYTES = int(os.environ.get("KOLAM_MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.environ.get("KOLAM_MAX_IMAGE_PIXELS", 40_000_000))
+CHUNK_SIZE = 64 * 1024
+
+# Starlette spools multipart parts larger than 1 MB to a temp file. Keep every
+# upload we are willing to accept in memory instead.
+MultiPartParser.spool_max_size = max(MultiPartParser.spool_max_size, MAX_UPLOAD_BYTES)
+
+
+class UploadedImage:
+    """An upload read once into memory and decoded once, shared by every stage."""
+
+    def __init__(self, data: bytes, image: np.ndarray, filename: Optional[str] = None,
+                 content_type: Optional[str] = None):
+        self.data = data
+        self.image = image  # BGR, same layout as cv2.imread
+        self.filename = filename
+        self.content_type = content_type or "image/png"
+        self._digest = None
+        self._pil = None
+
+    @property
+    def digest(self) -> str:
+        """SHA-256 of the raw upload bytes."""
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.data).hexdigest()
+        return self._digest
+
+    @property
+    def width(self) -> int:
+        return self.image.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.image.shape[0]
+
+    def to_pil(self) -> Image.Image:
+        """RGB PIL view of the decoded image (for CLIP / the CNN)."""
+        if self._pil is None:
+            self._pil = Image.fromarray(cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB))
+        return self._pil
+
+
+async def read_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """Read an upload stream into a bounded buffer."""
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+
+    buffer = bytearray()
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+
+    if not buffer:
+        raise HTTPException(status_code=400, detail="Empty upload")
+    return bytes(buffer)
+
+
+def probe_size(data: bytes) -> Optional[tuple]:
+    """Read (width, height) from the image header without decoding pixels."""
+    try:
+        with Image.open(io.BytesIO(data)) as probe:
+            return probe.size
+    except Image.DecompressionBombError:
+        raise HTTPException(status_code=413, detail="Image has too many pixels")
+    except (Image.UnidentifiedImageError, OSError):
+        return None
+
+
+def decode_image(data: bytes, max_pixels: int = MAX_IMAGE_PIXELS) -> np.ndarray:
+    """Decode image bytes to a BGR array, enforcing the pixel limit before decode."""
+    with stage_timer("decode"):
+        return _decode_image(data, max_pixels)
+
+
+def _decode_image(data: bytes, max_pixels: int) -> np.ndarray:
+    size = probe_size(data)
+    if size is None:
+        # Without a readable header the pixel count cannot be checked before decoding
+        raise HTTPException(status_code=400, detail="Unsupported or unreadable image")
+    if size[0] * size[1] > max_pixels:
+        raise HTTPException(status_code=413, detail=f"Image exceeds {max_pixels} pixels")
+
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        # Formats OpenCV was built without (e.g. GIF) still go through PIL.
+        with Image.open(io.BytesIO(data)) as pil_img:
+            img = cv2.cvtColor(np.asarray(pil_img.convert("RGB")), cv2.COLOR_RGB2BGR)
+    if img is None:
+        raise HTTPException(status_code=400, detail="Could not load image")
+    return img
+
+
+async def ingest_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES,
+                        max_pixels: int = MAX_IMAGE_PIXELS) -> UploadedImage:
+    """Read and decode an uploaded image entirely in memory."""
+    data = await read_upload(file, max_bytes)
+    return UploadedImage(data, decode_image(data, max_pixels), file.filename, file.content_type)
@@ -0,0 +1,308 @@
+# FILE: server/src/api/jobs.py
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from fastapi import APIRouter, File, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from src.api import profiling
+from src.api.cache import shared_store
+from src.api.ingest import read_upload
+
+JOBS_DB = os.environ.get("KOLAM_JOBS_DB", "jobs.sqlite")
+JOB_WORKERS = int(os.environ.get("KOLAM_JOB_WORKERS", 2))
+# A job whose owner has not renewed its lease for this long is assumed to
+# belong to a dead worker and is picked up again. Owners renew every
+# heartbeat, and look for expired leases on the same tick.
+JOB_LEASE_SECONDS = float(os.environ.get("KOLAM_JOB_LEASE_SECONDS", 600))
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("KOLAM_JOB_HEARTBEAT_SECONDS", JOB_LEASE_SECONDS / 4))
+JOB_RETENTION_SECONDS = float(os.environ.get("KOLAM_JOB_RETENTION_SECONDS", 24 * 3600))
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id         TEXT PRIMARY KEY,
+        kind       TEXT NOT NULL,
+        status     TEXT NOT NULL,
+        stage      TEXT,
+        params     TEXT NOT NULL,
+        payload    BLOB,
+        result     TEXT,
+        error      TEXT,
+        owner      TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS job_events (
+        id         INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id     TEXT NOT NULL,
+        stage      TEXT NOT NULL,
+        data       TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, id)",
+]
+
+FINISHED = ("completed", "failed")
+
+
+class JobQueue:
+    """
+    Persistent job queue for long pipelines. Jobs and their progress events
+    are stored in SQLite, so any worker can report on them; a local thread
+    pool runs the registered handlers. Each worker holds a lease on the jobs
+    it accepted and renews it from a heartbeat thread, which also resumes
+    jobs whose lease has expired because their worker died.
+
+    A handler is called as handler(payload, params, progress) and returns a
+    JSON-serialisable result; progress(stage, **data) records an event.
+    """
+
+    def __init__(self, db_path: str = JOBS_DB, workers: int = JOB_WORKERS):
+        self._store = shared_store(db_path)
+        for statement in _SCHEMA:
+            self._store.execute(statement)
+        self._handlers: Dict[str, Callable] = {}
+        self._workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._owned: set = set()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def owner(self) -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def register(self, kind: str, handler: Callable) -> None:
+        self._handlers[kind] = handler
+
+    def kinds(self) -> list:
+        return sorted(self._handlers)
+
+    def start(self) -> None:
+        """Start the worker pool and resume jobs left behind by a previous run."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="kolam-job")
+        self._prune()
+        rows = self._store.execute(
+            "SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND updated_at < ?)",
+            (time.time() - JOB_LEASE_SECONDS,),
+        )
+        for (job_id,) in rows:
+            self._dispatch(job_id)
+        if self._heartbeat_thread is None or not self._heartbeat_thread.is_alive():
+            self._stop.clear()
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="kolam-job-heartbeat",
+                                                      daemon=True)
+            self._heartbeat_thread.start()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                print(f"⚠️ Job heartbeat failed: {e}")
+
+    def heartbeat(self) -> None:
+        """Renew the lease on this worker's jobs, then take over jobs whose lease expired."""
+        now = time.time()
+        with self._lock:
+            owned = list(self._owned)
+        if owned:
+            marks = ",".join("?" * len(owned))
+            self._store.execute(
+                f"UPDATE jobs SET updated_at = ? WHERE id IN ({marks}) AND status IN ('queued', 'running')",
+                (now, *owned),
+            )
+        rows = self._store.execute(
+            "SELECT id FROM jobs WHERE status IN ('queued', 'running') AND updated_at < ?",
+            (now - JOB_LEASE_SECONDS,),
+        )
+        for (job_id,) in rows:
+            if job_id not in owned:
+                print(f"⚠️ Job {job_id} lease expired, resuming it here")
+                self._dispatch(job_id)
+
+    def submit(self, kind: str, payload: bytes, params: Optional[dict] = None) -> str:
+        if kind not in self._handlers:
+            raise KeyError(kind)
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._store.execute(
+            "INSERT INTO jobs (id, kind, status, params, payload, created_at, updated_at) "
+            "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(params or {}), payload, now, now),
+        )
+        self._event(job_id, "queued", {})
+        self._dispatch(job_id)
+        return job_id
+
+    def queue_depth(self) -> int:
+        """Jobs accepted by this worker that have not finished yet."""
+        return self._pending
+
+    def _dispatch(self, job_id: str) -> None:
+        if self._executor is None:
+            self.start()
+        with self._lock:
+            self._pending += 1
+            self._owned.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def _claim(self, job_id: str) -> bool:
+        now = time.time()
+        return self._store.modify(
+            "UPDATE jobs SET status = 'running', owner = ?, updated_at = ? "
+            "WHERE id = ? AND (status = 'queued' OR (status = 'running' AND updated_at < ?))",
+            (self.owner, now, job_id, now - JOB_LEASE_SECONDS),
+        ) == 1
+
+    def _run(self, job_id: str) -> None:
+        try:
+            if not self._claim(job_id):
+                return  # another worker got there first
+            kind, params, payload = self._store.execute(
+                "SELECT kind, params, payload FROM jobs WHERE id = ?", (job_id,))[0]
+            handler = self._handlers.get(kind)
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job kind '{kind}'")
+
+            def progress(stage: str, **data):
+                self._store.execute(
+                    "UPDATE jobs SET stage = ?, updated_at = ? WHERE id = ?",
+                    (stage, time.time(), job_id),
+                )
+                self._event(job_id, stage, data)
+
+            self._event(job_id, "started", {})
+            params = json.loads(params)
+            if params.get("profile"):
+                # The request that submitted the job asked for a profile
+                with profiling.profile_request(f"job {kind} {job_id}"), profiling.profiled(kind):
+                    result = handler(payload, params, progress)
+            else:
+                result = handler(payload, params, progress)
+            self._finish(job_id, "completed", result=result)
+        except Exception as e:
+            print(f"⚠️ Job {job_id} failed: {e}")
+            self._finish(job_id, "failed", error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._owned.discard(job_id)
+
+    def _finish(self, job_id: str, status: str, result=None, error: Optional[str] = None) -> None:
+        self._store.execute(
+            "UPDATE jobs SET status = ?, stage = ?, result = ?, error = ?, payload = NULL, updated_at = ? "
+            "WHERE id = ?",
+            (status, status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+        )
+        self._event(job_id, status, {"error": error} if error else {})
+
+    def _event(self, job_id: str, stage: str, data: dict) -> None:
+        self._store.execute(
+            "INSERT INTO job_events (job_id, stage, data, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, stage, json.dumps(data), time.time()),
+        )
+
+    def _prune(self) -> None:
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        self._store.execute(
+            "DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?)",
+            (*FINISHED, cutoff),
+        )
+        self._store.execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (*FINISHED, cutoff))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        rows = self._store.execute(
+            "SELECT id, kind, status, stage, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+            (job_id,),
+        )
+        if not rows:
+            return None
+        job_id, kind, status, stage, result, error, created_at, updated_at = rows[0]
+        return {
+            "job_id": job_id,
+            "kind": kind,
+            "status": status,
+            "stage": stage,
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def events(self, job_id: str, after: int = 0) -> list:
+        rows = self._store.execute(
+            "SELECT id, stage, data, created_at FROM job_events WHERE job_id = ? AND id > ? ORDER BY id",
+            (job_id, after),
+        )
+        return [{"id": i, "stage": stage, "data": json.loads(data), "time": t} for i, stage, data, t in rows]
+
+
+job_queue = JobQueue()
+jobs_router = APIRouter()
+
+
+@jobs_router.post("/{kind}", status_code=202)
+async def submit_job(kind: str, file: UploadFile = File(...)):
+    if kind not in job_queue.kinds():
+        raise HTTPException(status_code=404, detail=f"Unknown job kind '{kind}'")
+    payload = await read_upload(file)
+    params = {"filename": file.filename, "content_type": file.content_type, "profile": profiling.requested()}
+    # SQLite writes block, so keep them off the event loop
+    job_id = await run_in_threadpool(job_queue.submit, kind, payload, params)
+    return {"job_id": job_id, "status": "queued",
+            "status_url": f"/api/jobs/{job_id}", "events_url": f"/api/jobs/{job_id}/events"}
+
+
+@jobs_router.get("/{job_id}")
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job["events"] = job_queue.events(job_id)
+    return job
+
+
+@jobs_router.get("/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """Server-Sent Events stream of a job's progress, ending when the job finishes."""
+    if await run_in_threadpool(job_queue.get, job_id) is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    last_event_id = request.headers.get("last-event-id") or "0"
+    if not last_event_id.isdigit():
+        raise HTTPException(status_code=400, detail="Last-Event-ID must be a non-negative integer")
+    last_id = int(last_event_id)
+
+    async def stream():
+        nonlocal last_id
+        while not await request.is_disconnected():
+            for event in await run_in_threadpool(job_queue.events, job_id, last_id):
+                last_id = event["id"]
+                yield f"id: {last_id}\nevent: {event['stage']}\ndata: {json.dumps(event)}\n\n"
+                if event["stage"] in FINISHED:
+                    return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,168 @@
+# FILE: server/src/api/kolam_pipeline.py
+import random
+from typing import Union
+
+import cv2
+import numpy as np
+
+from src.api.cache import get_cache
+from src.api.img_processing import binarize, detect_curves, detect_dots_in_image, detect_lines
+from src.api.llm import llm_prompt_for_kolam
+from src.api.pipeline import Pipeline
+from src.api.recreate_logic import KolamRecreator
+from src.api.render import reconstruct_paths, render_kolam
+from src.api.schemas import CurvePath, Dot, KolamRequest, LinePath
+
+# Intermediate results are memoized per upload content hash, so e.g.
+# /api/know-your-kolam followed by /api/know-and-create-kolam on the same
+# image runs detection once.
+kolam_pipeline = Pipeline(memo=get_cache("pipeline", max_entries=512))
+
+
+# -----------------------------------------------------------
+# Placeholder for Mathematical Metric Calculation
+# -----------------------------------------------------------
+def calculate_kolam_metrics(dots: list[Dot], paths: list[Union[LinePath, CurvePath]]) -> dict:
+    """
+    Simulates the calculation of complex geometric metrics.
+    """
+    dot_count = len(dots)
+
+    # Simple heuristic for symmetry/repetition simulation
+    if dot_count > 0 and dot_count % 9 == 0:
+        symmetry = 98.5
+        repetition = 95.0
+        pattern_type = "Rotational C4/Reflectional"
+    elif dot_count > 0:
+        symmetry = np.clip(90 - (dot_count / 10), 65, 90)
+        repetition = np.clip(85 - (len(paths) / 5), 55, 85)
+        pattern_type = "Bilateral/Flowing"
+    else:
+        symmetry = 0.0
+        repetition = 0.0
+        pattern_type = "Undefined"
+
+    return {
+        "dot_count": dot_count,
+        "path_count": len(paths),
+        "symmetry_percentage": round(float(symmetry), 2),
+        "repetition_percentage": round(float(repetition), 2),
+        "pattern_type": pattern_type
+    }
+
+
+def _load_dots(dots):
+    return [tuple(d) for d in dots]
+
+
+def _dump_paths(paths):
+    return [p.model_dump() for p in paths]
+
+
+# -----------------------------------------------------------
+# Stages
+# -----------------------------------------------------------
+@kolam_pipeline.stage("decode", inputs=("upload",), outputs=("image",))
+def decode_stage(upload):
+    """The upload is decoded once at ingestion; later stages share the array."""
+    return upload.image
+
+
+@kolam_pipeline.stage("dots", inputs=("image",), outputs=("dots",), cacheable=True, load=_load_dots)
+def dots_stage(image):
+    return [(int(x), int(y)) for x, y in detect_dots_in_image(image)]
+
+
+@kolam_pipeline.stage("binarize", inputs=("image",), outputs=("binary",))
+def binarize_stage(image):
+    return binarize(image)
+
+
+@kolam_pipeline.stage("lines", inputs=("binary", "dots"), outputs=("lines",), cacheable=True,
+                      dump=_dump_paths, load=reconstruct_paths)
+def lines_stage(binary, dots):
+    return detect_lines(binary, dots)
+
+
+@kolam_pipeline.stage("curves", inputs=("binary", "dots"), outputs=("curves",), cacheable=True,
+                      dump=_dump_paths, load=reconstruct_paths)
+def curves_stage(binary, dots):
+    return detect_curves(binary, dots)
+
+
+@kolam_pipeline.stage("serialize", inputs=("dots", "lines", "curves"), outputs=("kolam_json",))
+def serialize_stage(dots, lines, curves):
+    """Detected geometry as a dict matching the KolamRequest schema."""
+    return {
+        "dots": [{"x": float(x), "y": float(y)} for x, y in dots],
+        "paths": [path.model_dump() for path in [*lines, *curves]],
+    }
+
+
+@kolam_pipeline.stage("enhance", inputs=("kolam_json",), outputs=("kolam",), cacheable=True,
+                      dump=lambda kolam: kolam.model_dump(), load=lambda data: KolamRequest(**data))
+def enhance_stage(kolam_json):
+    """Improve with the LLM, falling back to the detected kolam if its output is invalid."""
+    improved_json = llm_prompt_for_kolam(kolam_json)
+    try:
+        return KolamRequest(**improved_json)
+    except Exception as e:
+        print(f"⚠️ Invalid LLM schema: {e}")
+        return KolamRequest(**kolam_json)
+
+
+@kolam_pipeline.stage("render", inputs=("kolam",), outputs=("image_url",))
+def render_stage(kolam):
+    return render_kolam([(dot.x, dot.y) for dot in kolam.dots], kolam.paths)
+
+
+@kolam_pipeline.stage("metrics", inputs=("kolam",), outputs=("metrics",))
+def metrics_stage(kolam):
+    return calculate_kolam_metrics(kolam.dots, kolam.paths)
+
+
+# Metrics and render of the detected geometry as-is, without the LLM pass,
+# for callers that ask /api/know-your-kolam for them.
+@kolam_pipeline.stage("detected_metrics", inputs=("dots", "lines", "curves"), outputs=("detected_metrics",))
+def detected_metrics_stage(dots, lines, curves):
+    return calculate_kolam_metrics(dots, [*lines, *curves])
+
+
+@kolam_pipeline.stage("detected_render", inputs=("dots", "lines", "curves"), outputs=("detected_image_url",))
+def detected_render_stage(dots, lines, curves):
+    return render_kolam(dots, [*lines, *curves])
+
+
+@kolam_pipeline.stage("clahe_dots", inputs=("image",), outputs=("clahe_dots",), cacheable=True, load=_load_dots)
+def clahe_dots_stage(image):
+    """Dot detection after contrast equalization, for uneven lighting / faint dots."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+    enhanced_img = cv2.cvtColor(clahe.apply(gray), cv2.COLOR_GRAY2BGR)
+    return [(int(x), int(y)) for x, y in detect_dots_in_image(enhanced_img)]
+
+
+@kolam_pipeline.stage("recreate", inputs=("image", "clahe_dots"), outputs=("recreated_image",))
+def recreate_stage(image, clahe_dots):
+    """
+    Symmetric SVG from KolamRecreator, with a random rangoli fallback if the
+    recreation logic fails.
+    """
+    try:
+        return KolamRecreator().recreate(clahe_dots, image)
+    except Exception as e:
+        print(f"Kolam recreation failed ({str(e)}). Falling back to random rendering.")
+
+    if not clahe_dots:
+        raise Exception("Kolam recreation failed and no dots were detected for fallback.")
+
+    # Select dots to be part of the random pattern and loop LinePaths through them
+    active_dots = random.sample(clahe_dots, min(15, len(clahe_dots)))
+    random_paths = []
+    if len(active_dots) >= 2:
+        for i in range(len(active_dots)):
+            p1 = active_dots[i]
+            p2 = active_dots[(i + 1) % len(active_dots)]
+            random_paths.append(LinePath(p1=Dot(x=p1[0], y=p1[1]), p2=Dot(x=p2[0], y=p2[1])))
+
+    return render_kolam(clahe_dots, random_paths)
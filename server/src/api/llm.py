@@ -1,23 +1,45 @@
 
 import json
 import os
+import threading
 import uuid
 import base64
 from google import genai
+from google.genai import types
 from dotenv import load_dotenv
 import requests
 import re
 from src.api.schemas import KolamRequest
+from src.api.metrics import record_img_write, stage_timer, timed_stage
 
 load_dotenv()
 google_api_key = os.environ.get("GOOGLE_API_KEY")
-client = genai.Client(api_key=google_api_key)
+# Base URLs can point at local stubs (see benchmarks/stubs.py) for load tests.
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL")
+STABILITY_BASE_URL = os.environ.get("STABILITY_BASE_URL", "https://api.stability.ai").rstrip("/")
+STABILITY_KEY = os.environ.get("STABILITY_API_KEY")
+PROVIDER_TIMEOUT = float(os.environ.get("KOLAM_PROVIDER_TIMEOUT", 120))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> genai.Client:
+    """The Gemini client, created on first use so the API starts without credentials."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_options = types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None
+                _client = genai.Client(api_key=google_api_key, http_options=http_options)
+    return _client
 
 IMG_DIR = "img"
 os.makedirs(IMG_DIR, exist_ok=True)
 
+@timed_stage("llm_image")
 def llm_image(image_b64: str, mime_type: str = "image/png") -> str:
-    response = client.models.generate_content(
+    response = get_client().models.generate_content(
         model="gemini-2.5-flash",
         contents=[
             {"text": "Make a better, more aesthetic rangoli (kolam) design from this image."},
@@ -25,28 +47,31 @@ def llm_image(image_b64: str, mime_type: str = "image/png") -> str:
         ]
     )
 
-    image_base64 = None
+    image_data = None
     for candidate in response.candidates:
         for part in candidate.content.parts:
-            if hasattr(part, "inline_data") and part.inline_data.mime_type.startswith("image/"):
-                image_base64 = part.inline_data.data
+            if getattr(part, "inline_data", None) and part.inline_data.mime_type.startswith("image/"):
+                image_data = part.inline_data.data
                 break
 
-    if not image_base64:
+    if not image_data:
         raise ValueError("No image could be generated")
 
     output_filename = f"{uuid.uuid4()}.png"
     output_path = os.path.join(IMG_DIR, output_filename)
     with open(output_path, "wb") as f:
-        f.write(base64.b64decode(image_base64))
+        # The SDK hands back decoded bytes; older versions returned base64 text
+        f.write(image_data if isinstance(image_data, bytes) else base64.b64decode(image_data))
+    record_img_write("llm", output_path)
 
     return output_filename
 
-STABILITY_KEY = os.environ["STABILITY_API_KEY"]
-
+@timed_stage("stability")
 def sd_image(image_b64: str, prompt: str) -> str:
+    if not STABILITY_KEY:
+        raise ValueError("STABILITY_API_KEY is not set")
     response = requests.post(
-        "https://api.stability.ai/v2beta/stable-image/generate/core",
+        f"{STABILITY_BASE_URL}/v2beta/stable-image/generate/core",
         headers={
             "Authorization": f"Bearer {STABILITY_KEY}",
             "Accept": "application/json"
@@ -58,7 +83,8 @@ def sd_image(image_b64: str, prompt: str) -> str:
             "prompt": prompt,
             "mode": "image-to-image",
             "strength": 0.5
-        }
+        },
+        timeout=PROVIDER_TIMEOUT,
     )
 
     if response.status_code != 200:
@@ -66,25 +92,28 @@ def sd_image(image_b64: str, prompt: str) -> str:
 
     data = response.json()
 
-    # Stability returns images in artifacts
-    artifacts = data.get("artifacts", [])
-    if not artifacts or "base64" not in artifacts[0]:
-        raise ValueError("No image generated")
-
-    img_b64 = artifacts[0]["base64"]
+    # v2beta returns the image under "image"; v1 responses used artifacts
+    img_b64 = data.get("image")
+    if not img_b64:
+        artifacts = data.get("artifacts", [])
+        if not artifacts or "base64" not in artifacts[0]:
+            raise ValueError("No image generated")
+        img_b64 = artifacts[0]["base64"]
     filename = f"{uuid.uuid4()}.png"
     output_path = os.path.join(IMG_DIR, filename)
 
     with open(output_path, "wb") as f:
         f.write(base64.b64decode(img_b64))
+    record_img_write("stability", output_path)
 
     return filename
 
 def llm_prompt(prompt: str, model_name: str = "gemini-2.5-flash") -> str:
     try:
-        response = client.models.generate_content(
-            model=model_name, contents=prompt
-        )
+        with stage_timer("llm"):
+            response = get_client().models.generate_content(
+                model=model_name, contents=prompt
+            )
         return response.text.strip() if hasattr(response, "text") else str(response)
     except Exception as e:
         print(f"⚠️ LLM Error: {e}")
@@ -1,26 +1,34 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
-from src.api.auth import router as auth_router
+from fastapi.responses import JSONResponse, PlainTextResponse
+from src.api.auth import auth_router
+from starlette.concurrency import run_in_threadpool
 import uvicorn
-import cv2
+import asyncio
 import os
-import shutil
-import uuid
-import numpy as np
+import time
 import base64
-import random 
-from src.api.recreate_logic import KolamRecreator 
+from typing import List, Optional, Tuple
+import numpy as np
 from src.api.inference import predict
-from src.api.render import render_kolam, reconstruct_paths
-from src.api.schemas import KolamRequest, Dot, LinePath, CurvePath
-from src.api.img_processing import detect_dots_in_image, detect_lines_and_curves
+from src.api.render import render_kolam
+from src.api.schemas import KolamRequest
+from src.api import attributes, vector
 from src.api.vector import find_similar
-from src.api.llm import llm_image, llm_prompt_for_kolam
+from src.api.llm import llm_image
 from src.api.llm import sd_image
-from typing import Union
-import tempfile
+from src.api.kolam_pipeline import kolam_pipeline, calculate_kolam_metrics
+from src.api.ingest import UploadedImage, decode_image, ingest_upload, read_upload
+from src.api import gate
+from src.api.cache import get_cache, cache_stats
+from src.api.phash import PerceptualIndex, fingerprint, get_near_duplicate
+from src.api.singleflight import flights
+from src.api.jobs import job_queue, jobs_router
+from src.api.metrics import registry, REQUEST_DURATION, REQUESTS_IN_FLIGHT
+from src.api.profiling import profile_request, should_profile
+from src.api.admin import admin_router
+from src.api.model_registry import model_registry, warmup_names
 import hashlib
 
 from fastapi import APIRouter, Depends
@@ -30,48 +38,87 @@ from .security import get_current_user
 # The variable MUST be named 'user_router' to match the import in main.py
 user_router = APIRouter()
 
+app = FastAPI(title="Kolam AI server", version="0.1.0")
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
 os.makedirs("img", exist_ok=True) 
 
 app.mount("/img", StaticFiles(directory="img"), name="img")
 app.mount("/imgdata", StaticFiles(directory="imgdata"), name="imgdata")
 
 app.include_router(auth_router, prefix="/api/auth")
+app.include_router(jobs_router, prefix="/api/jobs")
+app.include_router(admin_router, prefix="/api/admin")
+
+
+@app.middleware("http")
+async def profile_requests(request, call_next):
+    """Opt-in cProfile of a request's pipeline work (X-Kolam-Profile header or sampling)."""
+    if not should_profile(request.headers):
+        return await call_next(request)
+    with profile_request(f"{request.method} {request.url.path}") as profile_ids:
+        response = await call_next(request)
+    if profile_ids:
+        response.headers["X-Kolam-Profile-Id"] = ",".join(profile_ids)
+    return response
+
+
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    REQUESTS_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        # Label by route template (/api/jobs/{job_id}), not the raw path
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        REQUEST_DURATION.observe(time.perf_counter() - started,
+                                 method=request.method, route=route, status=status)
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# -----------------------------------------------------------
-# Placeholder for Mathematical Metric Calculation
-# -----------------------------------------------------------
-def calculate_kolam_metrics(dots: list[Dot], paths: list[Union[LinePath, CurvePath]]) -> dict:
+@app.on_event("startup")
+def start_job_workers():
+    job_queue.start()
+    registry.start_flusher()
+    # Load models in the background so the worker accepts requests (and /healthz) right away
+    model_registry.warmup(warmup_names())
+
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    job_queue.shutdown()
+
+
+@app.get("/healthz", include_in_schema=False)
+def healthz():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz", include_in_schema=False)
+def readyz():
     """
-    Simulates the calculation of complex geometric metrics.
+    Readiness: every required model in the warmup set (KOLAM_WARMUP_MODELS)
+    is loaded. Optional models and models whose warmup gave up are listed
+    under "unavailable" instead of holding the worker out of rotation.
     """
-    dot_count = len(dots)
-    
-    # Simple heuristic for symmetry/repetition simulation
-    if dot_count > 0 and dot_count % 9 == 0:
-        symmetry = 98.5
-        repetition = 95.0
-        pattern_type = "Rotational C4/Reflectional"
-    elif dot_count > 0:
-        symmetry = np.clip(90 - (dot_count / 10), 65, 90)
-        repetition = np.clip(85 - (len(paths) / 5), 55, 85)
-        pattern_type = "Bilateral/Flowing"
-    else:
-        symmetry = 0.0
-        repetition = 0.0
-        pattern_type = "Undefined"
-        
-    return {
-        "dot_count": dot_count,
-        "path_count": len(paths),
-        "symmetry_percentage": round(float(symmetry), 2),
-        "repetition_percentage": round(float(repetition), 2),
-        "pattern_type": pattern_type
-    }
-
-# -----------------------------------------------------------
+    ready = model_registry.ready()
+    return JSONResponse(status_code=200 if ready else 503,
+                        content={"status": "ready" if ready else "warming_up",
+                                 "waiting_for": model_registry.blocking(),
+                                 "unavailable": model_registry.unavailable(),
+                                 "models": model_registry.status()})
 
 
 @app.post("/api/create_kolam")
@@ -83,141 +130,114 @@ def create_kolam(data: KolamRequest):
     return {"message": "Kolam created", "file": filename}
 
 
+# Fields /api/know-your-kolam can return and the pipeline value behind each;
+# only the stages those values depend on run.
+KOLAM_FIELDS = {
+    "dots": ("dots", lambda dots: [{"x": float(x), "y": float(y)} for x, y in dots]),
+    "paths": ("kolam_json", lambda kolam_json: kolam_json["paths"]),
+    "lines": ("lines", lambda lines: [path.model_dump() for path in lines]),
+    "curves": ("curves", lambda curves: [path.model_dump() for path in curves]),
+    "metrics": ("detected_metrics", lambda metrics: metrics),
+    "render": ("detected_image_url", lambda image_url: image_url),
+}
+DEFAULT_KOLAM_FIELDS = "dots,paths"
+
+
 @app.post("/api/know-your-kolam")
-async def know_your_kolam(file: UploadFile = File(...)):
-    # Save uploaded file
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-    tmp.write(await file.read())
-    tmp.close()
+async def know_your_kolam(file: UploadFile = File(...), fields: str = DEFAULT_KOLAM_FIELDS):
+    """
+    Detected kolam geometry. `fields` names what to return (dots, paths,
+    lines, curves, metrics, render); the default is a dict matching
+    KolamRequest. `stages` lists the pipeline stages that ran, with their
+    times and whether the result came from the per-upload memo.
+    """
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = sorted(set(requested) - set(KOLAM_FIELDS))
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f"fields must be a subset of {', '.join(KOLAM_FIELDS)}")
+
+    # Read and decode the upload in memory, turn away non-kolams before detection
+    upload = await ingest_upload(file)
+    gate.require_kolam(upload)
     
     try:
-        # Load and process image
-        img = cv2.imread(tmp.name, cv2.IMREAD_COLOR)
-        if img is None:
-            return {"error": "Could not load image"}
-        
-        h, w = img.shape[:2]
-        
-        # Step 1: Detect dots in the image
-        detected_dots = detect_dots_in_image(img)
-        
-        # Convert to Dot objects
-        dots = [Dot(x=float(x), y=float(y)) for x, y in detected_dots]
-        
-        # Step 2: Detect lines and curves
-        lines, curves = detect_lines_and_curves(img, detected_dots)
-        
-        # Combine all paths
-        all_paths = []
-        for line in lines:
-            all_paths.append(line)
-        for curve in curves:
-            all_paths.append(curve)
-        
-        # Step 3: Return formatted response that matches KolamRequest schema
-        result = {
-            "dots": [{"x": dot.x, "y": dot.y} for dot in dots],
-            "paths": []
-        }
-        
-        # Format paths according to schema
-        for path in all_paths:
-            if isinstance(path, LinePath):
-                result["paths"].append({
-                    "type": "line",
-                    "p1": {"x": path.p1.x, "y": path.p1.y},
-                    "p2": {"x": path.p2.x, "y": path.p2.y}
-                })
-            elif isinstance(path, CurvePath):
-                result["paths"].append({
-                    "type": "curve",
-                    "p1": {"x": path.p1.x, "y": path.p1.y},
-                    "ctrl": {"x": path.ctrl.x, "y": path.ctrl.y},
-                    "p2": {"x": path.p2.x, "y": path.p2.y}
-                })
-        
-        return result
-        
+        key = f"know-your-kolam:{upload.digest}:{','.join(sorted(requested))}"
+        return await flights.do(key, _know_your_kolam, upload, requested)
+
     except Exception as e:
         return {"error": f"Error processing image: {str(e)}"}
 
-cache = {}
+
+def _know_your_kolam(upload, fields=tuple(DEFAULT_KOLAM_FIELDS.split(","))):
+    run = kolam_pipeline.run([KOLAM_FIELDS[f][0] for f in fields], {"upload": upload}, key=upload.digest)
+    result = {}
+    for field in fields:
+        value, to_json = KOLAM_FIELDS[field]
+        result[field] = to_json(run[value])
+    return {**result, "stages": run.stages}
+
+cache = get_cache("know-and-create-kolam")
+near_duplicates = PerceptualIndex("know-and-create-kolam", cache=cache)
 
 @app.post("/api/know-and-create-kolam")
 async def know_and_create_kolam(file: UploadFile = File(...)):
-    # Read file content
-    content = await file.read()
+    # Read and decode the upload in memory, turn away non-kolams before detection and the LLM
+    upload = await ingest_upload(file)
+    gate.require_kolam(upload)
     
     # Compute hash of file content
-    file_hash = hashlib.md5(content).hexdigest()
+    file_hash = hashlib.md5(upload.data).hexdigest()
     
-    # Check if this file content is already cached
-    if file_hash in cache:
-        return cache[file_hash]
+    # Check if this file content is already cached (by any worker)
+    cached = cache.get(file_hash)
+    if cached is not None:
+        return cached
 
-    try:
-        # Save to temporary file (needed for OpenCV)
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-        tmp.write(content)
-        tmp.close()
-
-        # Step 1: Load image
-        img = cv2.imread(tmp.name, cv2.IMREAD_COLOR)
-        if img is None:
-            return {"error": "Could not load image"}
-
-        # Step 2: Detect dots + paths
-        detected_dots = detect_dots_in_image(img)
-        dots = [Dot(x=float(x), y=float(y)) for x, y in detected_dots]
-        lines, curves = detect_lines_and_curves(img, detected_dots)
-
-        kolam_json = {
-            "dots": [{"x": d.x, "y": d.y} for d in dots],
-            "paths": []
-        }
+    # Concurrent uploads of the same image share one detection + LLM run
+    return await flights.do(f"know-and-create-kolam:{file_hash}", _know_and_create, upload, file_hash)
 
-        for path in [*lines, *curves]:
-            if isinstance(path, LinePath):
-                kolam_json["paths"].append({
-                    "type": "line",
-                    "p1": {"x": path.p1.x, "y": path.p1.y},
-                    "p2": {"x": path.p2.x, "y": path.p2.y}
-                })
-            elif isinstance(path, CurvePath):
-                kolam_json["paths"].append({
-                    "type": "curve",
-                    "p1": {"x": path.p1.x, "y": path.p1.y},
-                    "ctrl": {"x": path.ctrl.x, "y": path.ctrl.y},
-                    "p2": {"x": path.p2.x, "y": path.p2.y}
-                })
-
-        # Step 3: Improve with LLM
-        improved_json = llm_prompt_for_kolam(kolam_json)
-
-        # Step 4: Validate
-        try:
-            validated = KolamRequest(**improved_json)
-        except Exception as e:
-            print(f"⚠️ Invalid LLM schema: {e}")
-            validated = KolamRequest(**kolam_json)
 
-        # Step 5: Render final enhanced kolam
-        output_filename = render_kolam(
-            [(dot.x, dot.y) for dot in validated.dots],
-            validated.paths
-        )
+def _no_progress(stage: str, **data):
+    pass
 
-        # Step 6: Calculate metrics
-        metrics = calculate_kolam_metrics(validated.dots, validated.paths)
+
+# Job progress event emitted after each pipeline stage
+_PROGRESS_EVENTS = {
+    "dots": lambda run: ("dots_detected", {"count": len(run["dots"])}),
+    "curves": lambda run: ("paths_detected", {"lines": len(run["lines"]), "curves": len(run["curves"])}),
+    "enhance": lambda run: ("llm_enhanced", {"dots": len(run["kolam"].dots), "paths": len(run["kolam"].paths)}),
+    "render": lambda run: ("rendered", {"image_url": run["image_url"]}),
+}
+
+
+def _know_and_create(upload, file_hash: str, progress=_no_progress):
+    # Second tier: the same kolam resized or re-encoded by another app
+    fp = fingerprint(upload.image)
+    cached = get_near_duplicate(cache, near_duplicates, fp)
+    if cached is not None:
+        return cached
+
+    def on_stage(stage, run):
+        if stage.name in _PROGRESS_EVENTS:
+            event, data = _PROGRESS_EVENTS[stage.name](run)
+            progress(event, **data)
+
+    try:
+        # decode -> dots -> paths -> serialize -> LLM enhance -> render + metrics
+        run = kolam_pipeline.run(
+            ["image_url", "metrics"], {"upload": upload}, key=upload.digest, on_stage=on_stage
+        )
 
         # Cache the result keyed by file hash
-        cache[file_hash] = {
+        result = {
             "message": "Kolam analyzed, enhanced by LLM, and created successfully",
-            "image_url": output_filename,
-            "metrics": metrics,
+            "image_url": run["image_url"],
+            "metrics": run["metrics"],
         }
+        cache.set(file_hash, result)
+        near_duplicates.add(fp, file_hash)
 
-        return cache[file_hash]
+        return result
 
     except Exception as e:
         return {"error": f"Error processing image: {str(e)}"}
@@ -234,92 +254,82 @@ async def recreate_kolam(file: UploadFile = File(...)):
     fallback if the complex recreation logic fails.
     """
     
-    file_id = uuid.uuid4()
-    file_path = os.path.join(UPLOAD_DIR, f"original_{file_id}_{file.filename}")
-    
+    upload = await ingest_upload(file)
+    gate.require_kolam(upload)
+    return await flights.do(f"recreate:{upload.digest}", _recreate, upload)
+
+
+def _recreate(upload):
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        img = cv2.imread(file_path, cv2.IMREAD_COLOR)
-        if img is None:
-            raise Exception("Could not load image for recreation")
-
-        # --- ENHANCEMENT FOR DOT DETECTION: Applying contrast equalization ---
-        # Convert to grayscale for robust processing
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        # Apply contrast enhancement (CLAHE) to handle uneven lighting/faint dots
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        enhanced_gray = clahe.apply(gray)
-        # Convert back to 3-channel BGR as detect_dots_in_image may expect it
-        enhanced_img = cv2.cvtColor(enhanced_gray, cv2.COLOR_GRAY2BGR)
-            
-        detected_dots = detect_dots_in_image(enhanced_img)
-        # --------------------------------------------------------------------
-        
-        # --- ATTEMPT COMPLEX RECREATION ---
-        try:
-            recreator = KolamRecreator()
-            # detected_dots is List[Tuple[float, float]]
-            # Pass the path to the original file for the recreation logic to read
-            recreated_image_path = recreator.recreate(detected_dots, file_path) 
-            return {"recreatedImage": recreated_image_path}
-            
-        except Exception as e:
-            # --- FALLBACK: Generate Random Rangoli ---
-            print(f"Kolam recreation failed ({str(e)}). Falling back to random rendering.")
-            
-            if not detected_dots:
-                raise Exception("Kolam recreation failed and no dots were detected for fallback.")
-
-            num_dots_to_connect = min(15, len(detected_dots))
-            
-            # Select dots to be part of the random pattern
-            active_dots = random.sample(detected_dots, num_dots_to_connect)
-            random_paths = []
-            
-            if len(active_dots) >= 2:
-                # Loop through the dots and create LinePaths between them
-                for i in range(len(active_dots)):
-                    p1_tuple = active_dots[i]
-                    p2_tuple = active_dots[(i + 1) % len(active_dots)] 
-                    
-                    # Create Dot objects for LinePath
-                    p1 = Dot(x=p1_tuple[0], y=p1_tuple[1])
-                    p2 = Dot(x=p2_tuple[0], y=p2_tuple[1])
-                    
-                    # NOTE: Using LinePath for the simple random fallback
-                    line_path = LinePath(p1=p1, p2=p2)
-                    random_paths.append(line_path)
-            
-            # Use the original list of tuples (detected_dots) for rendering
-            fallback_filename = render_kolam(
-                detected_dots,
-                random_paths
-            )
-            return {"recreatedImage": fallback_filename}
+        # decode -> CLAHE-enhanced dots -> KolamRecreator (random fallback)
+        run = kolam_pipeline.run(["recreated_image"], {"upload": upload}, key=upload.digest)
+        return {"recreatedImage": run["recreated_image"]}
 
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"Kolam processing failed: {str(e)}"})
-        
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
 
 
 @app.post("/api/predict")
 async def predict_image(file: UploadFile = File(...)):
-    file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}_{file.filename}")
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    result = predict(file_path)
-    os.remove(file_path)
+    upload = await ingest_upload(file)
+    result = await flights.do(f"predict:{upload.digest}", lambda: predict(upload.to_pil()))
     return {"prediction": result}
 
+# -----------------------------------------------------------
+# /api/analyze: one upload, one decode, branches run concurrently
+# -----------------------------------------------------------
+ANALYZE_FIELDS = ("kolam", "prediction", "matches")
+
+
+@app.post("/api/analyze")
+async def analyze_kolam(file: UploadFile = File(...), fields: str = ",".join(ANALYZE_FIELDS), top_k: int = 5):
+    """
+    What /api/know-your-kolam, /api/predict and /api/search return, for a
+    single upload. `fields` selects the branches to run; each runs in the
+    threadpool and coalesces with identical requests to the single-purpose
+    endpoints, so wall time is that of the slowest branch requested.
+    """
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = sorted(set(requested) - set(ANALYZE_FIELDS))
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f"fields must be a subset of {', '.join(ANALYZE_FIELDS)}")
+    if not 1 <= top_k <= 50:
+        raise HTTPException(status_code=400, detail="top_k must be between 1 and 50")
+
+    upload = await ingest_upload(file)
+    image = upload.to_pil() if {"prediction", "matches"} & set(requested) else None
+    verdict = gate.check(upload) if "kolam" in requested else None
+    branches = {
+        "kolam": lambda: flights.do(f"know-your-kolam:{upload.digest}:dots,paths", _know_your_kolam, upload),
+        "prediction": lambda: flights.do(f"predict:{upload.digest}", predict, image),
+        "matches": lambda: flights.do(f"search:{upload.digest}:{top_k}", find_similar, image,
+                                      top_k=top_k, digest=upload.digest),
+    }
+
+    async def timed(field):
+        started = time.perf_counter()
+        if field == "kolam" and not verdict.accepted:
+            return field, None, verdict.message, time.perf_counter() - started
+        try:
+            return field, await branches[field](), None, time.perf_counter() - started
+        except Exception as e:
+            return field, None, f"{type(e).__name__}: {e}", time.perf_counter() - started
+
+    result, errors, timings = {}, {}, {}
+    for field, value, error, seconds in await asyncio.gather(*(timed(f) for f in dict.fromkeys(requested))):
+        timings[field] = round(seconds * 1000, 1)
+        if error is not None:
+            errors[field] = error
+        elif field == "matches":
+            result[field] = [path for path, _ in value]
+        else:
+            result[field] = value
+    return {**result, "errors": errors, "timings_ms": timings}
+
+
 @app.post("/api/llm")
 async def get_better_image_with_llm(file: UploadFile = File(...)):
-    file_bytes = await file.read()
+    file_bytes = await read_upload(file)
     file_b64 = base64.b64encode(file_bytes).decode("utf-8")
     result = llm_image(file_b64, mime_type=file.content_type)
 
@@ -327,7 +337,7 @@ async def get_better_image_with_llm(file: UploadFile = File(...)):
 
 @app.post("/api/stability")
 async def get_better_image_with_stability(file: UploadFile = File(...)):
-    file_bytes = await file.read()
+    file_bytes = await read_upload(file)
     file_b64 = base64.b64encode(file_bytes).decode("utf-8")
 
     prompt = "Make this rangoli (kolam) design more aesthetic, colorful, and traditional."
@@ -335,17 +345,172 @@ async def get_better_image_with_stability(file: UploadFile = File(...)):
 
     return {"llmRecreate": f"/img/{result}"}
 
-@app.post("/api/search")
-async def search_similar(file: UploadFile = File(...)):
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+def _search_filters(region: Optional[str], kolam_class: Optional[str], grid: Optional[str]) -> dict:
+    try:
+        filters = attributes.parse_filters(region, kolam_class, grid)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    unknown = sorted(set(filters) - set(vector.INDEX_ATTRIBUTES))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot filter on {', '.join(unknown)}: not recorded by the index")
+    return filters
 
-    results = find_similar(file_path, top_k=5)
-    os.remove(file_path)
+
+def _filters_key(filters: dict) -> str:
+    return "".join(f":{name}={','.join(sorted(map(str, values)))}" for name, values in sorted(filters.items()))
+
+
+@app.post("/api/search")
+async def search_similar(file: UploadFile = File(...), expand: bool = False, region: Optional[str] = None,
+                         kolam_class: Optional[str] = Query(None, alias="class"), grid: Optional[str] = None):
+    """
+    Paths of the 5 most similar images; expand adds the near-duplicates
+    collapsed into each. region (TamilNadu, Maharastra, AndhraPradesh,
+    Karnataka or tn / mh / ap / kar), class (the CNN's) and grid (dots per
+    side) keep only images with those attributes; each takes a
+    comma-separated list.
+    """
+    filters = _search_filters(region, kolam_class, grid)
+    upload = await ingest_upload(file)
+    results = await flights.do(f"search:{upload.digest}:5{':expand' if expand else ''}{_filters_key(filters)}",
+                               lambda: find_similar(upload.to_pil(), top_k=5, digest=upload.digest, expand=expand,
+                                                    filters=filters))
     return {"matches": [p for p, d in results]}
 
 
+SEARCH_BATCH_MAX = int(os.environ.get("KOLAM_SEARCH_BATCH_MAX", 64))
+
+
+def _search_batch(uploads: List[Tuple[Optional[str], bytes]], top_k: int, expand: bool, filters: dict) -> dict:
+    digests = [hashlib.sha256(data).hexdigest() for _, data in uploads]
+    vectors = vector.cached_embeddings(digests)
+    cached = len(vectors)
+
+    # Only queries not seen before are decoded and go through CLIP, in one batched pass
+    images, errors = {}, {}
+    for (filename, data), digest in zip(uploads, digests):
+        if digest in vectors or digest in images or digest in errors:
+            continue
+        try:
+            images[digest] = UploadedImage(data, decode_image(data), filename).to_pil()
+        except HTTPException as e:
+            errors[digest] = e.detail
+    vectors.update(vector.embed_queries(images))
+
+    found = [digest for digest in dict.fromkeys(digests) if digest in vectors]
+    matches = (dict(zip(found, vector.search_vectors(np.vstack([vectors[d] for d in found]), top_k, expand,
+                                                     filters)))
+               if found else {})
+    results = []
+    for (filename, _), digest in zip(uploads, digests):
+        if digest in matches:
+            results.append({"filename": filename, "digest": digest,
+                            "matches": [{"path": path, "distance": distance} for path, distance in matches[digest]]})
+        else:
+            results.append({"filename": filename, "digest": digest, "error": errors[digest]})
+    return {"results": results, "top_k": top_k, "metric": vector.distance_metric(), "cached": cached,
+            "filters": {name: sorted(values) for name, values in filters.items()}}
+
+
+@app.post("/api/search/batch")
+async def search_similar_batch(files: List[UploadFile] = File(...), top_k: int = 5, expand: bool = False,
+                               region: Optional[str] = None, kolam_class: Optional[str] = Query(None, alias="class"),
+                               grid: Optional[str] = None):
+    """
+    /api/search for many query images at once: queries seen before (by
+    content hash) skip CLIP, the rest are embedded together, and all of them
+    go to the index in a single search. Results are in upload order, with
+    distances (cosine similarity or L2, see `metric`); an image that cannot
+    be decoded gets an error instead of failing the batch. expand lists the
+    near-duplicates collapsed into each match after it; region, class and
+    grid filter every query as in /api/search.
+    """
+    filters = _search_filters(region, kolam_class, grid)
+    if not 1 <= top_k <= 50:
+        raise HTTPException(status_code=400, detail="top_k must be between 1 and 50")
+    if len(files) > SEARCH_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {SEARCH_BATCH_MAX} files per batch")
+    uploads = [(file.filename, await read_upload(file)) for file in files]
+    return await run_in_threadpool(_search_batch, uploads, top_k, expand, filters)
+
+
+# -----------------------------------------------------------
+# Background jobs: POST /api/jobs/{kind} returns a job id at once
+# -----------------------------------------------------------
+def _upload_from_job(payload: bytes, params: dict) -> UploadedImage:
+    return UploadedImage(payload, decode_image(payload), params.get("filename"), params.get("content_type"))
+
+
+def know_and_create_job(payload: bytes, params: dict, progress):
+    upload = _upload_from_job(payload, params)
+    progress("decoded", width=upload.width, height=upload.height)
+    verdict = gate.check(upload)
+    if not verdict.accepted:
+        raise RuntimeError(verdict.message)
+    file_hash = hashlib.md5(upload.data).hexdigest()
+    result = cache.get(file_hash)
+    if result is None:
+        result = _know_and_create(upload, file_hash, progress)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result
+
+
+def llm_job(payload: bytes, params: dict, progress):
+    file_b64 = base64.b64encode(payload).decode("utf-8")
+    result = llm_image(file_b64, mime_type=params.get("content_type") or "image/png")
+    progress("llm_enhanced", file=result)
+    return {"llmRecreate": result}
+
+
+def stability_job(payload: bytes, params: dict, progress):
+    file_b64 = base64.b64encode(payload).decode("utf-8")
+    prompt = "Make this rangoli (kolam) design more aesthetic, colorful, and traditional."
+    result = sd_image(file_b64, prompt=prompt)
+    progress("rendered", file=result)
+    return {"llmRecreate": f"/img/{result}"}
+
+
+job_queue.register("know-and-create-kolam", know_and_create_job)
+job_queue.register("llm", llm_job)
+job_queue.register("stability", stability_job)
+
+
+# -----------------------------------------------------------
+# Metrics: per-worker values read at snapshot time
+# -----------------------------------------------------------
+_CACHE_COUNTERS = {
+    name: registry.counter(f"kolam_cache_{name}_total", f"Result cache {name.replace('_', ' ')}.", ("cache",))
+    for name in ("hits", "disk_hits", "misses", "evictions")
+}
+_JOB_QUEUE_DEPTH = registry.gauge("kolam_job_queue_depth", "Background jobs accepted and not yet finished.")
+_SINGLE_FLIGHT = registry.gauge("kolam_single_flight_in_flight", "Distinct coalesced computations running.")
+_SINGLE_FLIGHT_COALESCED = registry.counter(
+    "kolam_single_flight_coalesced_total", "Requests that awaited an identical in-flight computation.")
+
+
+def _collect_runtime_metrics():
+    for cache_name, stats in cache_stats().items():
+        for name, counter in _CACHE_COUNTERS.items():
+            counter.set_total(stats[name], cache=cache_name)
+    _JOB_QUEUE_DEPTH.set(job_queue.queue_depth())
+    _SINGLE_FLIGHT.set(flights.in_flight())
+    _SINGLE_FLIGHT_COALESCED.set_total(flights.coalesced)
+
+
+registry.add_collector(_collect_runtime_metrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/cache/stats")
+def get_cache_stats():
+    return {**cache_stats(), "single_flight": flights.stats()}
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
 # This is a secure endpoint that gets the currently authenticated user's details.
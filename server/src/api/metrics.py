@@ -0,0 +1,337 @@
+# FILE: server/src/api/metrics.py
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+METRICS_DIR = os.environ.get("KOLAM_METRICS_DIR", "metrics")
+FLUSH_INTERVAL = float(os.environ.get("KOLAM_METRICS_FLUSH_INTERVAL", 5))
+
+# Seconds; spans a cached lookup (~1ms) up to a slow Gemini round trip
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Recorded from request threads, the threadpool and background threads
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels) -> None:
+        """Mirror a running total kept elsewhere (e.g. ResultCache.hits)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> dict:
+        with self._lock:
+            return {"|".join(k): v for k, v in self._values.items()}
+
+
+class Gauge(Counter):
+    """Per-worker value; /metrics sums it over live workers."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self.set_total(value, **labels)
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> dict:
+        with self._lock:
+            return {"|".join(k): list(v) for k, v in self._values.items()}
+
+
+class Registry:
+    """
+    Metrics of one worker process. Recording is an in-memory update under a
+    per-metric lock; each worker periodically writes a snapshot file to
+    METRICS_DIR and /metrics merges the snapshots of all workers.
+    """
+
+    def __init__(self, directory: str = METRICS_DIR):
+        self.directory = directory
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._flusher: Optional[threading.Thread] = None
+
+    def register(self, metric: _Metric) -> _Metric:
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Callback run before each snapshot, for values read from elsewhere (cache stats, queue depth)."""
+        self._collectors.append(collector)
+
+    # -- snapshots -------------------------------------------------------
+    def snapshot(self) -> dict:
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                print(f"⚠️ Metrics collector failed: {e}")
+        return {
+            "pid": os.getpid(),
+            "time": time.time(),
+            "metrics": {
+                name: {
+                    "kind": m.kind,
+                    "help": m.documentation,
+                    "labels": list(m.labelnames),
+                    "buckets": list(getattr(m, "buckets", ())),
+                    "samples": m.samples(),
+                }
+                for name, m in list(self._metrics.items())
+            },
+        }
+
+    def flush(self) -> None:
+        """Write this worker's snapshot atomically."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def start_flusher(self, interval: float = FLUSH_INTERVAL) -> None:
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    # Keep the thread alive: a dead flusher freezes this worker's series
+                    print(f"⚠️ Metrics flush failed: {e}")
+
+        self._flusher = threading.Thread(target=loop, name="kolam-metrics", daemon=True)
+        self._flusher.start()
+
+    def worker_snapshots(self) -> List[dict]:
+        """Latest snapshot of every live worker, including this one."""
+        self.flush()
+        snapshots = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, filename)
+            pid = int(filename[:-5]) if filename[:-5].isdigit() else None
+            if pid is not None and pid != os.getpid() and not _pid_alive(pid):
+                # Worker is gone; Prometheus treats the drop as a counter reset.
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        """Prometheus text exposition format, aggregated over all live workers."""
+        merged: Dict[str, dict] = {}
+        for snapshot in self.worker_snapshots():
+            for name, metric in snapshot["metrics"].items():
+                target = merged.setdefault(name, {**metric, "samples": {}})
+                for key, value in metric["samples"].items():
+                    if key not in target["samples"]:
+                        target["samples"][key] = value
+                    elif isinstance(value, list):
+                        target["samples"][key] = [a + b for a, b in zip(target["samples"][key], value)]
+                    else:
+                        target["samples"][key] += value
+
+        lines = []
+        for name in sorted(merged):
+            metric = merged[name]
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            for key, value in sorted(metric["samples"].items()):
+                labels = dict(zip(metric["labels"], key.split("|"))) if metric["labels"] else {}
+                if metric["kind"] == "histogram":
+                    cumulative = 0
+                    for bound, count in zip([*metric["buckets"], "+Inf"], value[:-1]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {value[-1]}")
+                    lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels.keys(), escaped)) + "}"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    "kolam_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "kolam_http_requests_in_flight", "HTTP requests currently being served.")
+STAGE_DURATION = registry.histogram(
+    "kolam_stage_duration_seconds", "Latency of individual processing stages.", ("stage",))
+STAGE_ERRORS = registry.counter(
+    "kolam_stage_errors_total", "Processing stages that raised.", ("stage",))
+IMG_BYTES_WRITTEN = registry.counter(
+    "kolam_img_bytes_written_total", "Bytes written to img/ by source.", ("source",))
+WORKER_MEMORY = registry.gauge(
+    "kolam_worker_memory_bytes", "Memory of each worker process (rss, pss, shared, private).", ("pid", "kind"))
+
+
+def process_memory() -> Dict[str, int]:
+    """
+    Memory of this process in bytes. PSS charges each shared page to the
+    processes mapping it in equal parts, so summed over workers it is their
+    real footprint; "shared" shows how much copy-on-write / mmap sharing works.
+    """
+    try:
+        fields = {}
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                parts = rest.split()
+                if len(parts) == 2 and parts[1] == "kB":
+                    fields[key] = int(parts[0]) * 1024
+        return {
+            "rss": fields["Rss"],
+            "pss": fields["Pss"],
+            "shared": fields["Shared_Clean"] + fields["Shared_Dirty"],
+            "private": fields["Private_Clean"] + fields["Private_Dirty"],
+        }
+    except (OSError, KeyError):
+        # Not Linux: only the peak is available
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"rss": peak if sys.platform == "darwin" else peak * 1024}
+
+
+def _collect_process_memory():
+    pid = os.getpid()
+    for kind, value in process_memory().items():
+        WORKER_MEMORY.set(value, pid=pid, kind=kind)
+
+
+registry.add_collector(_collect_process_memory)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Record the latency of a block under kolam_stage_duration_seconds{stage=...}."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - started, stage=stage)
+
+
+def timed_stage(stage: str):
+    """Decorator form of stage_timer."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_img_write(source: str, path_or_size) -> None:
+    """Count bytes written to img/ (pass the written file's path or its size)."""
+    try:
+        size = path_or_size if isinstance(path_or_size, int) else os.path.getsize(path_or_size)
+    except OSError:
+        return
+    IMG_BYTES_WRITTEN.inc(size, source=source)
@@ -0,0 +1,176 @@
+# FILE: server/src/api/model_registry.py
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from src.api.metrics import registry
+
+# Models loaded in the background when a worker starts: a comma-separated list,
+# "all" (default) or "none" for workers that should only load on first use.
+WARMUP_MODELS = os.environ.get("KOLAM_WARMUP_MODELS", "all")
+# A failed warmup load is retried this many times, waiting WARMUP_BACKOFF
+# seconds and doubling after each attempt; after that the model is given up
+# on (it still loads on first use) so it no longer holds /readyz at 503.
+WARMUP_RETRIES = int(os.environ.get("KOLAM_WARMUP_RETRIES", 3))
+WARMUP_BACKOFF = float(os.environ.get("KOLAM_WARMUP_BACKOFF", 2))
+
+MODEL_LOAD_SECONDS = registry.gauge("kolam_model_load_seconds", "Time taken to load each model", ("model",))
+MODEL_READY = registry.gauge("kolam_model_ready", "1 once a model is loaded in this worker", ("model",))
+
+
+class _Entry:
+    def __init__(self, name: str, loader: Callable[[], Any], optional: bool = False):
+        self.name = name
+        self.loader = loader
+        self.optional = optional
+        self.lock = threading.Lock()
+        self.value = None
+        self.state = "pending"  # pending -> loading -> ready | failed
+        self.given_up = False  # warmup exhausted its retries
+        self.attempts = 0
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.loaded_at: Optional[float] = None
+
+
+class ModelRegistry:
+    """
+    Models (and other expensive resources) by name, loaded on first get() or
+    by a background warmup. Modules register a loader at import time, which
+    costs nothing; the load itself happens once per worker, and its duration
+    is recorded.
+
+    Optional models (the worker serves without them, e.g. with a fallback)
+    are warmed up like the others but never hold readiness back.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._warmup: Optional[threading.Thread] = None
+        self._warmup_names: tuple = ()
+
+    def register(self, name: str, loader: Callable[[], Any], optional: bool = False) -> None:
+        self._entries[name] = _Entry(name, loader, optional)
+
+    def names(self) -> list:
+        return sorted(self._entries)
+
+    def get(self, name: str) -> Any:
+        entry = self._entries[name]
+        if entry.state == "ready":
+            return entry.value
+        with entry.lock:
+            if entry.state != "ready":
+                # A failed load is retried on the next use.
+                entry.state, entry.error = "loading", None
+                entry.attempts += 1
+                started = time.perf_counter()
+                try:
+                    entry.value = entry.loader()
+                except Exception as e:
+                    entry.state, entry.error = "failed", f"{type(e).__name__}: {e}"
+                    raise
+                entry.load_seconds = round(time.perf_counter() - started, 3)
+                entry.loaded_at = time.time()
+                entry.state, entry.given_up = "ready", False
+                MODEL_LOAD_SECONDS.set(entry.load_seconds, model=name)
+                MODEL_READY.set(1, model=name)
+                print(f"✅ Loaded {name} in {entry.load_seconds:.2f}s")
+        return entry.value
+
+    def _set_warmup_names(self, names: Optional[Iterable[str]]) -> None:
+        names = self.names() if names is None else list(names)
+        for name in [n for n in names if n not in self._entries]:
+            print(f"⚠️ Unknown model '{name}' in warmup list, ignoring")
+        self._warmup_names = tuple(n for n in names if n in self._entries)
+
+    def preload(self, names: Optional[Iterable[str]] = None) -> None:
+        """
+        Load models synchronously in this process. Used by the pre-fork
+        server (gunicorn.conf.py) so workers inherit them copy-on-write.
+        """
+        self._set_warmup_names(names)
+        for name in self._warmup_names:
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"⚠️ Preload of {name} failed, workers will retry: {e}")
+
+    def warmup(self, names: Optional[Iterable[str]] = None, retries: int = WARMUP_RETRIES,
+               backoff: float = WARMUP_BACKOFF) -> None:
+        """Load the given models (default: all registered) in a background thread."""
+        if self._warmup is not None:
+            return
+        self._set_warmup_names(names)
+
+        def load_all():
+            pending = list(self._warmup_names)
+            delay = backoff
+            for attempt in range(retries + 1):
+                failed = []
+                for name in pending:
+                    try:
+                        self.get(name)
+                    except Exception as e:
+                        print(f"⚠️ Warmup of {name} failed (attempt {attempt + 1}/{retries + 1}): {e}")
+                        failed.append(name)
+                pending = failed
+                if not pending or attempt == retries:
+                    break
+                time.sleep(delay)
+                delay *= 2
+            for name in pending:
+                if self._entries[name].state != "ready":
+                    self._entries[name].given_up = True
+                    print(f"⚠️ Giving up warming {name}; it will load on first use")
+
+        self._warmup = threading.Thread(target=load_all, name="kolam-warmup", daemon=True)
+        self._warmup.start()
+
+    def blocking(self) -> list:
+        """Warmup models that readiness still waits for."""
+        return [
+            name for name in self._warmup_names
+            if self._entries[name].state != "ready"
+            and not self._entries[name].optional and not self._entries[name].given_up
+        ]
+
+    def unavailable(self) -> list:
+        """Warmup models that are not loaded but do not block readiness (optional or given up)."""
+        return [
+            name for name in self._warmup_names
+            if self._entries[name].state != "ready" and name not in self.blocking()
+        ]
+
+    def ready(self) -> bool:
+        """True once every required model in the warmup set is loaded or has been given up on."""
+        return not self.blocking()
+
+    def status(self) -> dict:
+        return {
+            name: {
+                "state": entry.state,
+                "warmup": name in self._warmup_names,
+                "optional": entry.optional,
+                "given_up": entry.given_up,
+                "attempts": entry.attempts,
+                "load_seconds": entry.load_seconds,
+                "loaded_at": entry.loaded_at,
+                "error": entry.error,
+            }
+            for name, entry in sorted(self._entries.items())
+        }
+
+
+def warmup_names(setting: str = WARMUP_MODELS) -> Optional[list]:
+    """Parse KOLAM_WARMUP_MODELS; None means every registered model."""
+    setting = setting.strip().lower()
+    if setting in ("", "all"):
+        return None
+    if setting == "none":
+        return []
+    return [name.strip() for name in setting.split(",") if name.strip()]
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,97 @@
+# FILE: server/src/api/partitions.py
+import os
+from typing import Dict, Iterable, List, Set, Tuple
+
+import faiss
+import numpy as np
+
+from src.api import ann
+
+# Below this many matching images, approximate indexes (IVF, HNSW) answer a
+# filtered search exactly from the matches' reconstructed vectors: a
+# selective filter would leave IVF's probed lists or HNSW's graph walk with
+# too few candidates. Flat indexes always scan with the filter.
+EXACT_LIMIT = int(os.environ.get("KOLAM_PARTITION_EXACT_LIMIT", 4096))
+
+
+class Partitions:
+    """
+    The ids filed under each value of each partitioned attribute
+    (region=TamilNadu, grid=5, ...). Only ids are kept, no vectors: a
+    filtered search runs on the main index, which workers share through the
+    memory-mapped snapshot, restricted to the ids that pass every filter
+    with an ID selector.
+    """
+
+    def __init__(self, attributes: Iterable[str]):
+        self.attributes = tuple(attributes)
+        self._ids: Dict[Tuple[str, object], Set[int]] = {}
+        self._keys: Dict[int, List[Tuple[str, object]]] = {}
+
+    def add(self, ids: Iterable[int], attributes: List[Dict[str, object]]) -> None:
+        """File ids under each of their attribute values (None = unknown, not filed)."""
+        for image_id, values in zip(np.asarray(ids).tolist(), attributes):
+            keys = [(name, values[name]) for name in self.attributes if values.get(name) is not None]
+            self._keys[image_id] = keys
+            for key in keys:
+                self._ids.setdefault(key, set()).add(image_id)
+
+    def remove(self, ids: Iterable[int]) -> None:
+        for image_id in ids:
+            for key in self._keys.pop(int(image_id), ()):
+                self._ids[key].discard(int(image_id))
+
+    def ids(self, name: str, values: Iterable) -> np.ndarray:
+        found = set()
+        for value in values:
+            found |= self._ids.get((name, value), set())
+        return np.fromiter(sorted(found), dtype="int64", count=len(found))
+
+    def size(self, name: str, values: Iterable) -> int:
+        return sum(len(self._ids.get((name, value), ())) for value in values)
+
+    def sizes(self) -> Dict[str, Dict[str, int]]:
+        """Images per value of each attribute."""
+        sizes: Dict[str, Dict[str, int]] = {name: {} for name in self.attributes}
+        for (name, value), ids in sorted(self._ids.items(), key=lambda item: str(item[0])):
+            if ids:
+                sizes[name][str(value)] = len(ids)
+        return sizes
+
+    def allowed(self, filters: Dict[str, set]) -> np.ndarray:
+        """Ids passing every filter (attribute -> accepted values), smallest set first."""
+        allowed = None
+        for name in sorted(filters, key=lambda name: self.size(name, filters[name])):
+            ids = self.ids(name, filters[name])
+            allowed = ids if allowed is None else np.intersect1d(allowed, ids, assume_unique=True)
+            if not len(allowed):
+                break
+        return allowed
+
+    def search(self, index: faiss.Index, queries: np.ndarray, k: int,
+               filters: Dict[str, set]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (distances, ids) of the k nearest vectors of `index` passing every
+        filter, like faiss' search; rows with fewer matches are padded with
+        id -1.
+        """
+        inner_product = index.metric_type == faiss.METRIC_INNER_PRODUCT
+        allowed = self.allowed(filters)
+        if not len(allowed):
+            return (np.full((len(queries), k), np.nan, dtype="float32"),
+                    np.full((len(queries), k), -1, dtype="int64"))
+
+        if not ann.is_exact(index) and len(allowed) <= EXACT_LIMIT:
+            vectors = index.reconstruct_batch(allowed)
+            distances, rows = faiss.knn(queries, vectors, min(k, len(allowed)),
+                                        metric=faiss.METRIC_INNER_PRODUCT if inner_product else faiss.METRIC_L2)
+            ids = np.where(rows >= 0, allowed[np.maximum(rows, 0)], -1)
+        else:
+            params = ann.search_params(index, faiss.IDSelectorBatch(allowed))
+            distances, ids = index.search(queries, min(k, len(allowed)), params=params)
+
+        if ids.shape[1] < k:
+            pad = k - ids.shape[1]
+            distances = np.hstack([distances, np.full((len(queries), pad), np.nan, dtype="float32")])
+            ids = np.hstack([ids, np.full((len(queries), pad), -1, dtype="int64")])
+        return distances, ids
@@ -0,0 +1,215 @@
+# FILE: server/src/api/phash.py
+import os
+import threading
+from typing import Any, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from src.api.cache import CACHE_DB, ResultCache, shared_store
+
+# Max Hamming distance (out of 128 bits) for two uploads to count as the same kolam
+DEFAULT_RADIUS = int(os.environ.get("KOLAM_PHASH_RADIUS", 12))
+THUMB_WIDTH = 128
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS phash (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace TEXT NOT NULL,
+    hash      TEXT NOT NULL,
+    dots      INTEGER NOT NULL,
+    key       TEXT NOT NULL
+)
+"""
+
+
+class Fingerprint:
+    """128-bit dHash+pHash of a tiny grayscale thumbnail, plus a rough dot count."""
+
+    def __init__(self, hash_value: int, dots: int):
+        self.hash = hash_value
+        self.dots = dots
+
+    def distance(self, other: "Fingerprint") -> int:
+        return hamming(self.hash, other.hash)
+
+    def __repr__(self):
+        return f"Fingerprint({self.hash:032x}, dots={self.dots})"
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash(gray: np.ndarray) -> int:
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 thumbnail."""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return _bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+def phash(gray: np.ndarray) -> int:
+    """64-bit perceptual hash: low-frequency DCT coefficients against their median."""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].ravel()
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+def count_dots(thumb: np.ndarray) -> int:
+    """Cheap blob count on a THUMB_WIDTH-wide thumbnail, used to veto hash collisions."""
+    params = cv2.SimpleBlobDetector_Params()
+    params.filterByArea = True
+    params.minArea = 3
+    params.maxArea = 60
+    params.filterByCircularity = True
+    params.minCircularity = 0.3
+    return len(cv2.SimpleBlobDetector_create(params).detect(thumb))
+
+
+def thumbnail(img: np.ndarray, width: int = THUMB_WIDTH) -> np.ndarray:
+    """Fixed-width grayscale thumbnail of a decoded BGR (or grayscale) image."""
+    h, w = img.shape[:2]
+    small = cv2.resize(img, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+    return small if small.ndim == 2 else cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+
+def fingerprint(img: np.ndarray) -> Fingerprint:
+    """Fingerprint a decoded BGR (or grayscale) image."""
+    thumb = thumbnail(img)
+    return Fingerprint((dhash(thumb) << 64) | phash(thumb), count_dots(thumb))
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes with Hamming distance."""
+
+    def __init__(self):
+        self._root = None  # [hash, item, {distance: child}]
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, hash_value: int, item: Any) -> None:
+        self._size += 1
+        if self._root is None:
+            self._root = [hash_value, item, {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(hash_value, node[0])
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [hash_value, item, {}]
+                return
+            node = child
+
+    def search(self, hash_value: int, radius: int) -> List[Tuple[int, Any]]:
+        """All (distance, item) within radius, nearest first."""
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            d = hamming(hash_value, node[0])
+            if d <= radius:
+                found.append((d, node[1]))
+            for child_d, child in node[2].items():
+                if d - radius <= child_d <= d + radius:
+                    stack.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+class PerceptualIndex:
+    """
+    Near-duplicate lookup from an image fingerprint to the cache key of an
+    earlier upload. Entries live in the shared cache database so that every
+    worker (and the next restart) sees them; each worker keeps a BK-tree and
+    pulls rows it has not seen yet before searching.
+
+    With a `cache`, rows whose key that cache has evicted are deleted each
+    time it prunes its disk tier, and every worker rebuilds its tree once it
+    notices rows have gone.
+    """
+
+    def __init__(self, namespace: str, radius: int = DEFAULT_RADIUS, db_path: str = CACHE_DB,
+                 dot_tolerance: float = 0.35, cache: Optional[ResultCache] = None):
+        self.namespace = namespace
+        self.radius = radius
+        self.dot_tolerance = dot_tolerance
+        # Pruning joins against the cache table, so share the cache's database
+        self._store = cache._store if cache is not None and cache._store is not None else shared_store(db_path)
+        self._store.execute(_SCHEMA)
+        self._tree = BKTree()
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._cache_namespace = cache.namespace if cache is not None else None
+        if cache is not None:
+            cache.on_prune(self.prune)
+
+    def _sync(self) -> None:
+        kept = self._store.execute(
+            "SELECT COUNT(*) FROM phash WHERE namespace = ? AND id <= ?", (self.namespace, self._last_id),
+        )[0][0]
+        if kept < len(self._tree):
+            # Rows were pruned (here or by another worker); a BK-tree cannot delete, so start over
+            self._tree, self._last_id = BKTree(), 0
+        rows = self._store.execute(
+            "SELECT id, hash, dots, key FROM phash WHERE namespace = ? AND id > ? ORDER BY id",
+            (self.namespace, self._last_id),
+        )
+        for row_id, hash_hex, dots, key in rows:
+            self._tree.add(int(hash_hex, 16), (dots, key))
+            self._last_id = row_id
+
+    def _dots_match(self, a: int, b: int) -> bool:
+        # Blob counts on a thumbnail drift with re-encoding, so the tolerance is loose.
+        return abs(a - b) <= max(3, self.dot_tolerance * max(a, b))
+
+    def candidates(self, fp: Fingerprint) -> List[str]:
+        """Cache keys of stored near-duplicates, nearest first."""
+        with self._lock:
+            self._sync()
+            matches = self._tree.search(fp.hash, self.radius)
+        return [key for _, (dots, key) in matches if self._dots_match(dots, fp.dots)]
+
+    def lookup(self, fp: Fingerprint) -> Optional[str]:
+        """Cache key of the nearest stored near-duplicate, or None."""
+        keys = self.candidates(fp)
+        return keys[0] if keys else None
+
+    def add(self, fp: Fingerprint, key: str) -> None:
+        self._store.execute(
+            "INSERT INTO phash (namespace, hash, dots, key) VALUES (?, ?, ?, ?)",
+            (self.namespace, f"{fp.hash:032x}", fp.dots, key),
+        )
+
+    def prune(self) -> int:
+        """Delete rows whose cache entry is gone; returns the number removed."""
+        if self._cache_namespace is None:
+            return 0
+        return self._store.modify(
+            "DELETE FROM phash WHERE namespace = ? AND key NOT IN ("
+            "  SELECT key FROM cache WHERE namespace = ?)",
+            (self.namespace, self._cache_namespace),
+        )
+
+    def __len__(self):
+        return len(self._tree)
+
+
+def get_near_duplicate(cache: ResultCache, index: PerceptualIndex, fp: Fingerprint) -> Any:
+    """Second-tier cache lookup: the cached value of a near-duplicate upload, or None."""
+    for key in index.candidates(fp):
+        # peek: probing candidates is not a miss of the exact-hash cache
+        value = cache.peek(key)
+        if value is not None:
+            return value
+    return None
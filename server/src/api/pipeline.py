@@ -0,0 +1,147 @@
+# FILE: server/src/api/pipeline.py
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from src.api.cache import ResultCache
+from src.api.profiling import profiled
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+class Stage:
+    """
+    One step of a pipeline. `fn` is called with the stage's inputs as keyword
+    arguments and returns its single output, or a tuple matching `outputs`.
+
+    Cacheable stages are memoized per content hash; `dump` / `load` convert
+    their outputs to and from JSON-serialisable values.
+    """
+
+    def __init__(self, name: str, fn: Callable, inputs: Sequence[str], outputs: Sequence[str],
+                 cacheable: bool = False, dump: Callable = _identity, load: Callable = _identity):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.cacheable = cacheable
+        self.dump = dump
+        self.load = load
+
+    def __repr__(self):
+        return f"Stage({self.name}: {', '.join(self.inputs)} -> {', '.join(self.outputs)})"
+
+
+class PipelineRun:
+    """Values produced by one run plus the stages that ran and how long each took."""
+
+    def __init__(self, values: Dict[str, Any]):
+        self.values = values
+        self.stages: List[dict] = []
+
+    def __getitem__(self, name: str) -> Any:
+        return self.values[name]
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self.values.get(name, default)
+
+
+class Pipeline:
+    """
+    Declarative stage graph. Stages are registered with the names of the
+    values they consume and produce; run() works out which stages a set of
+    targets needs and executes only those, in dependency order.
+    """
+
+    def __init__(self, memo: Optional[ResultCache] = None):
+        self.memo = memo
+        self._stages: Dict[str, Stage] = {}
+        self._producers: Dict[str, Stage] = {}
+
+    def stage(self, name: str, inputs: Sequence[str] = (), outputs: Sequence[str] = (),
+              cacheable: bool = False, dump: Callable = _identity, load: Callable = _identity):
+        """Decorator registering a function as a stage."""
+        def decorator(fn: Callable) -> Callable:
+            self.add(Stage(name, fn, inputs, outputs or (name,), cacheable, dump, load))
+            return fn
+        return decorator
+
+    def add(self, stage: Stage) -> None:
+        for output in stage.outputs:
+            if output in self._producers:
+                raise ValueError(f"'{output}' is already produced by stage '{self._producers[output].name}'")
+        self._stages[stage.name] = stage
+        for output in stage.outputs:
+            self._producers[output] = stage
+
+    @property
+    def stages(self) -> Dict[str, Stage]:
+        return dict(self._stages)
+
+    def plan(self, targets: Iterable[str], available: Iterable[str] = ()) -> List[Stage]:
+        """Stages needed to produce targets from the available values, in run order."""
+        available = set(available)
+        order: List[Stage] = []
+        visiting = set()
+
+        def visit(value: str):
+            if value in available:
+                return
+            stage = self._producers.get(value)
+            if stage is None:
+                raise KeyError(f"No stage produces '{value}'")
+            if stage in order:
+                return
+            if stage.name in visiting:
+                raise ValueError(f"Cycle through stage '{stage.name}'")
+            visiting.add(stage.name)
+            for dependency in stage.inputs:
+                visit(dependency)
+            visiting.discard(stage.name)
+            order.append(stage)
+
+        for target in targets:
+            visit(target)
+        return order
+
+    def run(self, targets: Iterable[str], inputs: Dict[str, Any], key: Optional[str] = None,
+            on_stage: Optional[Callable] = None) -> PipelineRun:
+        """
+        Produce `targets` from `inputs`. `key` (the upload's content hash)
+        enables per-stage memoization; on_stage(stage, run) is called after
+        each stage.
+        """
+        with profiled("pipeline"):
+            return self._run(self.plan(targets, inputs), inputs, key, on_stage)
+
+    def _run(self, plan: List[Stage], inputs: Dict[str, Any], key: Optional[str],
+             on_stage: Optional[Callable]) -> PipelineRun:
+        run = PipelineRun(dict(inputs))
+        for stage in plan:
+            started = time.perf_counter()
+            cached = False
+            outputs = None
+
+            memo_key = f"{key}:{stage.name}" if key and stage.cacheable and self.memo is not None else None
+            if memo_key is not None:
+                stored = self.memo.get(memo_key)
+                if stored is not None:
+                    outputs = tuple(stage.load(value) for value in stored)
+                    cached = True
+
+            if outputs is None:
+                result = stage.fn(**{name: run.values[name] for name in stage.inputs})
+                outputs = result if len(stage.outputs) > 1 else (result,)
+                if memo_key is not None:
+                    self.memo.set(memo_key, [stage.dump(value) for value in outputs])
+
+            run.values.update(zip(stage.outputs, outputs))
+            run.stages.append({
+                "stage": stage.name,
+                "ms": round((time.perf_counter() - started) * 1000, 3),
+                "cached": cached,
+            })
+            if on_stage is not None:
+                on_stage(stage, run)
+        return run
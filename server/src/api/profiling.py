@@ -0,0 +1,177 @@
+# FILE: server/src/api/profiling.py
+import cProfile
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, List, Optional
+
+PROFILE_DIR = os.environ.get("KOLAM_PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.environ.get("KOLAM_PROFILE_KEEP", 50))
+PROFILE_TOKEN = os.environ.get("KOLAM_PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.environ.get("KOLAM_PROFILE_SAMPLE_RATE", 0))
+PROFILE_HEADER = "x-kolam-profile"
+
+# Set for the duration of a request (or job) that should be profiled. Starlette's
+# threadpool copies the context, so work offloaded from the request sees it too.
+_request: ContextVar[Optional[dict]] = ContextVar("kolam_profile_request", default=None)
+_thread = threading.local()
+
+
+def should_profile(headers) -> bool:
+    """Profile when the request carries the configured token, or by sampling."""
+    token = headers.get(PROFILE_HEADER)
+    if PROFILE_TOKEN and token == PROFILE_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def requested() -> bool:
+    return _request.get() is not None
+
+
+@contextmanager
+def profile_request(label: str):
+    """Mark the current request (or job) for profiling; yields the list of saved profile ids."""
+    state = {"label": label, "ids": []}
+    token = _request.set(state)
+    try:
+        yield state["ids"]
+    finally:
+        _request.reset(token)
+
+
+@contextmanager
+def profiled(name: str):
+    """
+    cProfile the enclosed block in the current thread if the surrounding
+    request asked for it. Nested blocks fold into the outermost one.
+    """
+    state = _request.get()
+    if state is None or getattr(_thread, "active", False):
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    _thread.active = True
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _thread.active = False
+        try:
+            state["ids"].append(_save(profiler, state["label"], name, time.perf_counter() - started))
+        except OSError as e:
+            print(f"⚠️ Could not save profile: {e}")
+
+
+def profiled_call(fn: Callable, name: Optional[str] = None) -> Callable:
+    """Wrap fn so that it runs under profiled() (for work handed to another thread)."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with profiled(name or getattr(fn, "__name__", "call")):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+# -----------------------------------------------------------
+# Bounded on-disk ring of profiles
+# -----------------------------------------------------------
+def _save(profiler: cProfile.Profile, label: str, name: str, seconds: float) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{profile_id}.pstats"))
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), "w") as f:
+        json.dump({"id": profile_id, "label": label, "block": name, "pid": os.getpid(),
+                   "seconds": round(seconds, 6), "created_at": time.time()}, f)
+    _trim()
+    return profile_id
+
+
+def _trim() -> None:
+    ids = sorted(f[:-7] for f in os.listdir(PROFILE_DIR) if f.endswith(".pstats"))
+    for profile_id in ids[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else ids:
+        for ext in (".pstats", ".json"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + ext))
+            except OSError:
+                pass
+
+
+def list_profiles() -> List[dict]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for filename in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if filename.endswith(".json"):
+            try:
+                with open(os.path.join(PROFILE_DIR, filename)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return profiles
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    # Ids are generated by _save(); reject anything else so they can't escape PROFILE_DIR.
+    if not profile_id.replace("-", "").isalnum():
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.pstats")
+    return path if os.path.exists(path) else None
+
+
+def to_speedscope(path: str, name: str, max_depth: int = 64, max_samples: int = 20_000) -> dict:
+    """
+    Convert a pstats file to speedscope's sampled format. cProfile only keeps
+    caller -> callee edges, so each function's own time is spread over its
+    call stacks in proportion to the time each caller spent in it.
+    """
+    raw = pstats.Stats(path).stats
+    frames, frame_index = [], {}
+    samples, weights = [], []
+
+    def frame(func) -> int:
+        if func not in frame_index:
+            frame_index[func] = len(frames)
+            filename, line, function = func
+            frames.append({"name": function, "file": filename, "line": line})
+        return frame_index[func]
+
+    def walk(func, weight: float, below: list, seen: frozenset):
+        callers = {c: v for c, v in raw[func][4].items() if c not in seen and c in raw}
+        total = sum(v[3] for v in callers.values())
+        if not callers or total <= 0 or len(below) >= max_depth or len(samples) >= max_samples \
+                or weight < 1e-7:
+            samples.append([frame(f) for f in [func, *below]])
+            weights.append(weight)
+            return
+        for caller, (_, _, _, cumulative) in callers.items():
+            walk(caller, weight * cumulative / total, [func, *below], seen | {func})
+
+    for func, (_, _, own_time, _, _) in raw.items():
+        if own_time > 0:
+            walk(func, own_time, [], frozenset())
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "kolam-server",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
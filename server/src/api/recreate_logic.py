@@ -44,12 +44,14 @@ class KolamRecreator:
         self.center = Point(self.viewbox_size / 2, self.viewbox_size / 2) 
         self.tolerance = 30 # Increased to 30
         
-    def _load_and_enhance_image(self, image_path: str) -> np.ndarray:
-        """Loads, converts to grayscale, and enhances image contrast (CLAHE)."""
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"Image not found at path: {image_path}")
-            
-        img = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    def _load_and_enhance_image(self, image: Union[str, np.ndarray]) -> np.ndarray:
+        """Loads (or takes an already decoded BGR array), converts to grayscale, and enhances image contrast (CLAHE)."""
+        if isinstance(image, np.ndarray):
+            img = image
+        else:
+            if not os.path.exists(image):
+                raise FileNotFoundError(f"Image not found at path: {image}")
+            img = cv2.imread(image, cv2.IMREAD_COLOR)
         if img is None:
             raise IOError("Could not load image using OpenCV.")
             
@@ -198,13 +200,13 @@ class KolamRecreator:
                                     
         return symmetrical_paths
 
-    def recreate(self, detected_dots: List[DotTuple], image_path: str) -> str:
+    def recreate(self, detected_dots: List[DotTuple], image: Union[str, np.ndarray]) -> str:
         """
         Main function to orchestrate recreation and rendering using grid inference.
         """
         # --- 0. Load and Pre-process Image ---
         try:
-            enhanced_image = self._load_and_enhance_image(image_path)
+            enhanced_image = self._load_and_enhance_image(image)
             # Use original dimensions from the image to correctly scale the dot coordinates
             original_height, original_width = enhanced_image.shape[:2]
         except Exception as e:
@@ -3,9 +3,11 @@ import time
 from typing import Sequence, Tuple, Union
 
 from src.api.schemas import LinePath, CurvePath, Dot
+from src.api.metrics import record_img_write, timed_stage
 
 DotTuple = Tuple[float, float]
 
+@timed_stage("render")
 def render_kolam(
     dots: Sequence[DotTuple],
     paths: Sequence[Union[LinePath, CurvePath]]
@@ -41,6 +43,7 @@ def render_kolam(
             ))
 
     dwg.save()
+    record_img_write("render", filename)
     return filename
 
 def reconstruct_paths(path_data):
@@ -1,4 +1,6 @@
 # FILE: server/src/api/schemas.py
+from typing import List, Literal, Union
+
 from pydantic import BaseModel, EmailStr
 
 # Schema for creating a user (expects a password)
@@ -22,4 +24,25 @@ class Token(BaseModel):
 
 # Schema for data inside the token
 class TokenData(BaseModel):
-    email: str | None = None
\ No newline at end of file
+    email: str | None = None
+
+# Kolam geometry shared by detection, the LLM and rendering
+class Dot(BaseModel):
+    x: float
+    y: float
+
+class LinePath(BaseModel):
+    type: Literal["line"] = "line"
+    p1: Dot
+    p2: Dot
+
+class CurvePath(BaseModel):
+    type: Literal["curve"] = "curve"
+    p1: Dot
+    ctrl: Dot
+    p2: Dot
+
+# Schema for /api/create_kolam and the LLM-enhanced kolam JSON
+class KolamRequest(BaseModel):
+    dots: List[Dot]
+    paths: List[Union[LinePath, CurvePath]]
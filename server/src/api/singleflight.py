@@ -0,0 +1,48 @@
+# FILE: server/src/api/singleflight.py
+import asyncio
+import inspect
+from typing import Any, Callable, Dict
+
+from starlette.concurrency import run_in_threadpool
+
+from src.api.profiling import profiled_call
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key (e.g. an upload's content
+    hash) into one execution; every caller awaits the same result.
+
+    Blocking functions run in the threadpool, so the computation also stops
+    stalling the event loop. The computation runs as its own task, so a
+    client that disconnects does not cancel it for the callers still waiting.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable, *args, **kwargs) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            if inspect.iscoroutinefunction(fn):
+                coro = fn(*args, **kwargs)
+            else:
+                coro = run_in_threadpool(profiled_call(fn), *args, **kwargs)
+            task = asyncio.ensure_future(coro)
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight(), "executed": self.executed, "coalesced": self.coalesced}
+
+
+flights = SingleFlight()
@@ -0,0 +1,130 @@
+# FILE: server/src/api/snapshots.py
+import fcntl
+import glob
+import json
+import os
+import re
+import time
+from typing import Callable, Optional, Tuple
+
+# Saved snapshots to keep besides the current one. Processes that still have
+# an older one memory-mapped keep reading it after its files are deleted.
+KEEP_SNAPSHOTS = int(os.environ.get("KOLAM_INDEX_KEEP", 2))
+
+
+class StaleSnapshot(RuntimeError):
+    """Another process published a newer version than the one the changes were made on."""
+
+    def __init__(self, expected: int, current: int):
+        super().__init__(f"Index snapshot {current} was published after {expected}, which these changes are based on")
+        self.expected = expected
+        self.current = current
+
+
+class Snapshot:
+    """
+    One saved version of the similarity index: the FAISS file and the
+    metadata file written together (see publish). Version 0 is an index
+    saved before snapshots, as a bare INDEX_FILE / META_FILE pair.
+    """
+
+    def __init__(self, version: int, index_file: str, meta_file: str, info: Optional[dict] = None):
+        self.version = version
+        self.index_file = index_file
+        self.meta_file = meta_file
+        self.info = dict(info or {})
+
+    def exists(self) -> bool:
+        return os.path.exists(self.index_file) and os.path.exists(self.meta_file)
+
+
+def manifest_path(index_file: str) -> str:
+    return os.path.splitext(index_file)[0] + ".json"
+
+
+def _versioned(path: str, version: int) -> str:
+    stem, suffix = os.path.splitext(path)
+    return f"{stem}.v{version:06d}{suffix}"
+
+
+def read_manifest(index_file: str) -> Optional[Snapshot]:
+    """The snapshot the manifest points at, or None if nothing has been published yet."""
+    try:
+        with open(manifest_path(index_file)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    directory = os.path.dirname(index_file)
+    return Snapshot(manifest["version"], os.path.join(directory, manifest["index"]),
+                    os.path.join(directory, manifest["meta"]), manifest)
+
+
+def current(index_file: str, meta_file: str) -> Optional[Snapshot]:
+    """The newest complete snapshot: the manifest's, else an unversioned pair, else None."""
+    snapshot = read_manifest(index_file)
+    if snapshot is not None and snapshot.exists():
+        return snapshot
+    bare = Snapshot(0, index_file, meta_file)
+    return bare if bare.exists() else None
+
+
+def publish(index_file: str, meta_file: str, write: Callable[[str, str], None], info: dict,
+            expected_version: Optional[int] = None) -> Snapshot:
+    """
+    Save a new version: write(index_path, meta_path) writes both files under
+    their versioned names, then the manifest is replaced to point at them.
+    Renaming the manifest is the commit, so readers see the old pair or the
+    new one and never half of each; a crash before it leaves the old
+    version current. Publishers in other processes wait on a lock file.
+
+    With expected_version (the version the changes were made on), raises
+    StaleSnapshot instead of writing if the current version is any other,
+    so one publisher never silently replaces another's changes.
+    """
+    manifest = manifest_path(index_file)
+    os.makedirs(os.path.dirname(manifest) or ".", exist_ok=True)
+    with open(f"{manifest}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        previous = read_manifest(index_file)
+        current = previous.version if previous else 0
+        if expected_version is not None and current != expected_version:
+            raise StaleSnapshot(expected_version, current)
+        version = current + 1
+        snapshot = Snapshot(version, _versioned(index_file, version), _versioned(meta_file, version))
+        write(snapshot.index_file, snapshot.meta_file)
+
+        snapshot.info = dict(info, version=version, index=os.path.basename(snapshot.index_file),
+                             meta=os.path.basename(snapshot.meta_file), created=time.time())
+        tmp = f"{manifest}.tmp{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(snapshot.info, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, manifest)
+        prune(index_file, meta_file, version)
+    return snapshot
+
+
+def _versions(path: str) -> dict:
+    stem, suffix = os.path.splitext(path)
+    pattern = re.compile(re.escape(os.path.basename(stem)) + r"\.v(\d+)" + re.escape(suffix) + "$")
+    found = {}
+    for candidate in glob.glob(f"{glob.escape(stem)}.v*{suffix}"):
+        match = pattern.match(os.path.basename(candidate))
+        if match:
+            found[candidate] = int(match.group(1))
+    return found
+
+
+def prune(index_file: str, meta_file: str, current_version: int, keep: int = KEEP_SNAPSHOTS) -> Tuple[str, ...]:
+    """Delete snapshot files older than the `keep` versions before current_version; returns the paths."""
+    removed = []
+    for path in (index_file, meta_file):
+        for candidate, version in _versions(path).items():
+            if version < current_version - keep:
+                try:
+                    os.remove(candidate)
+                    removed.append(candidate)
+                except FileNotFoundError:
+                    pass
+    return tuple(removed)
@@ -1,95 +1,1055 @@
 # src/api/vector.py
+import argparse
 import os
 import pickle
-from typing import List, Tuple
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
 import numpy as np
 import torch
 import clip
+from clip.clip import _transform
+from clip.model import build_model
 from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+from tqdm import tqdm
 import faiss
 
+from src.api import ann, attributes, clip_export, snapshots
+from src.api.batching import MicroBatcher
+from src.api.embedding_cache import EmbeddingCache, QueryEmbeddingCache, content_hash
+from src.api.index_meta import IndexMetadata
+from src.api.metrics import registry, stage_timer
+from src.api.model_registry import model_registry
+from src.api.partitions import Partitions
+from src.api.weights import MMAP_WEIGHTS, load_module, save_state_dict
+
 DATA_DIR = "imgdata"
+# Saved as numbered snapshots (image_index.v000001.faiss + .meta) with a
+# manifest, image_index.json, naming the current pair (see snapshots.py);
+# a bare pair under these names is read as version 0.
 INDEX_FILE = "image_index.faiss"
-META_FILE = "image_paths.pkl"
+META_FILE = "image_index.meta"
+# Pickled path list (or dict) written by earlier versions; converted on first load
+LEGACY_META_FILE = "image_paths.pkl"
+CLIP_MODEL = "ViT-B/32"
+# fp32 state dict exported from the CLIP checkpoint on first load; later loads
+# memory-map it (see weights.py).
+CLIP_WEIGHTS_FILE = os.environ.get("KOLAM_CLIP_WEIGHTS", "src/model/saved/clip-vit-b-32.pt")
+# Image tower exported for serving by `python -m src.api.vector export`; used
+# instead of the full fp32 model whenever it exists ("" = always fp32)
+CLIP_VISUAL_FILE = os.environ.get("KOLAM_CLIP_VISUAL", "src/model/saved/clip-vit-b-32-visual.pt")
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp")
+# Images within this cosine similarity of an indexed one (re-saves, copies,
+# light crops) join its cluster instead of getting their own vector; search
+# returns the cluster once. Above 1 every image is indexed on its own.
+DEDUP_THRESHOLD = float(os.environ.get("KOLAM_DEDUP_THRESHOLD", 0.98))
+_DEDUP_CHUNK = 1024
+# Attributes recorded for each indexed image (any of attributes.ATTRIBUTES,
+# comma-separated; none by default), which searches can then be filtered on
+# (see partitions.py). class runs the CNN and grid the dot detector on every
+# image indexed.
+INDEX_ATTRIBUTES = tuple(a.strip() for a in os.environ.get("KOLAM_INDEX_ATTRIBUTES", "").split(",")
+                         if a.strip() in attributes.ATTRIBUTES)
+
+# build_index: loader workers decode and preprocess while the main process
+# runs CLIP on whole batches with the remaining cores (0 threads = those cores).
+# The thread count is process-wide in torch, so only the offline CLI sets it.
+INDEX_BATCH_SIZE = int(os.environ.get("KOLAM_INDEX_BATCH_SIZE", 32))
+INDEX_WORKERS = int(os.environ.get("KOLAM_INDEX_WORKERS", min(4, (os.cpu_count() or 1) - 1)))
+INDEX_THREADS = int(os.environ.get("KOLAM_INDEX_THREADS", 0))
+# Memory-map the saved index read-only, so workers share one copy through the
+# page cache; it is copied into memory the first time this process changes it.
+INDEX_MMAP = os.environ.get("KOLAM_INDEX_MMAP", "1") == "1"
+# How often (seconds) a serving process checks the manifest for a snapshot
+# saved by another process (a rebuild, a sync from another worker) and swaps
+# it in; 0 = never.
+INDEX_RELOAD_INTERVAL = float(os.environ.get("KOLAM_INDEX_RELOAD_INTERVAL", 2))
+# An edit whose save finds that another process published first is applied
+# again on top of that snapshot, up to this many times in all.
+PUBLISH_ATTEMPTS = int(os.environ.get("KOLAM_INDEX_PUBLISH_ATTEMPTS", 3))
+# Removed images left in an HNSW graph (orphans) are excluded from searches by
+# id; once they pass this fraction of the index it is rebuilt without them.
+ORPHAN_REBUILD_FRACTION = float(os.environ.get("KOLAM_INDEX_ORPHAN_REBUILD", 0.1))
+
+INDEX_RELOADS = registry.counter(
+    "kolam_index_reloads_total", "Newer index snapshots swapped in by this worker", ("result",))
 
-# Load CLIP model (cached on first use)
 device = "cuda" if torch.cuda.is_available() else "cpu"
-_model, _preprocess = clip.load("ViT-B/32", device=device)
 
-# Global FAISS index + metadata
+# Global FAISS index (see ann.make_index; images are added and removed by id) + metadata by id
 _index = None
-_image_paths: List[str] = []
+_index_kind = ann.INDEX_TYPE
+_index_mapped = False
+# id -> path, content hash, size, mtime_ns; sync only re-hashes files whose size or mtime changed
+_meta = IndexMetadata()
+# Representative id -> the other ids of its cluster (only the representative has a vector)
+_members: Dict[int, List[int]] = {}
+# Representative vectors by attribute value; a cluster is filed under its representative's attributes
+_partitions: Optional[Partitions] = None
+# Ids are never reused: HNSW cannot remove vectors, so removed images stay in
+# the graph as orphans that searches exclude until the index is rebuilt.
+_next_id = 0
+_orphans: Set[int] = set()
+_orphan_selector = None
+# Snapshot the live index came from, and whether it has changed since
+_version = 0
+_dirty = False
+_reload_checked = 0.0
+# FAISS indexes are not safe to search while they are being modified
+_index_lock = threading.RLock()
+_sync_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_embedding_cache: Optional[EmbeddingCache] = None
+_query_cache: Optional[QueryEmbeddingCache] = None
+
+
+def _get_embedding(image: Union[str, Image.Image]) -> np.ndarray:
+    """
+    Convert an image (path or decoded PIL image) to CLIP embedding.
+    Preprocessing runs in the caller's thread; the forward pass is shared
+    with other queries arriving at the same time (see batching.py).
+    """
+    _, preprocess = model_registry.get("clip")
+    if isinstance(image, str):
+        image = Image.open(image)
+    with stage_timer("clip_embed"):
+        return _query_batcher.submit(preprocess(image))[None, :]
+
+
+def _embed_batch(tensors: List[torch.Tensor]) -> np.ndarray:
+    model, _ = model_registry.get("clip")
+    return _encode(model, torch.stack(tensors))
+
+
+_query_batcher = MicroBatcher("clip", _embed_batch)
 
 
-def _get_embedding(image_path: str) -> np.ndarray:
-    """Convert image to CLIP embedding."""
-    image = _preprocess(Image.open(image_path)).unsqueeze(0).to(device)
-    with torch.no_grad():
-        embedding = _model.encode_image(image)
+def _encode(model, batch: torch.Tensor) -> np.ndarray:
+    with torch.inference_mode():
+        embedding = model.encode_image(batch.to(device))
     return embedding.cpu().numpy().astype("float32")
 
 
-def build_index(save: bool = True) -> None:
+class _ImageFiles(Dataset):
+    """Image files decoded and preprocessed for CLIP, inside DataLoader workers."""
+
+    def __init__(self, paths: List[str], preprocess):
+        self.paths = paths
+        self.preprocess = preprocess
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, i: int):
+        try:
+            with Image.open(self.paths[i]) as image:
+                return i, self.preprocess(image)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Skipping unreadable {self.paths[i]}: {e}")
+            return i, None
+
+
+def _collate(items):
+    """Stack a batch, dropping images that failed to decode."""
+    items = [(i, tensor) for i, tensor in items if tensor is not None]
+    if not items:
+        return [], None
+    return [i for i, _ in items], torch.stack([tensor for _, tensor in items])
+
+
+def embed_images(paths: List[str], batch_size: int = INDEX_BATCH_SIZE, workers: int = INDEX_WORKERS,
+                 threads: Optional[int] = None, progress: bool = True,
+                 cached: int = 0) -> Tuple[List[str], np.ndarray]:
+    """
+    CLIP embeddings of image files in batches. Returns the paths that could
+    be read and their embeddings, row for row. threads overrides torch's
+    process-wide thread count for the duration (0 = cores minus workers);
+    None, as in a serving worker, leaves it alone. `cached` images, already
+    embedded elsewhere, count as done in the progress bar.
+    """
+    model, preprocess = model_registry.get("clip")
+    workers = max(0, workers)
+    if threads is not None:
+        threads = threads or max(1, (os.cpu_count() or 1) - workers)
+    loader = DataLoader(_ImageFiles(paths, preprocess), batch_size=batch_size, num_workers=workers,
+                        collate_fn=_collate)
+
+    previous_threads = torch.get_num_threads()
+    if threads is not None:
+        torch.set_num_threads(threads)
+    kept, batches = [], []
+    started = time.perf_counter()
+    try:
+        with tqdm(total=len(paths) + cached, initial=cached, unit="img", desc="Embedding",
+                  disable=not progress) as bar:
+            for indices, batch in loader:
+                if batch is not None:
+                    batches.append(_encode(model, batch))
+                    kept.extend(paths[i] for i in indices)
+                bar.update(len(indices))
+    finally:
+        if threads is not None:
+            torch.set_num_threads(previous_threads)
+
+    elapsed = time.perf_counter() - started
+    if progress:
+        print(f"✅ Embedded {len(kept)} images in {elapsed:.1f}s ({len(kept) / max(elapsed, 1e-9):.1f} img/s, "
+              f"batch {batch_size}, {workers} workers, {threads or previous_threads} threads"
+              + (f", {cached} more from the embedding cache)" if cached else ")"))
+    dim = _output_dim(model)
+    return kept, np.vstack(batches) if batches else np.empty((0, dim), dtype="float32")
+
+
+def _data_files(data_dir: str = DATA_DIR) -> List[str]:
+    # Subfolders included: images filed by region (imgdata/TamilNadu/...) are labelled with it
+    return sorted(os.path.join(root, f) for root, _, files in os.walk(data_dir)
+                  for f in files if f.lower().endswith(IMAGE_SUFFIXES))
+
+
+def _encoder_key() -> str:
+    """The vector space of the loaded image encoder: fp32 CLIP, or one particular export of it."""
+    model, _ = model_registry.get("clip")
+    if isinstance(model, clip_export.ExportedVisual):
+        return clip_export.encoder_key(CLIP_MODEL, model.meta)
+    return f"{CLIP_MODEL}:fp32"
+
+
+def _embeddings() -> EmbeddingCache:
+    global _embedding_cache
+    key = _encoder_key()
+    if _embedding_cache is None or _embedding_cache.model != key:
+        _embedding_cache = EmbeddingCache(key)
+    return _embedding_cache
+
+
+def _query_embeddings() -> QueryEmbeddingCache:
+    global _query_cache
+    key = _encoder_key()
+    if _query_cache is None or _query_cache.model != key:
+        _query_cache = QueryEmbeddingCache(key)
+    return _query_cache
+
+
+def _file_stat(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _embed_files(paths: List[str], **embed_args) -> Tuple[List[Tuple[str, str]], np.ndarray]:
+    """
+    Embeddings of files, from the embedding cache where the content has been
+    seen before. Returns (path, hash) for each readable file and the matrix.
+    """
+    hashes = {path: content_hash(path) for path in paths}
+    vectors = _embeddings().get_many(hashes.values())
+    missing = [path for path in paths if hashes[path] not in vectors]
+    if missing:
+        kept, embedded = embed_images(missing, cached=len(paths) - len(missing), **embed_args)
+        fresh = {hashes[path]: vector for path, vector in zip(kept, embedded)}
+        _embeddings().set_many(fresh)
+        vectors.update(fresh)
+    rows = [(path, hashes[path]) for path in paths if hashes[path] in vectors]
+    if not rows:
+        return [], np.empty((0, 0), dtype="float32")
+    return rows, np.vstack([vectors[h] for _, h in rows]).astype("float32")
+
+
+def _writable() -> faiss.Index:
+    """The live index, copied out of the memory-mapped file first if it is still mapped."""
+    global _index, _index_mapped
+    if _index_mapped:
+        # Mapped vectors are read-only views: FAISS aborts the process on a write
+        _index = faiss.deserialize_index(faiss.serialize_index(_index))
+        ann.tune(_index)
+        _index_mapped = False
+    return _index
+
+
+def _set_orphans(ids: Iterable[int]) -> None:
+    global _orphans, _orphan_selector
+    _orphans, _orphan_selector = set(ids), None
+
+
+def _search(vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The live index's k nearest neighbours of prepared vectors, never orphans."""
+    global _orphan_selector
+    if not _orphans:
+        return _index.search(vectors, k)
+    if _orphan_selector is None:
+        _orphan_selector = faiss.IDSelectorNot(
+            faiss.IDSelectorBatch(np.fromiter(_orphans, dtype="int64", count=len(_orphans))))
+    return _index.search(vectors, k, params=ann.search_params(_index, _orphan_selector))
+
+
+def _partition(meta: IndexMetadata) -> Optional[Partitions]:
+    """Ids of the cluster representatives in `meta` by attribute value (the ids that have vectors)."""
+    if not INDEX_ATTRIBUTES:
+        return None
+    partitions = Partitions(INDEX_ATTRIBUTES)
+    # Orphans (removed, still in an HNSW graph) have no metadata, so are never filed
+    ids = [image_id for image_id, _ in meta.items() if meta.cluster(image_id) == image_id]
+    partitions.add(ids, [meta.attributes(image_id) for image_id in ids])
+    return partitions
+
+
+def _add_vectors(ids: np.ndarray, vectors: np.ndarray, values: List[Dict[str, object]]) -> None:
+    _index.add_with_ids(vectors, ids)
+    if _partitions is not None:
+        _partitions.add(ids, values)
+
+
+def _cluster(ids: List[int], vectors: np.ndarray, values: List[Dict[str, object]]) -> List[int]:
+    """
+    Add prepared vectors to the index, collapsing near-duplicates: each one
+    joins an indexed representative or an earlier vector of the batch within
+    DEDUP_THRESHOLD, or else is added as a representative itself (filed in
+    the partitions under its attributes, `values`). Returns the cluster
+    (representative id) of each.
+    """
+    ids = np.asarray(ids, dtype="int64")
+    if DEDUP_THRESHOLD > 1 or not ann.normalizes(_index_kind):
+        # Only normalized indexes return cosine similarities to compare with the threshold
+        _add_vectors(ids, vectors, values)
+        return ids.tolist()
+
+    clusters = ids.copy()
+    # Chunk by chunk, so the representatives of one chunk are searchable for the next
+    for start in range(0, len(ids), _DEDUP_CHUNK):
+        chunk_ids, chunk_vectors = ids[start:start + _DEDUP_CHUNK], vectors[start:start + _DEDUP_CHUNK]
+        chunk_clusters = clusters[start:start + _DEDUP_CHUNK]
+        if _index.ntotal:
+            similarities, found = _search(chunk_vectors, 1)
+            joins = (found[:, 0] >= 0) & (similarities[:, 0] >= DEDUP_THRESHOLD)
+            chunk_clusters[joins] = found[joins, 0]
+
+        pending = np.flatnonzero(chunk_clusters == chunk_ids)
+        if len(pending) > 1:
+            flat = faiss.IndexFlatIP(vectors.shape[1])
+            flat.add(chunk_vectors[pending])
+            limits, _, neighbours = flat.range_search(chunk_vectors[pending], DEDUP_THRESHOLD)
+            for a, row in enumerate(pending):
+                earlier = [pending[b] for b in neighbours[limits[a]:limits[a + 1]]
+                           if b < a and chunk_clusters[pending[b]] == chunk_ids[pending[b]]]
+                if earlier:
+                    chunk_clusters[row] = chunk_ids[min(earlier)]
+
+        representatives = chunk_clusters == chunk_ids
+        if representatives.any():
+            _add_vectors(chunk_ids[representatives], chunk_vectors[representatives],
+                         [values[start + row] for row in np.flatnonzero(representatives).tolist()])
+    return clusters.tolist()
+
+
+def _remove(remove_ids: List[int]) -> None:
+    """
+    Drop ids from the index and metadata. A cluster that loses its
+    representative is taken over by its first remaining member, indexed
+    with that member's cached embedding.
+    """
+    removing = {int(image_id) for image_id in remove_ids}
+    indexed, orphaned = [], []
+    for image_id in removing:
+        cluster = _meta.cluster(image_id)
+        if cluster == image_id:
+            indexed.append(image_id)
+            survivors = [m for m in _members.pop(image_id, []) if m not in removing]
+            if survivors:
+                orphaned.append(survivors)
+        elif cluster is not None and cluster in _members:
+            _members[cluster] = [m for m in _members[cluster] if m != image_id]
+            if not _members[cluster]:
+                del _members[cluster]
+
+    if indexed:
+        if ann.supports_remove(_index):
+            _index.remove_ids(np.asarray(indexed, dtype="int64"))
+        else:
+            _set_orphans(_orphans | set(indexed))
+        if _partitions is not None:
+            _partitions.remove(indexed)
+    for image_id in removing:
+        _meta.remove(image_id)
+
+    if not orphaned:
+        return
+    cached = _embeddings().get_many(h for h in (_meta.file(s[0])[0] for s in orphaned) if h)
+    for survivors in orphaned:
+        representative, hash_value = survivors[0], _meta.file(survivors[0])[0]
+        if hash_value not in cached:
+            # Nothing to index the cluster by: forget it, and the next sync embeds the files again
+            for member in survivors:
+                _meta.remove(member)
+            continue
+        _add_vectors(np.asarray([representative], dtype="int64"),
+                     ann.prepare(cached[hash_value][None, :], _index_kind), [_meta.attributes(representative)])
+        for member in survivors:
+            _meta.set(member, *_meta.get(member)[:4], cluster=representative, attributes=_meta.attributes(member))
+        if len(survivors) > 1:
+            _members[representative] = survivors[1:]
+
+
+def _describe(rows: List[Tuple[str, str]]) -> List[Dict[str, object]]:
+    """INDEX_ATTRIBUTES of embedded rows; run before taking the index lock, it reads every image."""
+    return attributes.describe([path for path, _ in rows], INDEX_ATTRIBUTES) if rows else []
+
+
+def _apply(rows: List[Tuple[str, str]], embeddings: np.ndarray, remove_ids: List[int] = (),
+           values: Optional[List[Dict[str, object]]] = None) -> List[int]:
+    """
+    Remove ids and add embedded rows, with their attributes (see _describe),
+    to the live index; returns the new ids.
+    """
+    global _index, _index_kind, _next_id, _dirty, _partitions
+    values = values or [{} for _ in rows]
+    with _index_lock:
+        if _index is None:
+            if not rows:
+                return []
+            _index, _index_kind = ann.make_index(ann.INDEX_TYPE, embeddings.shape[1],
+                                                 ann.prepare(embeddings, ann.INDEX_TYPE))
+            _partitions = _partition(_meta)
+        if len(remove_ids) or rows:
+            _writable()
+            _dirty = True
+        if len(remove_ids):
+            _remove(remove_ids)
+            if len(_orphans) > ORPHAN_REBUILD_FRACTION * _index.ntotal:
+                _rebuild(_index_kind)
+        if not rows:
+            return []
+        ids = list(range(_next_id, _next_id + len(rows)))
+        _next_id += len(rows)
+        clusters = _cluster(ids, ann.prepare(embeddings, _index_kind), values)
+        for image_id, (path, hash_value), cluster, attribute_values in zip(ids, rows, clusters, values):
+            _meta.set(image_id, path, hash_value, *_file_stat(path), cluster=cluster, attributes=attribute_values)
+            if cluster != image_id:
+                _members.setdefault(cluster, []).append(image_id)
+        return ids
+
+
+def build_index(save: bool = True, batch_size: int = INDEX_BATCH_SIZE, workers: int = INDEX_WORKERS,
+                threads: Optional[int] = None) -> None:
     """Build FAISS index from all images in data folder."""
-    global _index, _image_paths
-    _image_paths = [
-        os.path.join(DATA_DIR, f)
-        for f in os.listdir(DATA_DIR)
-        if f.lower().endswith((".jpg", ".jpeg", ".png"))
-    ]
-
-    if not _image_paths:
+    paths = _data_files()
+    if not paths:
         raise RuntimeError(f"No images found in {DATA_DIR}/ folder.")
 
-    embeddings = [_get_embedding(p) for p in _image_paths]
-    embeddings = np.vstack(embeddings)
+    rows, embeddings = _embed_files(paths, batch_size=batch_size, workers=workers, threads=threads)
+    if not rows:
+        raise RuntimeError(f"No readable images in {DATA_DIR}/ folder.")
+    values = _describe(rows)
+
+    def edit():
+        global _index, _next_id, _index_mapped, _version
+        with _index_lock:
+            # Everything is replaced, so there is nothing to load: the build
+            # just publishes on top of whatever snapshot is current
+            current = snapshots.read_manifest(INDEX_FILE)
+            _version = current.version if current else 0
+            _index, _index_mapped = None, False
+            _meta.clear()
+            _members.clear()
+            _next_id = 0
+            _set_orphans(())
+            _apply(rows, embeddings, values=values)
+        if save:
+            save_index()
+
+    _publishing(edit)
+
+
+def _publishing(edit):
+    """
+    Run edit(), which changes the live index and saves it. If another
+    process published a snapshot since the one the edit started from, that
+    snapshot is swapped in (dropping this process's unsaved changes) and the
+    edit runs again on top of it. Embeddings come from the cache the second
+    time, so a retry costs little besides the index work.
+    """
+    for attempt in range(1, PUBLISH_ATTEMPTS + 1):
+        try:
+            return edit()
+        except snapshots.StaleSnapshot as e:
+            if attempt == PUBLISH_ATTEMPTS:
+                raise
+            print(f"⚠️ {e}; applying the change again on top of it")
+            reload_index(discard=True)
+
+
+def _rebuild(kind: str) -> None:
+    """
+    Re-create the live index as `kind` from the vectors it holds (raw ones
+    from the embedding cache where the file hash is known), dropping orphans.
+    Searches wait for it; it runs on a type change, a fallback upgrade, or
+    once orphans pass ORPHAN_REBUILD_FRACTION.
+    """
+    global _index, _index_kind, _index_mapped, _partitions
+    with _index_lock:
+        ids, stored = ann.stored_vectors(_index)
+        keep = np.isin(ids, _meta.ids())
+        ids, stored = ids[keep], stored[keep]
+        hashes = [_meta.file(image_id)[0] for image_id in ids.tolist()]
+        try:
+            cached = _embeddings().get_many(h for h in hashes if h)
+        except Exception as e:
+            # No encoder to say which cached vectors match: the stored ones will do
+            print(f"⚠️ Rebuilding from the stored vectors only: {e}")
+            cached = {}
+        vectors = np.array([cached[h] if h in cached else stored[row] for row, h in enumerate(hashes)],
+                           dtype="float32").reshape(len(ids), -1)
+
+        _index, _index_kind = ann.make_index(kind, _index.d, ann.prepare(vectors, kind))
+        _index_mapped = False
+        if len(ids):
+            _index.add_with_ids(ann.prepare(vectors, _index_kind), ids)
+        _set_orphans(())
+        _partitions = _partition(_meta)
+    print(f"✅ Rebuilt the similarity index as {_index_kind} ({len(ids)} vectors)")
+
+
+def add_images(paths: List[str], save: bool = True) -> Dict[str, int]:
+    """
+    Index image files (re-indexing any already present under the same path).
+    Returns path -> id for the files that could be read.
+    """
+    rows, embeddings = _embed_files(paths, workers=0, progress=False)
+    values = _describe(rows)
+    readable = {path for path, _ in rows}
 
-    d = embeddings.shape[1]
-    _index = faiss.IndexFlatL2(d)
-    _index.add(embeddings)
+    def edit():
+        reload_index()
+        with _index_lock:
+            replaced = [image_id for image_id, path in _meta.items() if path in readable]
+            ids = _apply(rows, embeddings, replaced, values)
+        if save:
+            save_index()
+        return {path: image_id for image_id, (path, _) in zip(ids, rows)}
 
-    if save:
+    return _publishing(edit)
+
+
+def remove_images(paths: List[str], save: bool = True) -> int:
+    """Drop images from the index by path; returns how many were removed."""
+    paths = set(paths)
+
+    def edit():
+        reload_index()
+        with _index_lock:
+            ids = [image_id for image_id, path in _meta.items() if path in paths]
+            if ids:
+                _apply([], None, ids)
+        if ids and save:
+            save_index()
+        return len(ids)
+
+    return _publishing(edit)
+
+
+def _set_attributes(images: List[Tuple[str, int]]) -> None:
+    """Record attributes of indexed (path, id) images, re-filing the representatives among them."""
+    global _dirty
+    found = attributes.describe([path for path, _ in images], INDEX_ATTRIBUTES)
+    with _index_lock:
+        representatives = []
+        for (_, image_id), values in zip(images, found):
+            entry = _meta.get(image_id)
+            if entry is None:
+                continue
+            _meta.set(image_id, *entry[:5], attributes={**entry[5], **values})
+            if entry[4] == image_id:
+                representatives.append(image_id)
+        _dirty = True
+        if _partitions is not None and representatives:
+            _partitions.remove(representatives)
+            _partitions.add(representatives, [_meta.attributes(i) for i in representatives])
+
+
+def sync_index(data_dir: str = DATA_DIR, save: bool = True, chunk_size: int = INDEX_BATCH_SIZE * 8,
+               **embed_args) -> dict:
+    """
+    Bring the index in line with data_dir by diffing: new files are embedded
+    (or taken from the embedding cache) and added, deleted files removed,
+    changed files replaced. Additions land chunk by chunk, so a large sync is
+    searchable while it runs. Images indexed without some of INDEX_ATTRIBUTES
+    (before they were recorded, or listed) get them without re-embedding.
+    """
+    started = time.perf_counter()
+    with _sync_lock:
+        stats = _publishing(lambda: _sync_once(data_dir, save, chunk_size, embed_args))
+    return {**stats, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def _sync_once(data_dir: str, save: bool, chunk_size: int, embed_args: dict) -> dict:
+    """One pass of sync_index, from the newest saved snapshot; the caller holds _sync_lock."""
+    global _dirty
+    # Start from the newest saved snapshot, which another process may have written
+    reload_index()
+    with _index_lock:
+        indexed = {path: image_id for image_id, path in _meta.items()}
+    on_disk = _data_files(data_dir) if os.path.isdir(data_dir) else []
+
+    present = set(on_disk)
+    stale = [image_id for path, image_id in indexed.items() if path not in present]
+    changed, unchanged, undescribed = [], 0, []
+    for path in on_disk:
+        image_id = indexed.get(path)
+        if image_id is None:
+            changed.append(path)
+            continue
+        hash_value, *stat = _meta.file(image_id) or (None, -1, -1)
+        if tuple(stat) != _file_stat(path):
+            if hash_value is None or hash_value != content_hash(path):
+                changed.append(path)
+                continue
+            # Touched but identical (e.g. copied back): just remember the new stat
+            with _index_lock:
+                _meta.set(image_id, path, hash_value, *_file_stat(path), cluster=_meta.cluster(image_id),
+                          attributes=_meta.attributes(image_id))
+                _dirty = True
+        unchanged += 1
+        if not set(INDEX_ATTRIBUTES) <= set(_meta.attributes(image_id)):
+            undescribed.append((path, image_id))
+
+    _apply([], None, stale)
+    added = 0
+    for start in range(0, len(changed), chunk_size):
+        chunk = changed[start:start + chunk_size]
+        rows, embeddings = _embed_files(chunk, **embed_args)
+        replaced = [indexed[path] for path, _ in rows if path in indexed]
+        added += len(_apply(rows, embeddings, replaced, _describe(rows)))
+    for start in range(0, len(undescribed), chunk_size):
+        _set_attributes(undescribed[start:start + chunk_size])
+
+    # An index that started as the flat fallback (too little data to train) is
+    # retrained once there is enough
+    upgrade = (_index is not None and _index_kind != ann.INDEX_TYPE
+               and ann.trainable(ann.INDEX_TYPE, len(_meta)))
+    if upgrade:
+        _rebuild(ann.INDEX_TYPE)
+    if save and (_dirty or upgrade):
         save_index()
+    return {
+        "added": added,
+        "removed": len(stale),
+        "unchanged": unchanged,
+        "described": len(undescribed),
+        "unreadable": len(changed) - added,
+        "size": len(_meta),
+    }
+
+
+def _write_snapshot(index_path: str, meta_path: str) -> None:
+    tmp = f"{index_path}.tmp{os.getpid()}"
+    faiss.write_index(_index, tmp)
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, index_path)
+    _meta.save(meta_path)
 
 
 def save_index() -> None:
-    """Persist FAISS index and metadata to disk."""
+    """
+    Persist FAISS index and metadata to disk as a new snapshot: both files
+    are written under new names and the manifest is switched to them last
+    (see snapshots.publish), so neither a crash nor a process loading at the
+    same moment can pair the index with the wrong metadata. Processes that
+    have the old snapshot memory-mapped keep reading it intact until they
+    swap in the new one (see reload_index).
+
+    Raises snapshots.StaleSnapshot, writing nothing, if another process
+    published since the snapshot the live index came from; the index
+    editing functions then apply their change again on top of it.
+    """
+    global _meta, _version, _dirty
     if _index is None:
         raise RuntimeError("No index to save. Build it first.")
 
-    faiss.write_index(_index, INDEX_FILE)
-    with open(META_FILE, "wb") as f:
-        pickle.dump(_image_paths, f)
+    with _index_lock:
+        _meta.header = {"index_type": _index_kind, "next_id": _next_id, "orphans": len(_orphans)}
+        snapshot = snapshots.publish(INDEX_FILE, META_FILE, _write_snapshot,
+                                     {"index_type": _index_kind, "size": len(_meta), "vectors": _index.ntotal},
+                                     expected_version=_version)
+        # Serve lookups from the file just written and drop the in-memory overlay
+        _meta = IndexMetadata.load(snapshot.meta_file)
+        _version, _dirty = snapshot.version, False
+
+
+def _load_legacy() -> Tuple[faiss.Index, IndexMetadata]:
+    """Index and metadata saved with pickled paths by earlier versions."""
+    index = faiss.read_index(INDEX_FILE)
+    with open(LEGACY_META_FILE, "rb") as f:
+        legacy = pickle.load(f)
+
+    if isinstance(legacy, list):
+        # Written before ids: an IndexFlatL2 whose row i is legacy[i]. Re-wrap with ids = rows;
+        # the next sync hashes the files again.
+        vectors = index.reconstruct_n(0, index.ntotal)
+        index, _ = ann.make_index("flat-l2", index.d)
+        index.add_with_ids(vectors, np.arange(len(legacy), dtype="int64"))
+        legacy = {"paths": dict(enumerate(legacy)), "files": {}, "index_type": "flat-l2"}
+
+    meta = IndexMetadata({
+        "index_type": legacy["index_type"],
+        "next_id": legacy.get("next_id", max(legacy["paths"], default=-1) + 1),
+        "orphans": legacy.get("orphans", 0),
+    })
+    for image_id, path in legacy["paths"].items():
+        meta.set(image_id, path, *legacy["files"].get(image_id, (None, -1, -1)))
+    return index, meta
+
+
+def _read_snapshot(snapshot: snapshots.Snapshot) -> Tuple[faiss.Index, IndexMetadata, bool]:
+    """The snapshot's index and metadata, and whether the index is memory-mapped."""
+    if not INDEX_MMAP:
+        return faiss.read_index(snapshot.index_file), IndexMetadata.load(snapshot.meta_file), False
+    # IO_FLAG_MMAP_IFC maps the vectors in place; older FAISS only maps IVF inverted lists
+    # and reads any other index into memory
+    in_place = hasattr(faiss, "IO_FLAG_MMAP_IFC")
+    index = faiss.read_index(snapshot.index_file, faiss.IO_FLAG_MMAP_IFC if in_place else faiss.IO_FLAG_MMAP)
+    mapped = in_place or faiss.try_extract_index_ivf(index) is not None
+    return index, IndexMetadata.load(snapshot.meta_file), mapped
+
+
+def _install(index: faiss.Index, meta: IndexMetadata, mapped: bool, version: int, reload: bool = False) -> bool:
+    """
+    Make a loaded index the live one. Its clusters and partitions are
+    gathered first, so searches wait only for the swap, not the load. A
+    reload is dropped (returns False) if the live index changed meanwhile.
+    """
+    global _index, _index_kind, _index_mapped, _meta, _members, _partitions, _next_id, _version, _dirty
+    ann.tune(index)
+    members, partitions = meta.clusters(), _partition(meta)
+    # Orphans are the ids the index holds that are no cluster's representative
+    orphans = set()
+    if meta.header["orphans"] and isinstance(index, faiss.IndexIDMap):
+        orphans = set(faiss.vector_to_array(index.id_map).tolist()) - {
+            image_id for image_id, _ in meta.items() if meta.cluster(image_id) == image_id}
+    with _index_lock:
+        if reload and (_dirty or version <= _version):
+            return False
+        _index, _index_kind, _index_mapped, _meta = index, meta.header["index_type"], mapped, meta
+        _next_id = meta.header["next_id"]
+        _set_orphans(orphans)
+        _members, _partitions, _version, _dirty = members, partitions, version, False
+    return True
+
+
+def _convert_type() -> None:
+    if _index_kind != ann.INDEX_TYPE and ann.trainable(ann.INDEX_TYPE, len(_meta)):
+        print(f"⚠️ Saved index is {_index_kind}, KOLAM_INDEX_TYPE is {ann.INDEX_TYPE}: converting")
+        _rebuild(ann.INDEX_TYPE)
 
 
 def load_index() -> None:
     """Load FAISS index and metadata from disk if available."""
-    global _index, _image_paths
-    if not (os.path.exists(INDEX_FILE) and os.path.exists(META_FILE)):
+    snapshot = snapshots.current(INDEX_FILE, META_FILE)
+    legacy = snapshot is None and os.path.exists(INDEX_FILE) and os.path.exists(LEGACY_META_FILE)
+    if snapshot is None and not legacy:
         raise RuntimeError("No saved index found. Build it first.")
 
-    _index = faiss.read_index(INDEX_FILE)
-    with open(META_FILE, "rb") as f:
-        _image_paths = pickle.load(f)
+    if legacy:
+        (index, meta), mapped, version = _load_legacy(), False, 0
+    else:
+        (index, meta, mapped), version = _read_snapshot(snapshot), snapshot.version
+    _install(index, meta, mapped, version)
+
+    _convert_type()
+    if legacy:
+        save_index()
+        print(f"✅ Converted {LEGACY_META_FILE} to {META_FILE}; the pickle is no longer read")
+
+
+def reload_index(discard: bool = False) -> bool:
+    """
+    Swap in the snapshot named by the manifest if it is newer than the live
+    index's (saved by a rebuild or by another worker). It is loaded while
+    searches carry on against the old index. Unsaved changes made in this
+    process are not thrown away unless `discard`: otherwise the newer
+    snapshot is skipped until they are saved. Returns whether a snapshot was
+    swapped in.
+    """
+    with _reload_lock:
+        snapshot = snapshots.read_manifest(INDEX_FILE)
+        if snapshot is None or snapshot.version <= _version or (_dirty and not discard):
+            return False
+        try:
+            index, meta, mapped = _read_snapshot(snapshot)
+        except (OSError, RuntimeError, ValueError) as e:
+            # Pruned by a newer save between reading the manifest and opening the files
+            INDEX_RELOADS.inc(result="failed")
+            print(f"⚠️ Could not load index snapshot {snapshot.version}: {e}")
+            return False
+        if not _install(index, meta, mapped, snapshot.version, reload=not discard):
+            return False
+        INDEX_RELOADS.inc(result="swapped")
+        print(f"✅ Swapped in index snapshot {snapshot.version} ({len(meta)} images, {_index_kind})")
+        _convert_type()
+    return True
+
+
+def _check_snapshot() -> None:
+    """
+    Every INDEX_RELOAD_INTERVAL seconds, look at the manifest and start a
+    reload in the background if there is a newer snapshot; the search that
+    notices does not wait for it.
+    """
+    global _reload_checked
+    if INDEX_RELOAD_INTERVAL <= 0 or _dirty or _reload_lock.locked() or _sync_lock.locked():
+        return
+    now = time.monotonic()
+    if now - _reload_checked < INDEX_RELOAD_INTERVAL:
+        return
+    _reload_checked = now
+    snapshot = snapshots.read_manifest(INDEX_FILE)
+    if snapshot is not None and snapshot.version > _version:
+        threading.Thread(target=reload_index, name="kolam-index-reload", daemon=True).start()
+
+
+def index_status() -> dict:
+    with _index_lock:
+        return {
+            "size": len(_meta),
+            "clusters": _index.ntotal - len(_orphans) if _index is not None else 0,
+            "duplicates": sum(len(members) for members in _members.values()),
+            "type": _index_kind,
+            "version": _version,
+            "unsaved": _dirty,
+            "mapped": _index_mapped,
+            "dim": _index.d if _index is not None else None,
+            "orphans": len(_orphans),
+            "syncing": _sync_lock.locked(),
+            # Counted only once the encoder is loaded; status never loads it
+            "cached_embeddings": len(_embedding_cache) if _embedding_cache is not None else None,
+            "cached_query_embeddings": len(_query_cache) if _query_cache is not None else None,
+            "partitions": _partitions.sizes() if _partitions is not None else {},
+        }
+
+
+def cached_embeddings(digests: List[str]) -> Dict[str, np.ndarray]:
+    """Embeddings already known for content hashes (indexed images and earlier queries)."""
+    found = _embeddings().get_many(digests)
+    missing = [digest for digest in digests if digest not in found]
+    if missing:
+        found.update(_query_embeddings().get_many(missing))
+    return found
+
 
+def embed_queries(images: Dict[str, Image.Image]) -> Dict[str, np.ndarray]:
+    """CLIP embeddings of query images by content hash, in batched passes; the results are cached."""
+    if not images:
+        return {}
+    model, preprocess = model_registry.get("clip")
+    digests = list(images)
+    with stage_timer("clip_embed_batch"):
+        tensors = [preprocess(images[digest]) for digest in digests]
+        matrix = np.vstack([_encode(model, torch.stack(tensors[start:start + INDEX_BATCH_SIZE]))
+                            for start in range(0, len(tensors), INDEX_BATCH_SIZE)])
+    vectors = dict(zip(digests, matrix))
+    _query_embeddings().set_many(vectors)
+    return vectors
 
-def find_similar(image_path: str, top_k: int = 5) -> List[Tuple[str, float]]:
+
+def distance_metric() -> str:
+    """What search distances mean: cosine similarity (higher is closer) or L2 (lower is closer)."""
+    return "cosine" if ann.normalizes(_index_kind) else "l2"
+
+
+def search_vectors(queries: np.ndarray, top_k: int = 5, expand: bool = False,
+                   filters: Optional[Dict[str, set]] = None) -> List[List[Tuple[str, float]]]:
+    """
+    top_k (path, distance) for each row of queries, in a single index search.
+    Near-duplicates are collapsed into one result; with expand, the other
+    images of each cluster follow it, with the same distance. filters
+    (attribute -> accepted values, see attributes.parse_filters) limit the
+    search to the matching partitions; raises ValueError for an attribute
+    that is not recorded (INDEX_ATTRIBUTES).
+    """
+    model_registry.get("faiss_index")
+    _check_snapshot()
+    filters = {name: values for name, values in (filters or {}).items() if values}
+    unknown = sorted(set(filters) - set(INDEX_ATTRIBUTES))
+    if unknown:
+        raise ValueError(f"Cannot filter on {', '.join(unknown)}: not recorded (KOLAM_INDEX_ATTRIBUTES)")
+    if not len(queries):
+        return []
+    with stage_timer("faiss_search_filtered" if filters else "faiss_search"), _index_lock:
+        if filters:
+            distances, indices = _partitions.search(_index, ann.prepare(queries, _index_kind), top_k, filters)
+        else:
+            distances, indices = _search(ann.prepare(queries, _index_kind), top_k)
+
+        results = []
+        for row_ids, row_distances in zip(indices, distances):
+            matches = []
+            for idx, dist in zip(row_ids, row_distances):
+                # -1: fewer than top_k images indexed
+                path = _meta.path(idx)
+                if path is None:
+                    continue
+                matches.append([(path, float(dist))])
+                if expand:
+                    matches[-1].extend((_meta.path(member), float(dist)) for member in _members.get(int(idx), ()))
+                if len(matches) == top_k:
+                    break
+            results.append([match for cluster in matches for match in cluster])
+    return results
+
+
+def find_similar(image: Union[str, Image.Image], top_k: int = 5, digest: Optional[str] = None,
+                 expand: bool = False, filters: Optional[Dict[str, set]] = None) -> List[Tuple[str, float]]:
     """
     Find top_k similar images from the dataset.
-    Returns list of (image_path, distance).
+    Returns list of (image_path, distance). Given the upload's content hash,
+    a query seen before skips CLIP (see cached_embeddings); expand lists
+    near-duplicates of each match too, and filters narrow the search to
+    images with those attributes (see search_vectors).
+    """
+    model_registry.get("faiss_index")
+    query_vec = cached_embeddings([digest]).get(digest) if digest else None
+    if query_vec is None:
+        query_vec = _get_embedding(image)
+        if digest:
+            _query_embeddings().set_many({digest: query_vec[0]})
+    return search_vectors(query_vec.reshape(1, -1), top_k, expand, filters)[0]
+
+
+def _output_dim(model) -> int:
+    return model.output_dim if isinstance(model, clip_export.ExportedVisual) else model.visual.output_dim
+
+
+def _load_clip():
+    exported = clip_export.load(CLIP_VISUAL_FILE, device) if CLIP_VISUAL_FILE else None
+    if exported is not None:
+        print(f"✅ Using the {exported.meta['mode']} CLIP image encoder exported to {CLIP_VISUAL_FILE}")
+        return exported, _transform(exported.input_resolution)
+    return _load_clip_fp32()
+
+
+def _load_clip_fp32():
+    if not (MMAP_WEIGHTS and device == "cpu"):
+        return clip.load(CLIP_MODEL, device=device)
+
+    if not os.path.exists(CLIP_WEIGHTS_FILE):
+        model, _ = clip.load(CLIP_MODEL, device=device)
+        save_state_dict(model.state_dict(), CLIP_WEIGHTS_FILE)
+        del model
+    model = load_module(lambda state: build_model(dict(state)), CLIP_WEIGHTS_FILE, device)
+    # The text tower's causal masks are plain tensors made in __init__, so they were built on meta
+    for block in model.transformer.resblocks:
+        block.attn_mask = model.build_attention_mask()
+    return model, _transform(model.visual.input_resolution)
+
+
+def _load_faiss_index():
+    """
+    The saved index. If there is none yet, start from an empty one and fill
+    it from DATA_DIR in the background instead of stalling the first search.
     """
-    global _index
+    global _index, _index_kind, _partitions
     if _index is None:
         try:
             load_index()
         except RuntimeError:
-            build_index()
+            model, _ = model_registry.get("clip")
+            with _index_lock:
+                _index, _index_kind = ann.make_index("flat-ip" if ann.normalizes(ann.INDEX_TYPE) else "flat-l2",
+                                                     _output_dim(model))
+                _partitions = _partition(_meta)
+            # No loader processes: forking a serving worker with live threads is not safe
+            threading.Thread(target=sync_index, kwargs={"workers": 0, "progress": False},
+                             name="kolam-index-sync", daemon=True).start()
+    return _index
 
-    query_vec = _get_embedding(image_path)
-    distances, indices = _index.search(query_vec, top_k)
 
-    results = []
-    for idx, dist in zip(indices[0], distances[0]):
-        results.append((_image_paths[idx], float(dist)))
+model_registry.register("clip", _load_clip)
+model_registry.register("faiss_index", _load_faiss_index)
 
-    return results
+
+def export_encoder(mode: str = "auto", output: str = CLIP_VISUAL_FILE, samples: int = 64, k: int = 10,
+                   force: bool = False) -> dict:
+    """
+    Export CLIP's image tower for serving (see clip_export.py) and check it
+    against the fp32 model on up to `samples` images from DATA_DIR: cosine
+    similarity of the embeddings and overlap of their top-k neighbours in
+    the saved index. Nothing is written if the check fails, unless force.
+    """
+    mode = clip_export.resolve_mode(mode)
+    model, preprocess = _load_clip_fp32()
+    images = _ImageFiles(_data_files()[:samples], preprocess)
+    tensors = [tensor for _, tensor in (images[i] for i in range(len(images))) if tensor is not None]
+    if not tensors:
+        raise RuntimeError(f"No readable images in {DATA_DIR}/ to check the export against.")
+    batch = torch.stack(tensors)
+
+    reference = _encode(model, batch)
+    fp32_seconds = clip_export.time_batches(model.encode_image, batch[:8])
+    module, meta = clip_export.export_visual(model, mode, batch)
+    meta.update({"model": CLIP_MODEL, "created": time.time()})
+    del model
+    exported = clip_export.ExportedVisual(module, meta)
+
+    try:
+        load_index()
+        index = _index if ann.normalizes(_index_kind) else None
+    except RuntimeError:
+        index = None
+    check = clip_export.compare(reference, _encode(exported, batch), index, k)
+    check.update({
+        "images": len(batch),
+        "fp32_ms_per_image": round(fp32_seconds / len(batch[:8]) * 1000, 1),
+        "ms_per_image": round(clip_export.time_batches(exported.encode_image, batch[:8]) / len(batch[:8]) * 1000, 1),
+        "passed": clip_export.passed(check),
+    })
+    meta["check"] = check
+    if check["passed"] or force:
+        clip_export.save(module, output, meta)
+    return meta
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    embedding = argparse.ArgumentParser(add_help=False)
+    embedding.add_argument("--batch-size", type=int, default=INDEX_BATCH_SIZE)
+    embedding.add_argument("--workers", type=int, default=INDEX_WORKERS, help="DataLoader decode/preprocess processes")
+    embedding.add_argument("--threads", type=int, default=INDEX_THREADS, help="torch threads (0 = cores minus workers)")
+
+    parser = argparse.ArgumentParser(description="Build or update the CLIP similarity index over imgdata/.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", parents=[embedding], help="embed every image in the data folder and write the index")
+    sync = commands.add_parser("sync", parents=[embedding],
+                               help="add new, drop deleted and replace changed images in the saved index")
+    sync.add_argument("--data-dir", default=DATA_DIR)
+    export = commands.add_parser("export", help="export a quantized / bf16 CLIP image encoder for serving")
+    export.add_argument("--mode", choices=clip_export.MODES, default="auto")
+    export.add_argument("--output", default=CLIP_VISUAL_FILE)
+    export.add_argument("--samples", type=int, default=64, help="images from the data folder to check against fp32")
+    export.add_argument("--force", action="store_true", help="write the encoder even if the check fails")
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        meta = export_encoder(args.mode, args.output, args.samples, force=args.force)
+        check = meta["check"]
+        print(f"{meta['mode']}: cosine min {check['cosine_min']:.4f} / mean {check['cosine_mean']:.4f}, "
+              f"top-{check['k']} overlap {check['top_k_overlap']:.3f} on {check['images']} images; "
+              f"{check['ms_per_image']} ms/image vs {check['fp32_ms_per_image']} fp32")
+        if not check["passed"] and not args.force:
+            raise SystemExit(f"❌ Below cosine {clip_export.MIN_COSINE} / overlap {clip_export.MIN_TOPK_OVERLAP}, "
+                             f"not written (--force to write anyway)")
+        print(f"✅ Exported -> {args.output}")
+        return
+
+    embed_args = {"batch_size": args.batch_size, "workers": args.workers, "threads": args.threads}
+
+    if args.command == "build":
+        build_index(**embed_args)
+        print(f"✅ Indexed {len(_meta)} images -> snapshot {_version} ({snapshots.manifest_path(INDEX_FILE)})")
+    elif args.command == "sync":
+        try:
+            load_index()
+        except RuntimeError:
+            pass
+        stats = sync_index(args.data_dir, **embed_args)
+        print(f"✅ Synced {args.data_dir}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# FILE: server/src/api/weights.py
+import os
+import warnings
+from typing import Callable
+
+import torch
+
+# Memory-map CPU weights so every worker on a host shares one copy through the
+# page cache instead of holding its own (set KOLAM_MMAP_WEIGHTS=0 to disable).
+MMAP_WEIGHTS = os.environ.get("KOLAM_MMAP_WEIGHTS", "1") != "0"
+
+
+def load_module(build: Callable[[dict], torch.nn.Module], path: str, device: str) -> torch.nn.Module:
+    """
+    Build a module with build(state_dict) and load its weights from `path`.
+
+    With mmap the module is built on the meta device (no allocation) and
+    its parameters are assigned the mapped tensors, so the weights are never
+    copied into private memory. Inference only reads them, so the pages stay
+    shared between processes.
+    """
+    use_mmap = MMAP_WEIGHTS and str(device) == "cpu"
+    state = torch.load(path, map_location=device, mmap=use_mmap, weights_only=True)
+    if not use_mmap:
+        module = build(state)
+        module.load_state_dict(state)
+        return module.to(device).eval()
+
+    with torch.device("meta"), warnings.catch_warnings():
+        # Builders that load weights themselves (CLIP's build_model) warn that copying into meta is a no-op
+        warnings.simplefilter("ignore", UserWarning)
+        module = build(state)
+    module.load_state_dict(state, assign=True)
+    return module.eval()
+
+
+def save_state_dict(state: dict, path: str) -> None:
+    """Write a state dict atomically, so a concurrent loader never maps a partial file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    torch.save(state, tmp)
+    os.replace(tmp, path)
@@ -3,6 +3,7 @@ import torch.nn as nn
 import torch.optim as optim
 from model import SimpleCNN
 from utils import dataloader, dataset
+import json
 import os
 
 BASE_DIR = os.path.dirname(__file__)
@@ -27,4 +28,10 @@ for epoch in range(10):
 os.makedirs(SAVE_DIR, exist_ok=True)
 save_path = os.path.join(SAVE_DIR, "simplecnn.pth")
 torch.save(model.state_dict(), save_path)
-print(f"Model saved at {save_path}")
\ No newline at end of file
+print(f"Model saved at {save_path}")
+
+# Class names for serving, so inference does not have to scan the training set
+classes_path = os.path.join(SAVE_DIR, "simplecnn.classes.json")
+with open(classes_path, "w") as f:
+    json.dump({"classes": dataset.classes}, f)
+print(f"Class names saved at {classes_path}")
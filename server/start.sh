@@ -1,2 +1,3 @@
 python -m uvicorn src.api.main:app --port 8000 --reload
-# if no uvicorn found inside the virtual environment, run: pip install "uvicorn[standard]"
\ No newline at end of file
+# if no uvicorn found inside the virtual environment, run: pip install "uvicorn[standard]"
+# several workers sharing one copy of the models: gunicorn -c gunicorn.conf.py src.api.main:app
\ No newline at end of file
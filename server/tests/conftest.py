@@ -0,0 +1,19 @@
+# Run from server/:  python -m pytest tests
+import os
+import sys
+import tempfile
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+# Module-level settings are read at import: point every on-disk store at a
+# throwaway directory before any src.api module is imported
+_STATE_DIR = tempfile.mkdtemp(prefix="kolam-tests-")
+for name, value in {
+    "KOLAM_CACHE_DB": os.path.join(_STATE_DIR, "cache.sqlite"),
+    "KOLAM_JOBS_DB": os.path.join(_STATE_DIR, "jobs.sqlite"),
+    "KOLAM_METRICS_DIR": os.path.join(_STATE_DIR, "metrics"),
+    "KOLAM_PROFILE_DIR": os.path.join(_STATE_DIR, "profiles"),
+    "KOLAM_WARMUP_MODELS": "none",
+}.items():
+    os.environ.setdefault(name, value)
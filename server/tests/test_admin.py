@@ -0,0 +1,60 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from src.api import admin, vector
+
+
+def _png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector, "DATA_DIR", str(tmp_path / "imgdata"))
+    os.makedirs(tmp_path / "imgdata" / "TamilNadu")
+    monkeypatch.setattr(admin.model_registry, "get", lambda name: None)
+    return tmp_path / "imgdata"
+
+
+def _add(data):
+    return asyncio.run(admin.add_index_image(UploadFile(io.BytesIO(data), filename="up.png")))
+
+
+def test_failed_add_keeps_a_file_it_did_not_create(data_dir, monkeypatch):
+    monkeypatch.setattr(vector, "add_images", lambda paths: {})
+    data = _png()
+    stored = data_dir / f"{hashlib.sha256(data).hexdigest()[:16]}.png"
+    stored.write_bytes(data)
+    with pytest.raises(HTTPException) as error:
+        _add(data)
+    assert error.value.status_code == 400 and stored.exists()
+
+    stored.unlink()
+    with pytest.raises(HTTPException):
+        _add(data)
+    assert not stored.exists()
+
+
+def test_delete_file_reaches_region_folders_only_inside_the_data_folder(data_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(vector, "remove_images", lambda paths: 1)
+    nested = data_dir / "TamilNadu" / "1.png"
+    nested.write_bytes(b"x")
+    assert admin.remove_index_image(str(nested), delete_file=True) == {"removed": 1, "deleted": True}
+    assert not nested.exists()
+
+    outside = tmp_path / "elsewhere.png"
+    outside.write_bytes(b"x")
+    for path in (outside, data_dir / ".." / "elsewhere.png"):
+        with pytest.raises(HTTPException) as error:
+            admin.remove_index_image(str(path), delete_file=True)
+        assert error.value.status_code == 400
+    assert outside.exists()
+    assert admin.remove_index_image(str(outside)) == {"removed": 1, "deleted": False}
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+from src.api.batching import MicroBatcher
+
+
+def _submit_concurrently(batcher: MicroBatcher, items: list) -> list:
+    outcomes = [None] * len(items)
+
+    def run(i):
+        try:
+            outcomes[i] = batcher.submit(items[i])
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(items))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert not any(thread.is_alive() for thread in threads), "a caller never got its result"
+    return outcomes
+
+
+def test_results_are_returned_to_their_own_callers():
+    batches = []
+
+    def double(items):
+        batches.append(len(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher("test-double", double, window_ms=50, max_size=8)
+    assert _submit_concurrently(batcher, list(range(6))) == [0, 2, 4, 6, 8, 10]
+    assert sum(batches) == 6 and len(batches) < 6
+
+
+def test_wrong_result_count_fails_every_caller():
+    batcher = MicroBatcher("test-short", lambda items: items[:-1], window_ms=50, max_size=8)
+    outcomes = _submit_concurrently(batcher, list(range(4)))
+    assert all(isinstance(o, RuntimeError) for o in outcomes)
+
+
+def test_exception_from_fn_reaches_every_caller():
+    def boom(items):
+        raise ValueError("model failed")
+
+    batcher = MicroBatcher("test-boom", boom, window_ms=20, max_size=8)
+    outcomes = _submit_concurrently(batcher, list(range(3)))
+    assert all(isinstance(o, ValueError) for o in outcomes)
+
+
+def test_unbatched_mode_calls_fn_directly():
+    batcher = MicroBatcher("test-direct", lambda items: [len(items)], window_ms=0)
+    assert batcher.submit("x") == 1
+    with pytest.raises(IndexError):
+        MicroBatcher("test-empty", lambda items: [], window_ms=0).submit("x")
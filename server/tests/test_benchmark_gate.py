@@ -0,0 +1,38 @@
+from benchmarks.stages import compare
+
+
+def _stage(name, status="ok", p50=10.0, rss=100.0, **extra):
+    stage = {"stage": name, "status": status, **extra}
+    if status == "ok":
+        stage.update(p50_ms=p50, peak_rss_mb=rss)
+    return stage
+
+
+def _compare(current, before, threshold=0.25, rss_threshold=0.20):
+    return compare({"stages": current}, {"stages": before}, threshold, rss_threshold)
+
+
+def test_within_thresholds_passes():
+    assert _compare([_stage("a", p50=12.0, rss=119.0)], [_stage("a")]) == []
+
+
+def test_latency_and_rss_regressions_fail():
+    messages = _compare([_stage("a", p50=13.0, rss=121.0)], [_stage("a")])
+    assert len(messages) == 2
+    assert messages[0].startswith("a: p50_ms 10.0 -> 13.0")
+    assert messages[1].startswith("a: peak_rss_mb 100.0 -> 121.0")
+
+
+def test_stage_that_stops_running_fails():
+    messages = _compare([_stage("a", "error", reason="URLError: offline"), _stage("b", "unavailable")],
+                        [_stage("a"), _stage("b")])
+    assert messages == ["a: status ok -> error (URLError: offline)", "b: status ok -> unavailable"]
+
+
+def test_unchanged_unavailable_stage_and_new_stage_pass():
+    assert _compare([_stage("a", "unavailable"), _stage("new")], [_stage("a", "unavailable")]) == []
+
+
+def test_stage_that_starts_running_is_reported():
+    # A new baseline must be recorded before timings can be compared
+    assert _compare([_stage("a")], [_stage("a", "unavailable")]) == ["a: status unavailable -> ok"]
@@ -0,0 +1,58 @@
+import time
+
+from src.api.cache import ResultCache
+
+
+def _cache(tmp_path, **kwargs) -> ResultCache:
+    return ResultCache("test", db_path=str(tmp_path / "cache.sqlite"), **kwargs)
+
+
+def test_memory_lru_evicts_least_recently_used(tmp_path):
+    cache = ResultCache("lru", max_entries=2, db_path=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set("k", {"v": 1}, ttl=0.05)
+    assert cache.get("k") == {"v": 1}
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_disk_store_is_shared_and_survives_a_new_instance(tmp_path):
+    _cache(tmp_path).set("k", [1, 2, 3])
+    other = _cache(tmp_path)
+    assert other.get("k") == [1, 2, 3]
+    assert other.disk_hits == 1
+    assert other.get("k") == [1, 2, 3]
+    assert other.hits == 1
+
+
+def test_prune_disk_drops_expired_and_least_recently_used_rows(tmp_path):
+    cache = _cache(tmp_path, max_disk_entries=3)
+    cache.set("expired", 0, ttl=-1)
+    for i in range(5):
+        cache.set(f"k{i}", i)
+        time.sleep(0.01)
+    cache._store.execute("UPDATE cache SET accessed_at = ? WHERE key = 'k0'", (time.time() + 60,))
+    cache._prune_disk(time.time())
+    keys = {row[0] for row in cache._store.execute("SELECT key FROM cache WHERE namespace = 'test'")}
+    assert keys == {"k0", "k3", "k4"}
+    assert cache.evictions == 3
+
+
+def test_delete_removes_both_tiers(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set("k", 1)
+    cache.delete("k")
+    assert cache.get("k") is None
+    assert cache.stats()["disk_entries"] == 0
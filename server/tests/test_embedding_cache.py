@@ -0,0 +1,41 @@
+import numpy as np
+
+from src.api.clip_export import encoder_key
+from src.api.embedding_cache import EmbeddingCache, QueryEmbeddingCache
+
+
+def test_encoder_key_separates_exports():
+    int8 = {"mode": "int8", "arch": {"output_dim": 512}, "created": 1}
+    assert encoder_key("ViT-B/32", int8).startswith("ViT-B/32:int8:")
+    assert encoder_key("ViT-B/32", int8) == encoder_key("ViT-B/32", dict(int8))
+    assert encoder_key("ViT-B/32", int8) != encoder_key("ViT-B/32", {**int8, "mode": "bf16"})
+    # A re-export is a different set of weights
+    assert encoder_key("ViT-B/32", int8) != encoder_key("ViT-B/32", {**int8, "created": 2})
+
+
+def test_vectors_are_kept_per_encoder(tmp_path):
+    db = str(tmp_path / "cache.sqlite")
+    fp32, int8 = EmbeddingCache("ViT-B/32:fp32", db), EmbeddingCache("ViT-B/32:int8:abc", db)
+    fp32.set_many({"h": np.ones(4, dtype="float32")})
+    assert list(fp32.get_many(["h", "other"])) == ["h"]
+    assert int8.get_many(["h"]) == {}
+    assert len(fp32) == 1 and len(int8) == 0
+
+
+def test_query_embeddings_expire(tmp_path):
+    queries = QueryEmbeddingCache("m", str(tmp_path / "cache.sqlite"), ttl=-1)
+    queries.set_many({"q": np.ones(4, dtype="float32")})
+    assert queries.get_many(["q"]) == {}
+
+
+def test_query_embeddings_are_capped_least_recently_used_first(tmp_path):
+    db = str(tmp_path / "cache.sqlite")
+    queries = QueryEmbeddingCache("m", db, max_entries=10)
+    queries.set_many({f"old{i}": np.zeros(4, dtype="float32") for i in range(60)})
+    queries._store.execute("UPDATE query_embeddings SET accessed_at = accessed_at - 100")
+    assert len(queries.get_many(["old0"])) == 1  # touched: survives the prune
+    queries.set_many({f"new{i}": np.ones(4, dtype="float32") for i in range(9)})  # 69 writes: prunes
+    kept = {row[0] for row in queries._store.execute("SELECT hash FROM query_embeddings")}
+    assert len(kept) == 10 and "old0" in kept and {f"new{i}" for i in range(9)} <= kept
+    # The indexed images' table is not touched
+    assert len(EmbeddingCache("m", db)) == 0
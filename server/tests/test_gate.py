@@ -0,0 +1,83 @@
+import cv2
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from benchmarks.corpus import corpus_files
+from src.api import gate
+
+
+class _Upload:
+    def __init__(self, image):
+        self.image = image
+
+
+def _blank():
+    return np.full((300, 300, 3), 250, np.uint8)
+
+
+def _screenshot():
+    # Title bar and ragged lines of "words" on a flat page
+    rng = np.random.default_rng(3)
+    img = np.full((400, 600, 3), 255, np.uint8)
+    cv2.rectangle(img, (0, 0), (599, 35), (180, 110, 40), -1)
+    y = 60
+    while y < 380:
+        x = 20
+        while x < 560:
+            width = int(rng.integers(15, 70))
+            cv2.rectangle(img, (x, y), (min(x + width, 580), y + 9), (30, 30, 30), -1)
+            x += width + int(rng.integers(6, 14))
+            if rng.random() < 0.15:
+                break
+        y += int(rng.integers(18, 30))
+    return img
+
+
+def _kolams(count=5):
+    return [cv2.imread(path) for path in corpus_files()[:count]]
+
+
+def test_blank_upload_is_rejected():
+    result = gate.evaluate(_blank())
+    assert not result.accepted and result.reason == "blank"
+
+
+def test_screenshot_is_rejected():
+    result = gate.evaluate(_screenshot())
+    assert not result.accepted and result.reason == "screenshot"
+
+
+def test_corpus_kolams_pass_the_rules():
+    for image in _kolams():
+        assert gate.evaluate(image).accepted
+
+
+def test_head_rejects_below_its_threshold():
+    # A head that scores everything 0 rejects whatever the rules leave to it
+    head = {"features": ["contrast"], "mean": [0.0], "std": [1.0], "weights": [0.0], "bias": -50.0,
+            "threshold": 0.5}
+    image = np.random.default_rng(0).integers(0, 255, (200, 200, 3), dtype=np.uint8)
+    assert gate.evaluate(image).accepted
+    result = gate.evaluate(image, head)
+    assert not result.accepted and result.reason == "classifier"
+    # Strong kolam evidence (symmetry or a dot grid) overrides the head
+    for image in _kolams():
+        scores = gate.evaluate(image).scores
+        if scores["symmetry"] >= gate.KOLAM_SYMMETRY or scores["grid"] >= gate.KOLAM_GRID:
+            assert gate.evaluate(image, head).accepted
+
+
+def test_require_kolam_raises_422_with_the_reason(monkeypatch):
+    monkeypatch.setattr(gate, "GATE_MODE", "on")
+    with pytest.raises(HTTPException) as error:
+        gate.require_kolam(_Upload(_blank()))
+    assert error.value.status_code == 422
+    assert error.value.detail["reason"] == "blank"
+
+
+def test_observe_mode_lets_rejections_through(monkeypatch):
+    monkeypatch.setattr(gate, "GATE_MODE", "observe")
+    result = gate.check(_Upload(_blank()))
+    assert result.accepted and result.reason == "blank"
+    gate.require_kolam(_Upload(_blank()))
@@ -0,0 +1,33 @@
+import io
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from src.api.ingest import decode_image
+
+
+def _png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_decodes_to_bgr():
+    image = decode_image(_png(8, 6))
+    assert image.shape == (6, 8, 3)
+    assert tuple(image[0, 0]) == (30, 30, 200)
+
+
+def test_rejects_images_over_the_pixel_limit():
+    with pytest.raises(HTTPException) as error:
+        decode_image(_png(100, 100), max_pixels=99 * 99)
+    assert error.value.status_code == 413
+
+
+def test_rejects_data_whose_size_cannot_be_probed():
+    # Not an image format PIL can read the header of: never handed to the decoder
+    with pytest.raises(HTTPException) as error:
+        decode_image(b"\x00garbage" + np.zeros(64, dtype=np.uint8).tobytes())
+    assert error.value.status_code == 400
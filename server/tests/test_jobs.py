@@ -0,0 +1,88 @@
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api import jobs
+from src.api.jobs import JobQueue
+
+
+def _wait(queue: JobQueue, job_id: str, timeout: float = 5) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in jobs.FINISHED:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish: {queue.get(job_id)}")
+
+
+def _queue(tmp_path) -> JobQueue:
+    queue = JobQueue(db_path=str(tmp_path / "jobs.sqlite"), workers=1)
+    queue.register("echo", lambda payload, params, progress: {"size": len(payload)})
+    return queue
+
+
+def test_job_runs_and_records_events(tmp_path):
+    queue = _queue(tmp_path)
+    try:
+        job = _wait(queue, queue.submit("echo", b"abc"))
+        assert job["status"] == "completed" and job["result"] == {"size": 3}
+        assert [e["stage"] for e in queue.events(job["job_id"])] == ["queued", "started", "completed"]
+    finally:
+        queue.shutdown()
+
+
+def test_expired_lease_is_reclaimed_by_heartbeat(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 60)
+    queue = _queue(tmp_path)
+    try:
+        queue.start()
+        # A job another worker claimed two minutes ago, then died running
+        queue._store.execute(
+            "INSERT INTO jobs (id, kind, status, params, payload, owner, created_at, updated_at) "
+            "VALUES ('orphan', 'echo', 'running', '{}', ?, 'dead:1', ?, ?)",
+            (b"abcd", time.time() - 120, time.time() - 120),
+        )
+        queue.heartbeat()
+        job = _wait(queue, "orphan")
+        assert job["status"] == "completed" and job["result"] == {"size": 4}
+    finally:
+        queue.shutdown()
+
+
+def test_heartbeat_renews_the_lease_of_running_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 60)
+    release = threading.Event()
+    queue = _queue(tmp_path)
+    queue.register("slow", lambda payload, params, progress: release.wait(5))
+    try:
+        job_id = queue.submit("slow", b"")
+        while queue.get(job_id)["status"] != "running":
+            time.sleep(0.01)
+        queue._store.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - 120, job_id))
+        queue.heartbeat()
+        assert queue.get(job_id)["updated_at"] > time.time() - 5
+        # Still owned here, so not claimed a second time
+        assert not queue._claim(job_id)
+    finally:
+        release.set()
+        _wait(queue, job_id)
+        queue.shutdown()
+
+
+def test_bad_last_event_id_is_a_client_error(tmp_path, monkeypatch):
+    queue = _queue(tmp_path)
+    monkeypatch.setattr(jobs, "job_queue", queue)
+    app = FastAPI()
+    app.include_router(jobs.jobs_router, prefix="/api/jobs")
+    try:
+        job_id = queue.submit("echo", b"x")
+        _wait(queue, job_id)
+        client = TestClient(app)
+        assert client.get(f"/api/jobs/{job_id}/events", headers={"Last-Event-ID": "abc"}).status_code == 400
+        response = client.get(f"/api/jobs/{job_id}/events", headers={"Last-Event-ID": "1"})
+        assert response.status_code == 200 and "event: completed" in response.text
+    finally:
+        queue.shutdown()
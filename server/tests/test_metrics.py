@@ -0,0 +1,51 @@
+import threading
+
+from src.api.metrics import Registry
+
+
+def _hammer(fn, threads: int = 8, times: int = 2000) -> None:
+    workers = [threading.Thread(target=lambda: [fn(i) for i in range(times)]) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def test_concurrent_updates_are_not_lost(tmp_path):
+    registry = Registry(str(tmp_path))
+    counter = registry.counter("c_total", "test", ("kind",))
+    histogram = registry.histogram("h_seconds", "test", buckets=(0.5, 1.0))
+    _hammer(lambda i: (counter.inc(kind="a"), histogram.observe(0.25)))
+    assert counter.samples() == {"a": 16000}
+    assert histogram.samples()[""] == [16000, 0, 0, 4000.0]
+
+
+def test_snapshot_while_new_series_appear(tmp_path):
+    registry = Registry(str(tmp_path))
+    counter = registry.counter("c_total", "test", ("key",))
+    histogram = registry.histogram("h_seconds", "test", ("key",))
+    stop = threading.Event()
+    errors = []
+
+    def snapshot_loop():
+        while not stop.is_set():
+            try:
+                registry.snapshot()
+            except Exception as e:
+                errors.append(e)
+
+    reader = threading.Thread(target=snapshot_loop)
+    reader.start()
+    _hammer(lambda i: (counter.inc(key=str(i)), histogram.observe(0.1, key=str(i))), threads=4, times=3000)
+    stop.set()
+    reader.join()
+    assert errors == []
+    assert len(counter.samples()) == 3000
+
+
+def test_render_merges_worker_snapshots(tmp_path):
+    registry = Registry(str(tmp_path))
+    registry.counter("c_total", "Things.", ("kind",)).inc(3, kind="x")
+    text = registry.render()
+    assert "# TYPE c_total counter" in text
+    assert 'c_total{kind="x"} 3' in text
@@ -0,0 +1,70 @@
+from src.api.model_registry import ModelRegistry, warmup_names
+
+
+def _flaky(failures: int, value="model"):
+    calls = {"n": 0}
+
+    def load():
+        calls["n"] += 1
+        if calls["n"] <= failures:
+            raise OSError("weights not there yet")
+        return value
+    return load, calls
+
+
+def _registry(**loaders) -> ModelRegistry:
+    registry = ModelRegistry()
+    for name, (loader, optional) in loaders.items():
+        registry.register(name, loader, optional=optional)
+    return registry
+
+
+def test_warmup_retries_a_failed_load():
+    load, calls = _flaky(2)
+    registry = _registry(clip=(load, False))
+    registry.warmup(retries=3, backoff=0.01)
+    registry._warmup.join(5)
+    assert registry.ready()
+    assert calls["n"] == 3 and registry.status()["clip"]["attempts"] == 3
+
+
+def test_model_that_keeps_failing_stops_blocking_readiness():
+    load, _ = _flaky(100)
+    registry = _registry(clip=(load, False))
+    registry._set_warmup_names(None)
+    assert not registry.ready() and registry.blocking() == ["clip"]
+    registry.warmup(retries=1, backoff=0.01)
+    registry._warmup.join(5)
+    assert registry.ready()
+    assert registry.unavailable() == ["clip"]
+    assert registry.status()["clip"]["given_up"]
+
+
+def test_optional_models_never_block_readiness():
+    slow, _ = _flaky(100)
+    registry = _registry(cnn=(slow, True), clip=(lambda: "clip", False))
+    registry._set_warmup_names(None)
+    assert registry.blocking() == ["clip"] and registry.unavailable() == ["cnn"]
+    registry.get("clip")
+    assert registry.ready()
+
+
+def test_get_still_loads_a_model_warmup_gave_up_on():
+    load, _ = _flaky(2)
+    registry = _registry(clip=(load, False))
+    registry.warmup(retries=0, backoff=0.01)
+    registry._warmup.join(5)
+    assert registry.status()["clip"]["given_up"]
+    for _ in range(2):
+        try:
+            registry.get("clip")
+        except OSError:
+            pass
+    assert registry.get("clip") == "model"
+    assert not registry.status()["clip"]["given_up"] and registry.unavailable() == []
+
+
+def test_warmup_names_setting():
+    assert warmup_names("all") is None
+    assert warmup_names("none") == []
+    assert warmup_names(" clip, faiss_index ") == ["clip", "faiss_index"]
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from src.api import ann, vector
+
+
+class _NoEmbeddings:
+    def get_many(self, digests):
+        return {}
+
+
+@pytest.fixture
+def hnsw(tmp_path, monkeypatch):
+    """A 100-image HNSW index (which cannot remove vectors) live in this process."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(vector, "INDEX_ATTRIBUTES", ())
+    monkeypatch.setattr(vector, "_embeddings", lambda: _NoEmbeddings())
+    vectors = ann.prepare(np.random.default_rng(0).normal(size=(100, 16)).astype("float32"), "hnsw")
+    index, kind = ann.make_index("hnsw", 16)
+    assert kind == "hnsw" and not ann.supports_remove(index)
+    index.add_with_ids(vectors, np.arange(100, dtype="int64"))
+    for name, value in (("_index", index), ("_index_kind", kind), ("_meta", vector.IndexMetadata()),
+                        ("_members", {}), ("_partitions", None), ("_next_id", 100), ("_orphans", set()),
+                        ("_orphan_selector", None), ("_index_mapped", False), ("_dirty", False)):
+        monkeypatch.setattr(vector, name, value)
+    for image_id in range(100):
+        vector._meta.set(image_id, f"{image_id}.png", None, 1, 1, cluster=image_id, attributes={})
+    return vectors
+
+
+def test_searches_exclude_orphans_without_over_fetching(hnsw, monkeypatch):
+    vector._apply([], None, [0, 1, 2])
+    assert vector._orphans == {0, 1, 2} and vector._index.ntotal == 100
+    asked = []
+    search = vector._index.search
+    monkeypatch.setattr(vector._index, "search", lambda x, k, **kw: asked.append(k) or search(x, k, **kw))
+    results = vector.search_vectors(hnsw[:3], top_k=5)
+    assert asked == [5]
+    for row in results:
+        assert len(row) == 5 and not {"0.png", "1.png", "2.png"} & {path for path, _ in row}
+
+
+def test_new_images_never_join_an_orphan(hnsw, tmp_path):
+    vector._apply([], None, [7])
+    (tmp_path / "copy.png").write_bytes(b"x")
+    ids = vector._apply([(str(tmp_path / "copy.png"), "h")], hnsw[7:8])
+    assert vector._meta.cluster(ids[0]) == ids[0]
+
+
+def test_index_is_rebuilt_once_orphans_pass_the_limit(hnsw, monkeypatch):
+    monkeypatch.setattr(vector, "ORPHAN_REBUILD_FRACTION", 0.1)
+    vector._apply([], None, list(range(10)))
+    assert len(vector._orphans) == 10 and vector._index.ntotal == 100
+    vector._apply([], None, [10])
+    assert vector._orphans == set() and vector._index.ntotal == 89
+    assert vector.index_status()["clusters"] == 89
+
+
+def test_orphans_are_found_again_on_load(hnsw, monkeypatch):
+    monkeypatch.setattr(vector, "_version", 0)
+    monkeypatch.setattr(ann, "INDEX_TYPE", "hnsw")
+    vector._apply([], None, [4, 5])
+    vector.save_index()
+    vector._set_orphans(())
+    vector.load_index()
+    assert vector._orphans == {4, 5}
+    assert vector.index_status()["orphans"] == 2
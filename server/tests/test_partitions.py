@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.api import ann, attributes, partitions
+from src.api.partitions import Partitions
+
+REGIONS = ["TamilNadu", "Karnataka", None]
+
+
+def _corpus(n=2000, d=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = ann.prepare(rng.normal(size=(n, d)).astype("float32"), "flat-ip")
+    values = [{"region": REGIONS[i % 3], "grid": 5 + i % 4} for i in range(n)]
+    return vectors, values
+
+
+def _expected(vectors, values, queries, k, keep):
+    ids = np.array([i for i, v in enumerate(values) if keep(v)])
+    scores = queries @ vectors[ids].T
+    return [set(ids[np.argsort(-row)[:k]].tolist()) for row in scores]
+
+
+@pytest.mark.parametrize("kind", ["flat-ip", "hnsw", "ivf-flat"])
+@pytest.mark.parametrize("exact_limit", [0, 10_000])
+def test_filtered_search_matches_brute_force(kind, exact_limit, monkeypatch):
+    monkeypatch.setattr(partitions, "EXACT_LIMIT", exact_limit)
+    vectors, values = _corpus()
+    index, built = ann.make_index(kind, vectors.shape[1], vectors)
+    assert built == kind
+    ids = np.arange(len(vectors), dtype="int64")
+    index.add_with_ids(vectors, ids)
+    ann.tune(index, nprobe=index.nlist if kind == "ivf-flat" else ann.NPROBE, ef_search=512)
+    parts = Partitions(("region", "grid"))
+    parts.add(ids, values)
+
+    queries, k = vectors[:5] + 0.01, 10
+    filters = {"region": {"TamilNadu"}, "grid": {5, 6}}
+    distances, found = parts.search(index, queries, k, filters)
+    expected = _expected(vectors, values, queries, k,
+                         lambda v: v["region"] == "TamilNadu" and v["grid"] in (5, 6))
+    for row, want in zip(found, expected):
+        assert all(values[i]["region"] == "TamilNadu" and values[i]["grid"] in (5, 6) for i in row)
+        assert len(set(row.tolist()) & want) >= 9
+    assert np.all(np.diff(distances, axis=1) <= 1e-5)
+
+
+def test_removed_and_unmatched_ids_are_never_returned():
+    vectors, values = _corpus(n=30)
+    index, _ = ann.make_index("flat-ip", vectors.shape[1])
+    ids = np.arange(30, dtype="int64")
+    index.add_with_ids(vectors, ids)
+    parts = Partitions(("region",))
+    parts.add(ids, values)
+    parts.remove([0, 3, 6])
+    _, found = parts.search(index, vectors[:1], 20, {"region": {"TamilNadu"}})
+    returned = [i for i in found[0].tolist() if i >= 0]
+    assert len(returned) == 7 and not {0, 3, 6} & set(returned)
+    assert found[0].tolist()[7:] == [-1] * 13
+    _, found = parts.search(index, vectors[:1], 5, {"region": {"TamilNadu"}, "grid": {99}})
+    assert found.tolist() == [[-1] * 5]
+    assert parts.sizes() == {"region": {"Karnataka": 10, "TamilNadu": 7}}
+
+
+def test_region_comes_from_the_path_only(tmp_path, monkeypatch):
+    # The shipped CNN's classes are region names; a prediction must not become the region
+    monkeypatch.setattr(attributes, "predict_many", lambda images: ["TamilNadu"] * len(images))
+    for name in ("photo.png", "tn1.png"):
+        Image.new("RGB", (8, 8), "white").save(tmp_path / name)
+    (tmp_path / "Karnataka").mkdir()
+    Image.new("RGB", (8, 8), "white").save(tmp_path / "Karnataka" / "1.png")
+    paths = [str(tmp_path / "photo.png"), str(tmp_path / "tn1.png"), str(tmp_path / "Karnataka" / "1.png")]
+    found = attributes.describe(paths, ("region", "class"))
+    assert [row["region"] for row in found] == [None, "TamilNadu", "Karnataka"]
+    assert [row["class"] for row in found] == ["TamilNadu"] * 3
@@ -0,0 +1,47 @@
+import numpy as np
+
+from src.api.cache import ResultCache
+from src.api.phash import Fingerprint, PerceptualIndex, fingerprint, get_near_duplicate
+
+
+def _kolam(seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    img = np.full((256, 256, 3), 255, np.uint8)
+    for y, x in rng.integers(20, 236, size=(25, 2)):
+        img[y - 3:y + 3, x - 3:x + 3] = 0
+    return img
+
+
+def test_resized_copy_is_a_near_duplicate():
+    original = fingerprint(_kolam(1))
+    resized = fingerprint(_kolam(1)[::2, ::2])
+    assert original.distance(resized) <= 12
+    assert original.distance(fingerprint(_kolam(2))) > 12
+
+
+def test_near_duplicate_probe_does_not_count_as_a_miss(tmp_path):
+    cache = ResultCache("nd", db_path=str(tmp_path / "cache.sqlite"))
+    index = PerceptualIndex("nd", cache=cache)
+    fp = Fingerprint(0xABC, dots=10)
+    cache.set("key", {"ok": True})
+    index.add(fp, "key")
+    assert get_near_duplicate(cache, index, Fingerprint(0xABD, dots=10)) == {"ok": True}
+    assert get_near_duplicate(cache, index, Fingerprint(~0xABC & (2 ** 128 - 1), dots=10)) is None
+    assert (cache.hits, cache.disk_hits, cache.misses) == (0, 0, 0)
+
+
+def test_rows_of_evicted_keys_are_pruned_and_the_tree_rebuilt(tmp_path):
+    cache = ResultCache("nd", db_path=str(tmp_path / "cache.sqlite"), max_disk_entries=2)
+    index = PerceptualIndex("nd", cache=cache)
+    other_worker = PerceptualIndex("nd", db_path=str(tmp_path / "cache.sqlite"))
+    for i in range(4):
+        cache.set(f"k{i}", i)
+        index.add(Fingerprint(i, dots=10), f"k{i}")
+    assert len(other_worker.candidates(Fingerprint(0, dots=10))) == 4
+
+    # k3 most recently used, k0 least: a prune keeps k2 and k3
+    cache._store.execute("UPDATE cache SET accessed_at = 100 + CAST(substr(key, 2) AS REAL)")
+    cache._prune_disk(0)
+
+    assert sorted(other_worker.candidates(Fingerprint(0, dots=10))) == ["k2", "k3"]
+    assert len(other_worker) == 2
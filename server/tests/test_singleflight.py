@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.api.singleflight import SingleFlight
+
+
+def test_concurrent_calls_with_one_key_run_once():
+    flights = SingleFlight()
+    calls = []
+
+    def slow(value):
+        calls.append(threading.get_ident())
+        time.sleep(0.1)
+        return value * 2
+
+    async def main():
+        return await asyncio.gather(*(flights.do("k", slow, 21) for _ in range(5)))
+
+    assert asyncio.run(main()) == [42] * 5
+    assert len(calls) == 1
+    assert flights.stats() == {"in_flight": 0, "executed": 1, "coalesced": 4}
+
+
+def test_distinct_keys_and_later_calls_run_again():
+    flights = SingleFlight()
+
+    async def echo(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    async def main():
+        first = await asyncio.gather(flights.do("a", echo, 1), flights.do("b", echo, 2))
+        return first, await flights.do("a", echo, 3)
+
+    assert asyncio.run(main()) == ([1, 2], 3)
+    assert flights.executed == 3 and flights.coalesced == 0
+
+
+def test_exception_reaches_every_waiter():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flights.do("k", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flights.executed == 1 and flights.in_flight() == 0
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flights = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flights.do("k", slow))
+        second = asyncio.ensure_future(flights.do("k", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import subprocess
+import sys
+
+import faiss
+import numpy as np
+import pytest
+
+from src.api import ann, snapshots, vector
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _write(index_path, meta_path):
+    for path in (index_path, meta_path):
+        with open(path, "w") as f:
+            f.write(os.path.basename(path))
+
+
+def test_publish_refuses_a_stale_base(tmp_path):
+    index_file, meta_file = str(tmp_path / "i.faiss"), str(tmp_path / "i.meta")
+    first = snapshots.publish(index_file, meta_file, _write, {}, expected_version=0)
+    assert first.version == 1
+    snapshots.publish(index_file, meta_file, _write, {}, expected_version=1)
+    with pytest.raises(snapshots.StaleSnapshot) as error:
+        snapshots.publish(index_file, meta_file, _write, {}, expected_version=1)
+    assert (error.value.expected, error.value.current) == (1, 2)
+    assert snapshots.read_manifest(index_file).version == 2
+    assert not os.path.exists(str(tmp_path / "i.v000003.faiss"))
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    """A three-image flat index saved as snapshot 1 in tmp_path, loaded in this process."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(vector, "INDEX_ATTRIBUTES", ())
+    index, kind = ann.make_index("flat-l2", 4)
+    vectors = np.eye(3, 4, dtype="float32")
+    index.add_with_ids(vectors, np.arange(3, dtype="int64"))
+    for name in "abc":
+        (tmp_path / name).write_bytes(name.encode())
+    monkeypatch.setattr(vector, "_index", index)
+    monkeypatch.setattr(vector, "_index_kind", kind)
+    monkeypatch.setattr(vector, "_meta", vector.IndexMetadata())
+    monkeypatch.setattr(vector, "_members", {})
+    monkeypatch.setattr(vector, "_partitions", None)
+    monkeypatch.setattr(vector, "_next_id", 3)
+    monkeypatch.setattr(vector, "_orphans", set())
+    monkeypatch.setattr(vector, "_version", 0)
+    monkeypatch.setattr(vector, "_dirty", False)
+    monkeypatch.setattr(vector, "_index_mapped", False)
+    for image_id, name in enumerate("abc"):
+        vector._meta.set(image_id, name, hashlib.sha256(name.encode()).hexdigest(), 1, 1, cluster=image_id,
+                         attributes={})
+    vector.save_index()
+    assert vector._version == 1
+    return tmp_path
+
+
+def _remove_in_another_process(path: str) -> None:
+    """A second worker: load the newest snapshot, remove an image, publish."""
+    code = f"from src.api import vector; vector.load_index(); vector.remove_images([{path!r}])"
+    env = dict(os.environ, PYTHONPATH=SERVER_DIR, KOLAM_INDEX_ATTRIBUTES="")
+    subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, timeout=120)
+
+
+def test_save_refuses_to_overwrite_a_newer_snapshot(index_dir):
+    vector.remove_images(["c"], save=False)
+    _remove_in_another_process("b")
+    with pytest.raises(snapshots.StaleSnapshot):
+        vector.save_index()
+    assert snapshots.read_manifest(vector.INDEX_FILE).version == 2
+
+
+def test_edit_racing_another_publisher_is_applied_on_top(index_dir, monkeypatch):
+    apply = vector._apply
+    raced = []
+
+    def racing_apply(*args, **kwargs):
+        # The other worker publishes between this edit's reload and its save
+        if not raced:
+            raced.append(True)
+            _remove_in_another_process("b")
+        return apply(*args, **kwargs)
+
+    monkeypatch.setattr(vector, "_apply", racing_apply)
+    assert vector.remove_images(["c"]) == 1
+    assert raced and vector._version == 3
+    assert sorted(path for _, path in vector._meta.items()) == ["a"]
+
+    # What was published holds both removals
+    vector.load_index()
+    assert sorted(path for _, path in vector._meta.items()) == ["a"]
+
+
+def test_stale_check_without_a_manifest(tmp_path):
+    index_file, meta_file = str(tmp_path / "i.faiss"), str(tmp_path / "i.meta")
+    with pytest.raises(snapshots.StaleSnapshot) as error:
+        snapshots.publish(index_file, meta_file, _write, {}, expected_version=3)
+    assert (error.value.expected, error.value.current) == (3, 0)
+
+
+def test_build_in_a_fresh_process_applies_once(index_dir, monkeypatch):
+    # A `python -m src.api.vector build` process starts at version 0 with snapshot 1 published
+    monkeypatch.setattr(vector, "_version", 0)
+    rows = [(name, hashlib.sha256(name.encode()).hexdigest()) for name in "ab"]
+    monkeypatch.setattr(vector, "_data_files", lambda *args: ["a", "b"])
+    monkeypatch.setattr(vector, "_embed_files", lambda paths, **kw: (rows, np.eye(2, 4, dtype="float32")))
+    apply, applied = vector._apply, []
+    monkeypatch.setattr(vector, "_apply", lambda *args, **kw: applied.append(1) or apply(*args, **kw))
+    vector.build_index()
+    assert applied == [1] and vector._version == 2
+    assert sorted(path for _, path in vector._meta.items()) == ["a", "b"]
+
+
+@pytest.mark.parametrize("kind,in_place,mapped", [
+    ("flat-l2", True, True), ("flat-l2", False, False), ("ivf-flat", False, True)])
+def test_mapped_only_when_faiss_maps_the_index(index_dir, monkeypatch, kind, in_place, mapped):
+    if not in_place:
+        # Older FAISS: IO_FLAG_MMAP maps IVF inverted lists and reads anything else into memory
+        monkeypatch.delattr(faiss, "IO_FLAG_MMAP_IFC", raising=False)
+    snapshot = snapshots.read_manifest(vector.INDEX_FILE)
+    if kind != "flat-l2":
+        vectors = np.random.default_rng(0).normal(size=(2000, 4)).astype("float32")
+        index, built = ann.make_index(kind, 4, vectors)
+        assert built == kind
+        index.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+        faiss.write_index(index, snapshot.index_file)
+    assert vector._read_snapshot(snapshot)[2] is mapped